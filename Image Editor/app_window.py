@@ -2,6 +2,9 @@
 import tkinter as tk
 from image_processor import ImageProcessor
 from history_manager import HistoryManager
+from operation_history import OperationHistory
+from thumbnail_cache import ThumbnailCache
+from result_cache import FilterResultCache
 from gui_builder import GUIBuilder
 from event_handlers import EventHandlers
 
@@ -11,15 +14,33 @@ class ImageEditorApp:
     Coordinates all components together.
     """
     
-    def __init__(self, root):
-        """Initialize the application."""
+    # CLASS ATTRIBUTE
+    HISTORY_MODES = ('operations', 'snapshot')
+    
+    def __init__(self, root, history_mode='operations'):
+        """
+        Initialize the application.
+        history_mode: 'operations' records operations and replays them, so
+                      hundreds of undo steps fit in a fixed memory budget;
+                      'snapshot' stores compressed pixels for each state
+        """
+        if history_mode not in self.HISTORY_MODES:
+            raise ValueError(f"history_mode must be one of {self.HISTORY_MODES}, got '{history_mode}'")
         self.root = root
         self.root.title("Professional Image Editor | HIT137 Assignment 3")
         self.root.geometry("1400x850")
         self.root.configure(bg='white')
         
-        self.processor = ImageProcessor()
-        self.history = HistoryManager()
+        try:
+            thumbnails = ThumbnailCache()
+        except OSError:
+            thumbnails = None  # no writable cache folder; load without it
+        self.processor = ImageProcessor(thumbnail_cache=thumbnails,
+                                        result_cache=FilterResultCache())
+        if history_mode == 'operations':
+            self.history = OperationHistory()
+        else:
+            self.history = HistoryManager(max_bytes=512 * 1024 * 1024, compress=True)
         
         self._build_gui()
         self._setup_shortcuts()
@@ -44,7 +65,8 @@ class ImageEditorApp:
             'flip': self.handlers.flip_image,
             'resize': self.handlers.resize_image,
             'undo': self.handlers.undo_action,
-            'redo': self.handlers.redo_action
+            'redo': self.handlers.redo_action,
+            'preview': self.handlers.preview_operation
         }
         
         GUIBuilder.create_control_panel(main_frame, handler_callbacks)
@@ -60,6 +82,14 @@ class ImageEditorApp:
         
         GUIBuilder.create_menu_bar(self.root, menu_handlers)
     
+    def close(self):
+        """Release history threads and scratch files; called when the main loop ends."""
+        if hasattr(self.history, 'close'):
+            self.history.close()
+        if self.processor.thumbnail_cache is not None:
+            self.processor.thumbnail_cache.close()
+        self.processor.close()
+    
     def _setup_shortcuts(self):
         """Set up keyboard shortcuts."""
         self.root.bind('<Control-z>', lambda e: self.handlers.undo_action())
@@ -1,4 +1,11 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import bisect
+import functools
+import json
+import os
+import threading
+import time
 import cv2
 import numpy as np
 
@@ -12,14 +19,53 @@ class ImageFilter(ABC):
     total_filters_applied = 0
     supported_formats = ['jpg', 'jpeg', 'png', 'bmp']
     
+    # CLASS ATTRIBUTE - True if each output pixel depends only on the same
+    # input pixel, so a stack of images can be processed as one tall image
+    pointwise = False
+    
+    # CLASS ATTRIBUTE - True for filters that only run other filters (chains);
+    # their apply() is timed but not counted, as the inner filters count themselves
+    container = False
+    
     def __init__(self, name):
         """
         CONSTRUCTOR
         Demonstrates: Instance attributes, Encapsulation
         """
         self._name = name  # Protected attribute
-        self._last_applied_time = None
-        ImageFilter.total_filters_applied += 1
+        self._last_applied_time = None  # wall-clock time of the last apply()
+        self._last_duration = None  # seconds the last apply() took
+    
+    def __init_subclass__(cls, **kwargs):
+        """
+        Runs for every child class: wraps its apply() so each application
+        is counted and timed (see FilterTelemetry).
+        """
+        super().__init_subclass__(**kwargs)
+        apply = cls.__dict__.get('apply')
+        if apply is not None and not getattr(apply, '__isabstractmethod__', False):
+            cls.apply = ImageFilter._instrument(apply)
+    
+    @staticmethod
+    def _instrument(apply):
+        """STATIC METHOD: Wrap an apply() implementation with telemetry."""
+        @functools.wraps(apply)
+        def timed_apply(self, image, *args, **kwargs):
+            # super().apply() calls inside an override are not counted twice
+            if type(self).apply is not timed_apply:
+                return apply(self, image, *args, **kwargs)
+            start = time.perf_counter()
+            result = apply(self, image, *args, **kwargs)
+            duration = time.perf_counter() - start
+            self._last_applied_time = time.time()
+            self._last_duration = duration
+            if self.container:
+                return result
+            pixels = image.shape[0] * image.shape[1] if isinstance(image, np.ndarray) and image.ndim >= 2 else 0
+            allocated = result.nbytes if isinstance(result, np.ndarray) and result is not image else 0
+            FilterTelemetry.record(type(self).__name__, duration, pixels, allocated)
+            return result
+        return timed_apply
     
     @abstractmethod
     def apply(self, image):
@@ -37,6 +83,25 @@ class ImageFilter(ABC):
         """
         return self._name
     
+    @property
+    def last_applied_time(self):
+        """PROPERTY: time.time() of the last application, or None."""
+        return self._last_applied_time
+    
+    @property
+    def last_duration(self):
+        """PROPERTY: Seconds the last application took, or None."""
+        return self._last_duration
+    
+    @property
+    def halo(self):
+        """
+        PROPERTY: Rows/columns of neighbouring pixels the filter reads
+        around each output pixel. 0 for pointwise filters.
+        Used when processing an image in strips.
+        """
+        return 0
+    
     @staticmethod
     def validate_image(image):
         """
@@ -49,18 +114,78 @@ class ImageFilter(ABC):
             return False
         return True
     
+    @staticmethod
+    def stack_images(images):
+        """
+        STATIC METHOD
+        Turn an NHWC/NHW array or a list of same-shaped images into one
+        contiguous stacked array.
+        """
+        if isinstance(images, np.ndarray):
+            if images.ndim < 3:
+                raise ValueError("A stacked batch must have shape (N, H, W) or (N, H, W, C)")
+            return np.ascontiguousarray(images)
+        images = list(images)
+        if not images:
+            raise ValueError("apply_batch needs at least one image")
+        shape = images[0].shape
+        if any(image.shape != shape for image in images):
+            raise ValueError("apply_batch needs images of the same shape")
+        return np.stack(images)
+    
+    def apply_batch(self, images, workers=None):
+        """
+        Apply the filter to many same-shaped images at once.
+        images: stacked (N, H, W[, C]) array or list of same-shaped images
+        workers: threads for non-pointwise filters (default: all cores)
+        Returns the results stacked into one array, or None when apply()
+        rejects the images (like apply() itself).
+        Pointwise filters process the whole stack in a single call;
+        others run apply() per image on a thread pool (OpenCV releases
+        the GIL), each thread working through a contiguous chunk.
+        """
+        stack = self.stack_images(images)
+        count, height = stack.shape[:2]
+        
+        if self.pointwise:
+            # (N, H, W, C) -> (N*H, W, C): one image, one call, no copy
+            result = self.apply(stack.reshape((count * height,) + stack.shape[2:]))
+            if result is None:
+                return None
+            return result.reshape((count, height) + result.shape[1:])
+        
+        first = self.apply(stack[0])
+        if first is None:
+            return None
+        results = np.empty((count,) + first.shape, first.dtype)
+        results[0] = first
+        workers = max(1, min(workers or os.cpu_count() or 1, count - 1))
+        
+        def run_chunk(indices):
+            for index in indices:
+                result = self.apply(stack[index])
+                if result is None:
+                    raise ValueError(f"{self._name} could not process image {index} of the batch")
+                results[index] = result
+        
+        if count > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(run_chunk, np.array_split(np.arange(1, count), workers)))
+        return results
+    
     @classmethod
     def get_total_filters_applied(cls):
         """
         CLASS METHOD (@classmethod)
         Access class attributes
+        Counts filter applications (every apply() call).
         """
-        return cls.total_filters_applied
+        return ImageFilter.total_filters_applied
     
     @classmethod
     def reset_counter(cls):
-        """CLASS METHOD to reset the counter."""
-        cls.total_filters_applied = 0
+        """CLASS METHOD to reset the counter (and the telemetry it summarizes)."""
+        FilterTelemetry.reset_counter()
     
     # MAGIC METHODS
     def __str__(self):
@@ -79,6 +204,249 @@ class ImageFilter(ABC):
         return self.apply(image)
 
 
+class CopyTracker:
+    """
+    Counts full-frame image copies.
+    Images are never modified in place, so read-only views can be shared
+    freely; a copy is only needed by callers that intend to mutate.
+    """
+    
+    # CLASS ATTRIBUTES - shared counters
+    copies_made = 0
+    bytes_copied = 0
+    operations_run = 0
+    
+    @classmethod
+    def copy(cls, image):
+        """CLASS METHOD: Return a counted, writeable copy."""
+        if image is None:
+            return None
+        cls.copies_made += 1
+        cls.bytes_copied += image.nbytes
+        return image.copy()
+    
+    @staticmethod
+    def readonly(image):
+        """STATIC METHOD: Return a non-writeable view (no copy)."""
+        if image is None:
+            return None
+        view = image.view(np.ndarray)
+        view.flags.writeable = False
+        return view
+    
+    @staticmethod
+    def is_readonly(image):
+        """STATIC METHOD: True if the array cannot be written through."""
+        return isinstance(image, np.ndarray) and not image.flags.writeable
+    
+    @staticmethod
+    def is_immutable(image):
+        """
+        STATIC METHOD
+        True if nothing can write to the array's data: it is read-only and
+        so is every array or buffer it views. A read-only view of a
+        writeable array is not immutable, since the owner can still change it.
+        """
+        if not CopyTracker.is_readonly(image):
+            return False
+        base = image.base
+        while isinstance(base, np.ndarray):
+            if base.flags.writeable:
+                return False
+            base = base.base
+        if base is None:
+            return True
+        try:
+            return memoryview(base).readonly
+        except TypeError:
+            return False
+    
+    @staticmethod
+    def freeze(image):
+        """
+        STATIC METHOD
+        Make an array the caller just created read-only, in place, and return it.
+        """
+        if image is not None:
+            image.flags.writeable = False
+        return image
+    
+    @classmethod
+    def adopt(cls, image):
+        """
+        CLASS METHOD: Take ownership of an image.
+        Immutable arrays are shared as they are; anything else is copied,
+        because the caller (or the owner of the data) could still change it.
+        """
+        if image is None or cls.is_immutable(image):
+            return image
+        return cls.freeze(cls.copy(image))
+    
+    @classmethod
+    def count_operation(cls):
+        """CLASS METHOD: Record that an image operation ran."""
+        cls.operations_run += 1
+    
+    @classmethod
+    def get_stats(cls):
+        """CLASS METHOD: Copies made, bytes copied and copies per operation."""
+        per_operation = cls.copies_made / cls.operations_run if cls.operations_run else 0.0
+        return {
+            'copies': cls.copies_made,
+            'bytes_copied': cls.bytes_copied,
+            'operations': cls.operations_run,
+            'copies_per_operation': per_operation
+        }
+    
+    @classmethod
+    def reset_counter(cls):
+        """CLASS METHOD to reset the counters."""
+        cls.copies_made = 0
+        cls.bytes_copied = 0
+        cls.operations_run = 0
+
+
+class FilterTelemetry:
+    """
+    Per-filter application counts, latency histograms, pixels processed
+    and bytes allocated. Every ImageFilter subclass reports here
+    automatically. Thread-safe; readable with get_stats() and exportable
+    as JSON or Prometheus text.
+    """
+    
+    # CLASS ATTRIBUTES - shared counters
+    latency_buckets = (0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+    _filters = {}  # filter class name -> raw counters
+    _last = None  # (filter name, seconds) of the latest application
+    _lock = threading.Lock()
+    
+    @classmethod
+    def _empty(cls):
+        """CLASS METHOD: Fresh counters for one filter."""
+        return {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'pixels': 0, 'bytes': 0,
+                'buckets': [0] * (len(cls.latency_buckets) + 1)}
+    
+    @classmethod
+    def record(cls, name, seconds, pixels, allocated):
+        """CLASS METHOD: Record one filter application."""
+        with cls._lock:
+            counters = cls._filters.get(name)
+            if counters is None:
+                counters = cls._filters[name] = cls._empty()
+            counters['count'] += 1
+            counters['seconds'] += seconds
+            counters['max_seconds'] = max(counters['max_seconds'], seconds)
+            counters['pixels'] += pixels
+            counters['bytes'] += allocated
+            counters['buckets'][bisect.bisect_left(cls.latency_buckets, seconds)] += 1
+            cls._last = (name, seconds)
+            ImageFilter.total_filters_applied += 1
+    
+    @classmethod
+    def snapshot(cls):
+        """CLASS METHOD: Copy of the raw counters (can be merged elsewhere)."""
+        with cls._lock:
+            return {name: dict(counters, buckets=list(counters['buckets']))
+                    for name, counters in cls._filters.items()}
+    
+    @classmethod
+    def merge(cls, snapshot):
+        """CLASS METHOD: Add counters from another process's snapshot."""
+        with cls._lock:
+            for name, other in snapshot.items():
+                counters = cls._filters.get(name)
+                if counters is None:
+                    counters = cls._filters[name] = cls._empty()
+                for key in ('count', 'seconds', 'pixels', 'bytes'):
+                    counters[key] += other[key]
+                counters['max_seconds'] = max(counters['max_seconds'], other['max_seconds'])
+                counters['buckets'] = [a + b for a, b in zip(counters['buckets'], other['buckets'])]
+                ImageFilter.total_filters_applied += other['count']
+    
+    @classmethod
+    def get_stats(cls):
+        """
+        CLASS METHOD: Per-filter statistics:
+        count, total_ms, mean_ms, max_ms, pixels, bytes_allocated and a
+        cumulative latency histogram {upper bound in seconds: count}.
+        """
+        stats = {}
+        for name, counters in cls.snapshot().items():
+            cumulative = 0
+            histogram = {}
+            for bound, count in zip(list(cls.latency_buckets) + ['+Inf'], counters['buckets']):
+                cumulative += count
+                histogram[str(bound)] = cumulative
+            stats[name] = {
+                'count': counters['count'],
+                'total_ms': counters['seconds'] * 1000,
+                'mean_ms': counters['seconds'] * 1000 / counters['count'] if counters['count'] else 0.0,
+                'max_ms': counters['max_seconds'] * 1000,
+                'pixels': counters['pixels'],
+                'bytes_allocated': counters['bytes'],
+                'histogram': histogram
+            }
+        return stats
+    
+    @classmethod
+    def summary(cls):
+        """CLASS METHOD: One-line summary for a status bar."""
+        if cls._last is None:
+            return "Filters: none applied"
+        name, seconds = cls._last
+        return f"Filters: {ImageFilter.total_filters_applied} runs, last {name} {seconds * 1000:.0f} ms"
+    
+    @classmethod
+    def to_json(cls):
+        """CLASS METHOD: Statistics as a JSON document."""
+        return json.dumps({'total_filters_applied': ImageFilter.total_filters_applied,
+                           'filters': cls.get_stats()}, indent=2, sort_keys=True)
+    
+    @classmethod
+    def to_prometheus(cls):
+        """CLASS METHOD: Statistics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP image_filter_applications_total Filter applications.",
+            "# TYPE image_filter_applications_total counter"
+        ]
+        snapshot = cls.snapshot()
+        for name, counters in sorted(snapshot.items()):
+            lines.append(f'image_filter_applications_total{{filter="{name}"}} {counters["count"]}')
+        lines += ["# HELP image_filter_pixels_total Input pixels processed.",
+                  "# TYPE image_filter_pixels_total counter"]
+        for name, counters in sorted(snapshot.items()):
+            lines.append(f'image_filter_pixels_total{{filter="{name}"}} {counters["pixels"]}')
+        lines += ["# HELP image_filter_allocated_bytes_total Bytes of result images allocated.",
+                  "# TYPE image_filter_allocated_bytes_total counter"]
+        for name, counters in sorted(snapshot.items()):
+            lines.append(f'image_filter_allocated_bytes_total{{filter="{name}"}} {counters["bytes"]}')
+        lines += ["# HELP image_filter_latency_seconds Time spent in apply().",
+                  "# TYPE image_filter_latency_seconds histogram"]
+        for name, counters in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(list(cls.latency_buckets) + ['+Inf'], counters['buckets']):
+                cumulative += count
+                lines.append(f'image_filter_latency_seconds_bucket{{filter="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'image_filter_latency_seconds_sum{{filter="{name}"}} {counters["seconds"]:.6f}')
+            lines.append(f'image_filter_latency_seconds_count{{filter="{name}"}} {counters["count"]}')
+        return "\n".join(lines) + "\n"
+    
+    @classmethod
+    def export(cls, path):
+        """CLASS METHOD: Write statistics to a file: JSON for *.json, otherwise Prometheus text."""
+        text = cls.to_json() if path.lower().endswith('.json') else cls.to_prometheus()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    
+    @classmethod
+    def reset_counter(cls):
+        """CLASS METHOD to reset the counters, including ImageFilter.total_filters_applied."""
+        with cls._lock:
+            cls._filters = {}
+            cls._last = None
+            ImageFilter.total_filters_applied = 0
+
+
 class FileHandler:
     """
     MIXIN CLASS for file operations.
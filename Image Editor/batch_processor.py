@@ -0,0 +1,274 @@
+# batch_processor.py
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+from base_classes import FileHandler, FilterTelemetry
+from filters import BlurFilter, RotateFilter, FlipFilter
+from image_processor import ImageProcessor
+
+
+# One ImageProcessor per worker process, created lazily
+_worker_processor = None
+
+
+def _process_file(job):
+    """
+    Worker function (runs inside a pool process).
+    Loads one file, applies the operations and writes the result.
+    Never raises - failures are returned so the batch keeps going.
+    Returns (filepath, ok, error, bytes_in, bytes_out, filter telemetry).
+    """
+    global _worker_processor
+    filepath, output_path, operations = job
+
+    if _worker_processor is None:
+        _worker_processor = ImageProcessor()
+    processor = _worker_processor
+    # Telemetry is per process; send this file's counters back to the parent
+    FilterTelemetry.reset_counter()
+
+    try:
+        bytes_in = os.path.getsize(filepath)
+        if not processor.load_image(filepath):
+            return (filepath, False, "could not decode image", bytes_in, 0, FilterTelemetry.snapshot())
+
+        for name, args in operations:
+            if processor.apply_operation(name, *args) is None:
+                return (filepath, False, f"operation '{name}' failed", bytes_in, 0,
+                        FilterTelemetry.snapshot())
+
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        if not cv2.imwrite(output_path, processor.current_view):
+            return (filepath, False, "could not write output", bytes_in, 0, FilterTelemetry.snapshot())
+        return (filepath, True, None, bytes_in, os.path.getsize(output_path), FilterTelemetry.snapshot())
+    except Exception as e:
+        return (filepath, False, str(e), 0, 0, FilterTelemetry.snapshot())
+
+
+class BatchReport:
+    """Result of a batch run: counts, failures and throughput."""
+
+    def __init__(self):
+        self.succeeded = 0
+        self.failures = []  # list of (filepath, error message)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.elapsed = 0.0
+
+    @property
+    def total(self):
+        """PROPERTY: Number of files attempted."""
+        return self.succeeded + len(self.failures)
+
+    @property
+    def images_per_second(self):
+        """PROPERTY: Throughput in images per second."""
+        return self.total / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def mb_per_second(self):
+        """PROPERTY: Input throughput in megabytes per second."""
+        return self.bytes_in / (1024 * 1024) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        """String representation for users."""
+        return (f"Processed {self.total} images in {self.elapsed:.2f}s "
+                f"({self.succeeded} ok, {len(self.failures)} failed) | "
+                f"{self.images_per_second:.1f} images/s | {self.mb_per_second:.1f} MB/s")
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"BatchReport(succeeded={self.succeeded}, failed={len(self.failures)})"
+
+
+class BatchProcessor:
+    """
+    Headless batch engine.
+    Applies a sequence of ImageProcessor operations to many files,
+    spreading the work across all cores with a process pool.
+    """
+
+    def __init__(self, operations, output_dir, workers=None, output_format=None):
+        """
+        operations: list of (name, args) tuples or spec strings like 'blur=15'
+        output_format: optional extension (e.g. 'png') for all outputs
+        """
+        self.operations = [self.parse_operation(op) if isinstance(op, str) else op
+                           for op in operations]
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.output_format = output_format.lower().lstrip('.') if output_format else None
+
+    @staticmethod
+    def parse_operation(spec):
+        """
+        STATIC METHOD
+        Parse 'grayscale', 'blur=15', 'blur=45:fast', 'rotate=90',
+        'flip=horizontal', 'brightness=-20', 'contrast=1.5' or
+        'resize=800x600' into (name, args).
+        """
+        name, _, value = spec.strip().partition('=')
+        name = name.strip().lower()
+        if name not in ImageProcessor.OPERATIONS:
+            raise ValueError(f"Unknown operation: {name}")
+
+        if name in ('grayscale', 'edge'):
+            return (name, ())
+        if not value:
+            raise ValueError(f"Operation '{name}' needs a value, e.g. {name}=...")
+
+        if name == 'blur':
+            intensity, _, mode = value.partition(':')
+            if mode and mode not in BlurFilter.MODES:
+                raise ValueError(f"blur mode must be one of {BlurFilter.MODES}")
+            return (name, (int(intensity), 'fast') if mode == 'fast' else (int(intensity),))
+        if name == 'brightness':
+            return (name, (int(value),))
+        if name == 'rotate':
+            if int(value) not in RotateFilter.ROTATE_CODES:
+                raise ValueError("rotate must be 90, 180 or 270")
+            return (name, (int(value),))
+        if name == 'contrast':
+            return (name, (float(value),))
+        if name == 'flip':
+            if value not in FlipFilter.FLIP_CODES:
+                raise ValueError("flip must be 'horizontal' or 'vertical'")
+            return (name, (value,))
+        width, _, height = value.lower().partition('x')
+        return (name, (int(width), int(height)))
+
+    @staticmethod
+    def find_images(paths, recursive=False):
+        """
+        STATIC METHOD
+        Expand files and folders into (filepath, relative output name) pairs.
+        """
+        found = []
+        for path in paths:
+            if os.path.isdir(path):
+                if recursive:
+                    walker = ((root, files) for root, _, files in os.walk(path))
+                else:
+                    walker = [(path, os.listdir(path))]
+                for root, files in walker:
+                    for filename in sorted(files):
+                        filepath = os.path.join(root, filename)
+                        if os.path.isfile(filepath) and FileHandler.validate_file_format(filepath):
+                            found.append((filepath, os.path.relpath(filepath, path)))
+            elif os.path.isfile(path) and FileHandler.validate_file_format(path):
+                found.append((path, os.path.basename(path)))
+        return found
+
+    def _output_path(self, relative_name):
+        """Build the output path for an input file."""
+        if self.output_format:
+            relative_name = os.path.splitext(relative_name)[0] + '.' + self.output_format
+        return os.path.join(self.output_dir, relative_name)
+
+    @staticmethod
+    def check_outputs(pairs):
+        """
+        STATIC METHOD
+        Raise ValueError if two inputs would write the same output file,
+        e.g. a.jpg and a.png with --format png.
+        pairs: (input path, output path) tuples
+        """
+        seen = {}
+        for filepath, output_path in pairs:
+            key = os.path.normcase(os.path.abspath(output_path))
+            if key in seen:
+                raise ValueError(f"'{seen[key]}' and '{filepath}' would both be written "
+                                 f"to '{output_path}'")
+            seen[key] = filepath
+
+    def run(self, inputs, progress=None):
+        """
+        Process all inputs (list of (filepath, relative name) pairs).
+        progress: optional callback(done, total, result) called per file.
+        Filter telemetry from the workers is merged into FilterTelemetry.
+        Raises ValueError, before processing anything, if two inputs map
+        to the same output file.
+        """
+        jobs = [(filepath, self._output_path(name), self.operations) for filepath, name in inputs]
+        self.check_outputs((filepath, output_path) for filepath, output_path, _ in jobs)
+        report = BatchReport()
+        chunksize = max(1, min(64, len(jobs) // (self.workers * 4)))
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for done, result in enumerate(executor.map(_process_file, jobs, chunksize=chunksize), 1):
+                filepath, ok, error, bytes_in, bytes_out, metrics = result
+                FilterTelemetry.merge(metrics)
+                report.bytes_in += bytes_in
+                report.bytes_out += bytes_out
+                if ok:
+                    report.succeeded += 1
+                else:
+                    report.failures.append((filepath, error))
+                if progress:
+                    progress(done, len(jobs), result)
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    # MAGIC METHODS
+    def __len__(self):
+        """Return number of operations applied to each image."""
+        return len(self.operations)
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"BatchProcessor(operations={self.operations}, workers={self.workers})"
+
+
+def main(argv=None):
+    """Command-line entry point for headless batch processing."""
+    parser = argparse.ArgumentParser(
+        description="Apply image editor operations to many files without the GUI.")
+    parser.add_argument('inputs', nargs='+', help="image files or folders")
+    parser.add_argument('-o', '--output', required=True, help="output folder")
+    parser.add_argument('--op', action='append', default=[], dest='operations',
+                        help="operation to apply, repeatable and applied in order "
+                             "(grayscale, edge, blur=N[:fast], brightness=N, contrast=F, "
+                             "rotate=90|180|270, flip=horizontal|vertical, resize=WxH)")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="number of worker processes (default: all cores)")
+    parser.add_argument('-r', '--recursive', action='store_true', help="search folders recursively")
+    parser.add_argument('--format', default=None, help="output format extension, e.g. png")
+    parser.add_argument('-q', '--quiet', action='store_true', help="only print the summary")
+    parser.add_argument('--metrics-out', default=None,
+                        help="write filter telemetry to this file (.json, otherwise Prometheus text)")
+    args = parser.parse_args(argv)
+
+    try:
+        batch = BatchProcessor(args.operations, args.output, args.workers, args.format)
+    except ValueError as e:
+        parser.error(str(e))
+
+    inputs = batch.find_images(args.inputs, args.recursive)
+    if not inputs:
+        print("No supported images found.")
+        return 1
+
+    def show_progress(done, total, result):
+        filepath, ok, error = result[:3]
+        if not ok:
+            print(f"  FAILED {filepath}: {error}", file=sys.stderr)
+        elif not args.quiet and (done % 100 == 0 or done == total):
+            print(f"  {done}/{total} done")
+
+    try:
+        report = batch.run(inputs, progress=show_progress)
+    except ValueError as e:
+        parser.error(str(e))
+    print(report)
+    if args.metrics_out:
+        FilterTelemetry.export(args.metrics_out)
+    return 0 if not report.failures else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
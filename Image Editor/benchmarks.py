@@ -0,0 +1,474 @@
+# benchmarks.py
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+from base_classes import CopyTracker
+from filters import (GrayscaleFilter, BlurFilter, EdgeDetectionFilter,
+                     BrightnessFilter, ContrastFilter, RotateFilter, FlipFilter,
+                     ResizeFilter, AdvancedImageProcessor)
+from history_manager import HistoryManager
+from image_processor import ImageProcessor
+from operation_history import OperationHistory
+from pipeline_optimizer import PipelineOptimizer
+from shared_pool import PickledWorkerPool, SharedMemoryWorkerPool
+
+
+class BenchmarkSuite:
+    """
+    Times filters, ImageProcessor operations, history and filter chains
+    on synthetic images of several sizes and channel counts.
+    Results are plain dicts keyed by 'group/case/WxHxC', so a run can be
+    saved as JSON and compared against a baseline run.
+    """
+
+    # CLASS ATTRIBUTES
+    default_sizes = [(640, 480), (1920, 1080), (4000, 3000)]
+    default_channels = [3, 1]
+    batch_image_size = (256, 256)  # (width, height) of each image in a batch stack
+    transport_frames = 8  # frames per run in the transport cases
+    transport_workers = 2
+    format_version = 1
+    min_sample_ms = 5.0  # fast cases are looped so each sample takes at least this long
+
+    def __init__(self, sizes=None, channels=None, repeat=5, warmup=1, batch_count=1000):
+        """
+        sizes: list of (width, height)
+        channels: list of channel counts (1 = grayscale, 3 = BGR)
+        repeat: timed runs per case (the median is reported)
+        batch_count: images per stack in the batch cases (0 skips them)
+        """
+        self.sizes = sizes or BenchmarkSuite.default_sizes
+        self.channels = channels or BenchmarkSuite.default_channels
+        self.repeat = repeat
+        self.warmup = warmup
+        self.batch_count = batch_count
+
+    # STATIC METHODS
+    @staticmethod
+    def synthetic_image(width, height, channels=3, seed=0):
+        """
+        STATIC METHOD
+        Deterministic test image: smooth gradients, hard-edged shapes and
+        noise, so filters see both flat areas and detail.
+        """
+        rng = np.random.default_rng(seed)
+        y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+        planes = [(x / width) * 255, (y / height) * 255, ((x + y) / (width + height)) * 255]
+        image = np.dstack(planes[:max(channels, 1)] + planes[:max(0, channels - 3)])
+        for _ in range(12):
+            cx, cy = rng.integers(0, width), rng.integers(0, height)
+            radius = int(rng.integers(4, max(5, min(width, height) // 6)))
+            cv2.circle(image, (int(cx), int(cy)), radius, rng.integers(0, 256, 4).tolist(), -1)
+        image += rng.normal(0, 8, image.shape).astype(np.float32)
+        image = np.clip(image, 0, 255).astype(np.uint8)
+        return image[:, :, 0] if channels == 1 else image
+
+    @staticmethod
+    def synthetic_stack(count, width, height, channels=3):
+        """
+        STATIC METHOD
+        Read-only (count, height, width[, channels]) stack of different
+        images, made by shifting one synthetic image.
+        """
+        image = BenchmarkSuite.synthetic_image(width, height, channels)
+        stack = np.stack([np.roll(image, index, axis=1) for index in range(count)])
+        stack.flags.writeable = False
+        return stack
+
+    @staticmethod
+    def compare(results, baseline, threshold=0.15):
+        """
+        STATIC METHOD
+        Compare two result dicts by median time.
+        Returns rows of (name, baseline_ms, current_ms, ratio, status) where
+        status is 'regression', 'improvement', 'ok', 'new' or 'missing'.
+        """
+        rows = []
+        for name in sorted(set(results) | set(baseline)):
+            current = results.get(name, {}).get('median_ms')
+            previous = baseline.get(name, {}).get('median_ms')
+            if current is None and previous is None:
+                continue  # skipped in both runs
+            if previous is None:
+                rows.append((name, None, current, None, 'new'))
+            elif current is None:
+                rows.append((name, previous, None, None, 'missing'))
+            else:
+                ratio = current / previous if previous > 0 else float('inf')
+                if ratio > 1 + threshold:
+                    status = 'regression'
+                elif ratio < 1 - threshold:
+                    status = 'improvement'
+                else:
+                    status = 'ok'
+                rows.append((name, previous, current, ratio, status))
+        return rows
+
+    @staticmethod
+    def load(path):
+        """STATIC METHOD: Read a saved run; returns (meta, results)."""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get('meta', {}), data.get('results', {})
+
+    def save(self, path, results):
+        """Write a run with details of the machine and libraries it ran on."""
+        data = {'meta': self.environment(), 'results': results}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+    def environment(self):
+        """Details needed to judge whether two runs are comparable."""
+        return {
+            'format_version': self.format_version,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'opencv_threads': cv2.getNumThreads(),
+            'repeat': self.repeat,
+        }
+
+    # Cases: each returns a list of (name, run, prepare) where prepare()
+    # runs untimed before every run()
+    def _filter_cases(self, image):
+        """One case per filter class, timing apply() alone."""
+        height, width = image.shape[:2]
+        filters = [
+            GrayscaleFilter(),
+            BlurFilter(5),
+            BlurFilter(15),
+            EdgeDetectionFilter(),
+            BrightnessFilter(30),
+            ContrastFilter(1.5),
+            RotateFilter(90),
+            FlipFilter('horizontal'),
+            ResizeFilter(width // 2, height // 2),
+        ]
+        cases = []
+        for filter_obj in filters:
+            label = type(filter_obj).__name__
+            if isinstance(filter_obj, BlurFilter):
+                label += f"({filter_obj.intensity})"
+            cases.append((f"filter/{label}", lambda f=filter_obj: f.apply(image), None))
+        return cases
+
+    def _processor_cases(self, image):
+        """
+        ImageProcessor operations through apply_operation(), including the
+        processor's own bookkeeping, plus the copying and viewing accessors.
+        """
+        height, width = image.shape[:2]
+        processor = ImageProcessor()
+        operations = [
+            ('grayscale', ()),
+            ('blur', (15,)),
+            ('edge', ()),
+            ('brightness', (30,)),
+            ('contrast', (1.5,)),
+            ('rotate', (90,)),
+            ('flip', ('horizontal',)),
+            ('resize', (width // 2, height // 2)),
+        ]
+        cases = []
+        for name, args in operations:
+            cases.append((f"processor/{name}",
+                          lambda n=name, a=args: processor.apply_operation(n, *a),
+                          lambda: processor.set_current_image(image)))
+        cases.append(("processor/current_image", lambda: processor.current_image,
+                      lambda: processor.set_current_image(image)))
+        cases.append(("processor/current_view", lambda: processor.current_view,
+                      lambda: processor.set_current_image(image)))
+        return cases
+
+    def _history_cases(self, image):
+        """save_state and undo for raw and compressed snapshots, and operation history."""
+        edited = cv2.convertScaleAbs(image, alpha=1, beta=20)
+        edited.flags.writeable = False
+        cases = []
+        for label, compress in (('raw', False), ('compressed', True)):
+            state = {}
+
+            def prepare_save(compress=compress, state=state):
+                state['history'] = HistoryManager(compress=compress)
+                state['history'].save_state(image)
+
+            def prepare_undo(compress=compress, state=state):
+                prepare_save(compress, state)
+                state['history'].save_state(edited)
+
+            cases.append((f"history/save_state/{label}",
+                          lambda state=state: state['history'].save_state(edited), prepare_save))
+            cases.append((f"history/undo/{label}",
+                          lambda state=state: state['history'].undo(), prepare_undo))
+
+        state = {}
+
+        def prepare_operations():
+            state['history'] = OperationHistory()
+            state['history'].save_state(image)
+
+        def prepare_operations_undo():
+            prepare_operations()
+            state['history'].record_operation('brightness', (20,), edited)
+
+        cases.append(("history/record_operation/operations",
+                      lambda: state['history'].record_operation('brightness', (20,), edited),
+                      prepare_operations))
+        cases.append(("history/undo/operations", lambda: state['history'].undo(),
+                      prepare_operations_undo))
+        return cases
+
+    def _chain_cases(self, image):
+        """AdvancedImageProcessor chains, as written and with the optimizer."""
+        height, width = image.shape[:2]
+        cases = []
+        for label, optimizer in (('plain', None), ('optimized', PipelineOptimizer())):
+            chain = AdvancedImageProcessor(optimizer=optimizer)
+            for filter_obj in (BrightnessFilter(20), ContrastFilter(1.3), BlurFilter(7),
+                               RotateFilter(90), FlipFilter('horizontal'),
+                               ResizeFilter(width // 2, height // 2)):
+                chain.add_filter(filter_obj)
+            cases.append((f"chain/{label}", lambda c=chain: c.apply(image), None))
+        return cases
+
+    def _lazy_cases(self, image):
+        """
+        An edit chain applied, and deferred, on an ImageProcessor, read back at
+        full resolution and rendered for an 800x600 display.
+        """
+        operations = [('brightness', (20,)), ('contrast', (1.3,)), ('brightness', (-10,)),
+                      ('blur', (15,)), ('rotate', (90,))]
+        cases = []
+        for label, method in (('eager', 'apply_operation'), ('lazy', 'defer_operation')):
+            processor = ImageProcessor()
+
+            def edit(processor=processor, method=method):
+                for name, args in operations:
+                    getattr(processor, method)(name, *args)
+                return processor
+
+            cases.append((f"lazy/{label}/full", lambda e=edit: e().current_view,
+                          lambda p=processor: p.set_current_image(image)))
+            cases.append((f"lazy/{label}/display", lambda e=edit: e().render(800, 600),
+                          lambda p=processor: p.set_current_image(image)))
+        return cases
+
+    def _batch_cases(self, get_stack):
+        """
+        Filters on a stack of images: apply() in a per-image loop against
+        one apply_batch() call. get_stack() builds the stack on first use,
+        so filtered-out runs never pay for it.
+        """
+        cases = []
+        for filter_obj in (BrightnessFilter(30), ContrastFilter(1.5), GrayscaleFilter(),
+                           BlurFilter(5), EdgeDetectionFilter()):
+            label = type(filter_obj).__name__
+            cases.append((f"batch/loop/{label}",
+                          lambda f=filter_obj: [f.apply(image) for image in get_stack()], get_stack))
+            cases.append((f"batch/apply_batch/{label}",
+                          lambda f=filter_obj: f.apply_batch(get_stack()), get_stack))
+        return cases
+
+    def _transport_cases(self, image, pools):
+        """
+        Frames sent to worker processes and back, pickled through the
+        executor's pipes, against frames passed in shared-memory segments.
+        pools: dict the worker pools are kept in, started on first use
+        """
+        frames = [image] * self.transport_frames
+        operations = [('brightness', (5,))]
+        kinds = {'pickle': PickledWorkerPool, 'shared_memory': SharedMemoryWorkerPool}
+
+        def get_pool(kind):
+            if kind not in pools:
+                pools[kind] = kinds[kind](workers=self.transport_workers)
+            return pools[kind]
+
+        return [(f"transport/{kind}", lambda kind=kind: list(get_pool(kind).map(frames, operations)),
+                 lambda kind=kind: get_pool(kind)) for kind in kinds]
+
+    def cases(self, image):
+        """All cases for one image."""
+        return (self._filter_cases(image) + self._processor_cases(image)
+                + self._history_cases(image) + self._chain_cases(image)
+                + self._lazy_cases(image))
+
+    def workloads(self):
+        """
+        Yield (suffix, pixels, cases) for each image size and channel
+        count, with its transport cases, then for a batch stack per
+        channel count.
+        """
+        frames = self.transport_frames
+        pools = {}
+        try:
+            for width, height in self.sizes:
+                for channels in self.channels:
+                    image = self.synthetic_image(width, height, channels)
+                    image.flags.writeable = False
+                    yield f"{width}x{height}x{channels}", width * height, self.cases(image)
+                    yield (f"{frames}x{width}x{height}x{channels}", frames * width * height,
+                           self._transport_cases(image, pools))
+        finally:
+            for pool in pools.values():
+                pool.close()
+
+        if not self.batch_count:
+            return
+        count = self.batch_count
+        width, height = self.batch_image_size
+        for channels in self.channels:
+            stacks = []
+
+            def get_stack(channels=channels, stacks=stacks):
+                if not stacks:
+                    stacks.append(self.synthetic_stack(count, width, height, channels))
+                return stacks[0]
+
+            yield (f"{count}x{width}x{height}x{channels}", count * width * height,
+                   self._batch_cases(get_stack))
+
+    def _time(self, run, prepare=None):
+        """
+        Run a case warmup + repeat times; returns timings (ms per run) and
+        copies per run. Cases without prepare() are looped within a sample
+        until it lasts min_sample_ms, so very fast cases are not just noise.
+        """
+        number = 1
+        for _ in range(self.warmup):
+            if prepare:
+                prepare()
+            start = time.perf_counter()
+            run()
+            single_ms = (time.perf_counter() - start) * 1000
+            if prepare is None:
+                number = max(1, int(self.min_sample_ms / max(single_ms, 1e-4)))
+
+        timings = []
+        copies = 0
+        for _ in range(self.repeat):
+            if prepare:
+                prepare()
+            copies_before = CopyTracker.copies_made
+            start = time.perf_counter()
+            for _ in range(number):
+                run()
+            timings.append((time.perf_counter() - start) * 1000 / number)
+            copies += CopyTracker.copies_made - copies_before
+        return timings, copies / (self.repeat * number)
+
+    def run(self, pattern=None, progress=None):
+        """
+        Run every case (or those matching a glob pattern, e.g. 'filter/*').
+        progress: optional callback(name, result) after each case.
+        Cases that fail (e.g. a filter that needs colour input) are
+        recorded with an 'error' instead of timings.
+        """
+        results = {}
+        for suffix, pixels, cases in self.workloads():
+            for name, run, prepare in cases:
+                if pattern and not fnmatch.fnmatch(name, pattern):
+                    continue
+                key = f"{name}/{suffix}"
+                try:
+                    timings, copies = self._time(run, prepare)
+                except Exception as e:
+                    message = " ".join(str(e).split())
+                    results[key] = {'error': f"{type(e).__name__}: {message[:120]}"}
+                else:
+                    median = statistics.median(timings)
+                    results[key] = {
+                        'median_ms': round(median, 4),
+                        'min_ms': round(min(timings), 4),
+                        'mean_ms': round(statistics.mean(timings), 4),
+                        'megapixels_per_s': round(pixels / 1e6 / (median / 1000), 2)
+                        if median > 0 else None,
+                        'copies_per_run': copies,
+                    }
+                if progress:
+                    progress(key, results[key])
+        return results
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"BenchmarkSuite(sizes={self.sizes}, channels={self.channels}, repeat={self.repeat})"
+
+
+def _parse_size(value):
+    """argparse type for 'WxH'."""
+    width, _, height = value.lower().partition('x')
+    try:
+        return (int(width), int(height))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"size must look like 1920x1080, got '{value}'")
+
+
+def main(argv=None):
+    """Command-line entry point: run the suite, save it and compare to a baseline."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the image editor's filters, operations, history and chains.")
+    parser.add_argument('--size', action='append', type=_parse_size, dest='sizes',
+                        help="image size WxH, repeatable (default: 640x480, 1920x1080, 4000x3000)")
+    parser.add_argument('--channels', action='append', type=int, choices=(1, 3, 4),
+                        help="channel count, repeatable (default: 3 and 1)")
+    parser.add_argument('-n', '--repeat', type=int, default=5, help="timed runs per case")
+    parser.add_argument('--batch', type=int, default=1000,
+                        help="images of 256x256 per stack in the batch cases (0 skips them)")
+    parser.add_argument('-k', '--cases', default=None,
+                        help="only run cases matching this pattern, e.g. 'filter/*'")
+    parser.add_argument('-o', '--output', help="save results to this JSON file")
+    parser.add_argument('--baseline', help="compare against a saved JSON run")
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help="slowdown ratio flagged as a regression (default: 0.15 = 15%%)")
+    args = parser.parse_args(argv)
+
+    suite = BenchmarkSuite(args.sizes, args.channels, args.repeat, batch_count=args.batch)
+
+    def show(name, result):
+        if 'error' in result:
+            print(f"  {name:<55} skipped ({result['error']})")
+        else:
+            print(f"  {name:<55} {result['median_ms']:>10.2f} ms "
+                  f"{result['megapixels_per_s'] or 0:>9.1f} MP/s  copies {result['copies_per_run']:.0f}")
+
+    results = suite.run(args.cases, progress=show)
+    if args.output:
+        suite.save(args.output, results)
+        print(f"Saved {len(results)} results to {args.output}")
+
+    if not args.baseline:
+        return 0
+    meta, baseline = suite.load(args.baseline)
+    print(f"\nCompared with {args.baseline} ({meta.get('timestamp', 'unknown date')}):")
+    regressions = 0
+    missing = 0
+    for name, previous, current, ratio, status in suite.compare(results, baseline, args.threshold):
+        if status == 'missing':
+            missing += 1  # in the baseline but not run this time
+            continue
+        if status == 'new':
+            print(f"  {name:<55} new")
+            continue
+        marker = {'regression': '  <-- REGRESSION', 'improvement': '  (faster)'}.get(status, '')
+        print(f"  {name:<55} {previous:>9.2f} -> {current:>9.2f} ms  x{ratio:.2f}{marker}")
+        regressions += status == 'regression'
+    if missing:
+        print(f"  ({missing} baseline cases were not run)")
+    print(f"{regressions} regression(s) above {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
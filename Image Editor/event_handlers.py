@@ -2,11 +2,22 @@
 from tkinter import filedialog, messagebox
 import cv2
 import os
+import threading
+import time
+from collections import deque
 from PIL import Image, ImageTk
+from base_classes import CopyTracker, FilterTelemetry
+from filters import BlurFilter, BrightnessFilter, ContrastFilter
+from image_processor import ImageProcessor
+from pyramid_viewer import PyramidViewer
+from task_runner import BackgroundTaskRunner
 
 class EventHandlers:
     """Handles all user events (button clicks, menu actions, etc.)"""
     
+    # CLASS ATTRIBUTE - status bar spinner frames while an operation runs
+    SPINNER_FRAMES = '|/-\\'
+    
     def __init__(self, processor, history, canvas, status_bar):
         """Initialize with references to other components."""
         self.processor = processor
@@ -15,6 +26,38 @@ class EventHandlers:
         self.status_bar = status_bar
         self.current_filepath = None
         self.tk_image = None
+        self.runner = BackgroundTaskRunner(canvas)
+        self.__running_operation = None  # (name, args) of the operation in flight
+        self.__queued_operations = deque()  # (name, args) waiting to run, in order
+        self.__workers = threading.local()  # one ImageProcessor per runner thread
+        
+        # File I/O runs on its own workers so it never supersedes an operation
+        self.loader = BackgroundTaskRunner(canvas, max_workers=1)
+        self.saver = BackgroundTaskRunner(canvas, max_workers=1)
+        self.__load_started = None
+        self.__loading_text = None
+        self.__first_paint_time = None  # seconds from Open to the first pixels
+        self.__save_latency = None  # seconds from Save to the file being written
+        
+        # Live slider preview on a canvas-sized proxy of the current image
+        self.__preview_filters = {
+            'blur': BlurFilter(),
+            'brightness': BrightnessFilter(),
+            'contrast': ContrastFilter()
+        }
+        self.__preview_request = None
+        self.__preview_scheduled = False
+        self.__proxy_key = None
+        self.__proxy = None
+        self.__proxy_scale = 1.0
+        
+        # Display cache: the PhotoImage is rebuilt only when the key changes
+        self.__display_key = None
+        self.__resize_job = None
+        self.canvas.bind('<Configure>', self._on_canvas_resize)
+        
+        # Zoom/pan viewer; takes over drawing when not fitted to the window
+        self.viewer = PyramidViewer(canvas, on_change=self._on_view_change)
     
     def open_image(self):
         """Open an image file."""
@@ -29,16 +72,70 @@ class EventHandlers:
         )
         
         if filepath:
-            success = self.processor.load_image(filepath)
-            if success:
-                self.current_filepath = filepath
-                self.history.clear_history()
-                self.history.save_state(self.processor.current_image)
-                self.display_image()
-                self.update_status()
-                messagebox.showinfo("Success", "Image loaded successfully!")
-            else:
-                messagebox.showerror("Error", "Failed to load image!")
+            self._cancel_operations()
+            self._start_load(filepath)
+    
+    def _start_load(self, filepath):
+        """
+        Decode a file in the background.
+        A cached thumbnail, or for JPEGs a reduced-resolution decode, is
+        painted first; the full decode then replaces it.
+        """
+        self.__load_started = time.perf_counter()
+        self.__first_paint_time = None
+        self.__loading_text = f"Loading {os.path.basename(filepath)}"
+        info = self.processor.get_image_info(filepath)
+        if info:
+            self.__loading_text += f" ({info['width']}x{info['height']})"
+        
+        cache = self.processor.thumbnail_cache
+        cached = cache.get(filepath) if cache is not None else None
+        if cached is not None:
+            self._show_load_preview(filepath, cached[0])
+            return
+        
+        max_width, max_height = self._display_area()
+        self.loader.submit(
+            lambda: ImageProcessor.decode_reduced(filepath, max_width, max_height),
+            on_done=lambda preview: self._show_load_preview(filepath, preview),
+            on_error=lambda error: self._finish_load(filepath, None),
+            on_tick=lambda elapsed: self._show_progress(self.__loading_text, elapsed),
+            label='load'
+        )
+    
+    def _show_load_preview(self, filepath, preview):
+        """Main thread: paint the reduced decode, then start the full decode."""
+        if preview is not None:
+            self._show_image(preview)
+            self._mark_first_paint()
+        
+        self.loader.submit(
+            lambda: self.processor.decode_file(filepath),
+            on_done=lambda image: self._finish_load(filepath, image),
+            on_error=lambda error: self._finish_load(filepath, None),
+            on_tick=lambda elapsed: self._show_progress(self.__loading_text, elapsed),
+            label='load'
+        )
+    
+    def _finish_load(self, filepath, image):
+        """Main thread: install the fully decoded image."""
+        if self.processor.set_loaded_image(image, filepath):
+            self.current_filepath = filepath
+            self.history.clear_history()
+            self.history.save_state(self.processor.current_view)
+            self.display_image()
+            if self.__first_paint_time is None:
+                self._mark_first_paint()
+            self.update_status()
+            messagebox.showinfo("Success", "Image loaded successfully!")
+        else:
+            self.update_status()
+            messagebox.showerror("Error", "Failed to load image!")
+    
+    def _mark_first_paint(self):
+        """Flush the canvas and record the time to first pixels."""
+        self.canvas.update_idletasks()
+        self.__first_paint_time = time.perf_counter() - self.__load_started
     
     def save_image(self):
         """Save image (overwrites current file)."""
@@ -46,17 +143,14 @@ class EventHandlers:
             self.save_as_image()
             return
         
-        current_img = self.processor.current_image
-        if current_img is not None:
-            cv2.imwrite(self.current_filepath, current_img)
-            messagebox.showinfo("Success", "Image saved successfully!")
+        if self.processor.has_image:
+            self._start_save(self.current_filepath)
         else:
             messagebox.showwarning("Warning", "No image to save!")
     
     def save_as_image(self):
         """Save image to a new file."""
-        current_img = self.processor.current_image
-        if current_img is None:
+        if not self.processor.has_image:
             messagebox.showwarning("Warning", "No image to save!")
             return
         
@@ -66,72 +160,68 @@ class EventHandlers:
         )
         
         if filepath:
-            cv2.imwrite(filepath, current_img)
+            self._start_save(filepath)
+    
+    def _start_save(self, filepath):
+        """
+        Encode and write a snapshot of the current image on a worker thread.
+        The snapshot is a read-only view, so editing can continue meanwhile.
+        """
+        if self.saver.busy:
+            messagebox.showwarning("Warning", "A save is still in progress!")
+            return
+        
+        image = self.processor.current_view
+        started = time.perf_counter()
+        self.saver.submit(
+            lambda: cv2.imwrite(filepath, image),
+            on_done=lambda ok: self._finish_save(filepath, ok, started),
+            on_error=lambda error: self._finish_save(filepath, False, started),
+            label='save'
+        )
+        self.status_bar.config(text=f"Saving {os.path.basename(filepath)}...")
+    
+    def _finish_save(self, filepath, ok, started):
+        """Main thread: report a finished save."""
+        if ok:
             self.current_filepath = filepath
+            self.__save_latency = time.perf_counter() - started
+            self.update_status()
             messagebox.showinfo("Success", f"Image saved to:\n{filepath}")
+        else:
+            self.update_status()
+            messagebox.showerror("Error", f"Failed to save image to:\n{filepath}")
     
     def apply_grayscale(self):
         """Apply grayscale filter."""
-        if not self._check_image_loaded():
-            return
-        
-        self.history.save_state(self.processor.current_image)
-        self.processor.apply_grayscale()
-        self.display_image()
+        self._apply_operation('grayscale')
     
-    def apply_blur(self, intensity):
-        """Apply blur effect."""
-        if not self._check_image_loaded():
-            return
-        
-        self.history.save_state(self.processor.current_image)
-        self.processor.apply_blur(int(intensity))
-        self.display_image()
+    def apply_blur(self, intensity, mode='exact'):
+        """Apply blur effect ('fast' approximates large blurs in constant time)."""
+        if mode == 'fast':
+            self._apply_operation('blur', int(intensity), mode)
+        else:
+            self._apply_operation('blur', int(intensity))
     
     def apply_edge_detection(self):
         """Apply edge detection."""
-        if not self._check_image_loaded():
-            return
-        
-        self.history.save_state(self.processor.current_image)
-        self.processor.apply_edge_detection()
-        self.display_image()
+        self._apply_operation('edge')
     
     def apply_brightness(self, value):
         """Apply brightness adjustment."""
-        if not self._check_image_loaded():
-            return
-        
-        self.history.save_state(self.processor.current_image)
-        self.processor.adjust_brightness(int(value))
-        self.display_image()
+        self._apply_operation('brightness', int(value))
     
     def apply_contrast(self, value):
         """Apply contrast adjustment."""
-        if not self._check_image_loaded():
-            return
-        
-        self.history.save_state(self.processor.current_image)
-        self.processor.adjust_contrast(float(value))
-        self.display_image()
+        self._apply_operation('contrast', float(value))
     
     def rotate_image(self, angle):
         """Rotate image."""
-        if not self._check_image_loaded():
-            return
-        
-        self.history.save_state(self.processor.current_image)
-        self.processor.rotate_image(angle)
-        self.display_image()
+        self._apply_operation('rotate', angle)
     
     def flip_image(self, direction):
         """Flip image."""
-        if not self._check_image_loaded():
-            return
-        
-        self.history.save_state(self.processor.current_image)
-        self.processor.flip_image(direction)
-        self.display_image()
+        self._apply_operation('flip', direction)
     
     def resize_image(self, width_str, height_str):
         """Resize image based on user input."""
@@ -145,10 +235,7 @@ class EventHandlers:
             if width <= 0 or height <= 0:
                 raise ValueError("Dimensions must be positive")
             
-            self.history.save_state(self.processor.current_image)
-            self.processor.resize_image(width, height)
-            self.display_image()
-            self.update_status()
+            self._apply_operation('resize', width, height)
         except ValueError:
             messagebox.showerror("Error", "Please enter valid width and height values!")
     
@@ -159,13 +246,102 @@ class EventHandlers:
         
         confirm = messagebox.askyesno("Confirm Reset", "Reset to original image? This will clear history.")
         if confirm:
+            self._cancel_operations()
             self.processor.reset_to_original()
             self.history.clear_history()
-            self.history.save_state(self.processor.current_image)
+            self.history.save_state(self.processor.current_view)
             self.display_image()
     
+    def _apply_operation(self, name, *args):
+        """
+        Run a processor operation on a worker thread.
+        While one runs, new operations are queued and each runs on the
+        previous result, so quick repeated clicks all take effect. The only
+        exception is a new value for the slider operation in flight with
+        nothing queued behind it (e.g. a different blur strength): it
+        replaces the running one, since both start from the same image.
+        """
+        if not self._check_image_loaded():
+            return
+        
+        if self.runner.busy:
+            running = self.__running_operation
+            if (not self.__queued_operations and running is not None and running[0] == name
+                    and name in self.__preview_filters and running[1] != args):
+                self._start_operation(name, args)
+            else:
+                self.__queued_operations.append((name, args))
+            return
+        self._start_operation(name, args)
+    
+    def _start_operation(self, name, args):
+        """Submit an operation on a snapshot of the current image."""
+        source = self.processor.current_view
+        self.__running_operation = (name, args)
+        
+        def work():
+            worker = self._worker_processor()
+            worker.set_current_image(source)
+            return worker.apply_operation(name, *args)
+        
+        self.runner.submit(
+            work,
+            on_done=lambda result: self._finish_operation(name, args, result),
+            on_error=self._operation_failed,
+            on_tick=lambda elapsed: self._show_progress(f"Applying {name}", elapsed),
+            label=name
+        )
+    
+    def _worker_processor(self):
+        """
+        Worker thread: this thread's ImageProcessor, made on first use.
+        Tasks on different threads never share state, and building one per
+        thread (not per task) keeps images_processed_count meaningful; the
+        (thread-safe) result cache is shared.
+        """
+        worker = getattr(self.__workers, 'processor', None)
+        if worker is None:
+            worker = ImageProcessor(result_cache=self.processor.result_cache)
+            self.__workers.processor = worker
+        return worker
+    
+    def _finish_operation(self, name, args, result):
+        """Main thread: apply a finished result to the canvas and history."""
+        self.__running_operation = None
+        if result is not None:
+            self.processor.set_current_image(result)
+            self.history.record_operation(name, args, result)
+            self.display_image()
+        self.update_status()
+        
+        if self.__queued_operations:
+            self._start_operation(*self.__queued_operations.popleft())
+    
+    def _operation_failed(self, error):
+        """Main thread: report a failed background operation."""
+        self.__running_operation = None
+        self.__queued_operations.clear()
+        self.update_status()
+        messagebox.showerror("Error", f"Operation failed:\n{error}")
+    
+    def _show_progress(self, action, elapsed):
+        """Animate the status bar while an operation or load runs."""
+        frame = self.SPINNER_FRAMES[int(elapsed * 8) % len(self.SPINNER_FRAMES)]
+        self.status_bar.config(text=f"{frame} {action}... {elapsed:.1f}s")
+    
+    def _cancel_operations(self):
+        """Drop running and queued operations (their results would be stale)."""
+        self.__running_operation = None
+        self.__queued_operations.clear()
+        if self.runner.busy:
+            self.runner.cancel()
+            self.update_status()
+    
     def undo_action(self):
         """Undo last action."""
+        if self.loader.busy:
+            return
+        self._cancel_operations()
         prev_image = self.history.undo()
         if prev_image is not None:
             self.processor.set_current_image(prev_image)
@@ -175,6 +351,9 @@ class EventHandlers:
     
     def redo_action(self):
         """Redo last undone action."""
+        if self.loader.busy:
+            return
+        self._cancel_operations()
         next_image = self.history.redo()
         if next_image is not None:
             self.processor.set_current_image(next_image)
@@ -182,25 +361,127 @@ class EventHandlers:
         else:
             messagebox.showinfo("Info", "Nothing to redo!")
     
+    def preview_operation(self, name, value, mode='exact'):
+        """
+        Slider moved: preview the effect on a canvas-sized proxy.
+        Ticks are coalesced so only the newest value is rendered.
+        The full-resolution image is only processed on Apply.
+        mode: blur mode ('exact' or 'fast'), so the preview matches Apply
+        """
+        if (not self.processor.has_image or self.loader.busy
+                or name not in self.__preview_filters):
+            return
+        self.__preview_request = (name, value, mode)
+        if not self.__preview_scheduled:
+            self.__preview_scheduled = True
+            self.canvas.after_idle(self._render_preview)
+    
+    def _render_preview(self):
+        """Apply the newest slider value to the proxy and show it."""
+        self.__preview_scheduled = False
+        if self.__preview_request is None:
+            return
+        name, value, mode = self.__preview_request
+        self.__preview_request = None
+        
+        proxy, scale = self._get_proxy()
+        filter_obj = self.__preview_filters[name]
+        if name == 'blur':
+            # Scale the kernel so the proxy looks like the full-size result
+            filter_obj.set_intensity(max(1, int(round(float(value) * scale))))
+            filter_obj.mode = mode
+        elif name == 'brightness':
+            filter_obj.value = int(float(value))
+        else:
+            filter_obj.value = float(value)
+        self._show_image(filter_obj.apply(proxy))
+    
+    def _get_proxy(self):
+        """Downscaled copy of the current image sized to the canvas (cached)."""
+        max_width, max_height = self._display_area()
+        key = (self.processor.version, max_width, max_height)
+        if key != self.__proxy_key:
+            width, height = self.processor.dimensions
+            scale = min(1.0, max_width / width, max_height / height)
+            # Deferred operations are computed at this size only
+            image = self.processor.render(max_width, max_height)
+            self.__proxy_key = key
+            self.__proxy = image
+            self.__proxy_scale = scale
+        return self.__proxy, self.__proxy_scale
+    
+    def _display_area(self):
+        """Size available for the image inside the canvas."""
+        canvas_width = self.canvas.winfo_width()
+        canvas_height = self.canvas.winfo_height()
+        if canvas_width > 1 and canvas_height > 1:
+            return (canvas_width - 20, canvas_height - 20)
+        return (800, 600)
+    
     def display_image(self):
-        """Display the current image on canvas."""
-        current_img = self.processor.current_image
-        if current_img is None:
+        """
+        Display the current image on canvas.
+        The converted image is cached per image version and canvas size,
+        so redraws without changes only re-place the existing PhotoImage.
+        """
+        if not self.processor.has_image or self.loader.busy:
+            return  # while loading, the reduced preview stays on the canvas
+        
+        self.viewer.set_image(self.processor.current_view, self.processor.version)
+        if self.viewer.active:
+            self.viewer.render()
+            self.__display_key = None
             return
         
-        self.canvas.delete('placeholder')
+        key = (self.processor.version,) + self._display_area()
+        if key == self.__display_key and self.tk_image is not None:
+            self._draw_photo()
+            return
         
-        image_rgb = cv2.cvtColor(current_img, cv2.COLOR_BGR2RGB)
-        pil_image = Image.fromarray(image_rgb)
+        proxy, _ = self._get_proxy()
+        self._show_image(proxy)
+        self.__display_key = key
+    
+    def _on_view_change(self):
+        """Zoom or pan changed: redraw and show the zoom level."""
+        self.display_image()
+        self.update_status()
+    
+    def _on_canvas_resize(self, event):
+        """Debounce window resizes: redraw once the size settles."""
+        if self.__resize_job is not None:
+            self.canvas.after_cancel(self.__resize_job)
+        self.__resize_job = self.canvas.after(150, self._redraw_after_resize)
+    
+    def _redraw_after_resize(self):
+        """Redraw for the new canvas size."""
+        self.__resize_job = None
+        self.display_image()
+    
+    def _show_image(self, current_img):
+        """
+        Draw a BGR or single-channel image centred on the canvas, fitted
+        to its size. Downscales first (area interpolation), then converts
+        only the small result to RGB.
+        """
+        max_width, max_height = self._display_area()
+        height, width = current_img.shape[:2]
+        scale = min(1.0, max_width / width, max_height / height)
+        if scale < 1.0:
+            size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            current_img = cv2.resize(current_img, size, interpolation=cv2.INTER_AREA)
         
+        code = cv2.COLOR_GRAY2RGB if current_img.ndim == 2 else cv2.COLOR_BGR2RGB
+        image_rgb = cv2.cvtColor(current_img, code)
+        self.tk_image = ImageTk.PhotoImage(Image.fromarray(image_rgb))
+        self.__display_key = None  # a preview or other image now replaces the cached one
+        self._draw_photo()
+    
+    def _draw_photo(self):
+        """Place the current PhotoImage in the centre of the canvas."""
         canvas_width = self.canvas.winfo_width()
         canvas_height = self.canvas.winfo_height()
         
-        if canvas_width > 1 and canvas_height > 1:
-            pil_image.thumbnail((canvas_width - 20, canvas_height - 20), Image.Resampling.LANCZOS)
-        
-        self.tk_image = ImageTk.PhotoImage(pil_image)
-        
         self.canvas.delete("all")
         self.canvas.create_image(
             canvas_width // 2 if canvas_width > 1 else 400,
@@ -215,12 +496,29 @@ class EventHandlers:
         if info:
             filename = os.path.basename(self.current_filepath) if self.current_filepath else "Untitled"
             status_text = f"File: {filename} | Size: {info['width']}x{info['height']} | Channels: {info['channels']}"
+            if self.viewer.active:
+                status_text += f" | Zoom: {self.viewer.zoom * 100:.0f}%"
+            stats = CopyTracker.get_stats()
+            status_text += f" | Copies/op: {stats['copies_per_operation']:.1f}"
+            status_text += f" | {FilterTelemetry.summary()}"
+            cache = self.processor.result_cache
+            if cache is not None:
+                cache_stats = cache.get_stats()
+                status_text += (f" | Cache: {cache_stats['hits']} hits, "
+                                f"{cache_stats['misses']} misses")
+            if self.__first_paint_time is not None:
+                status_text += f" | First paint: {self.__first_paint_time * 1000:.0f} ms"
+            if self.__save_latency is not None:
+                status_text += f" | Saved in: {self.__save_latency * 1000:.0f} ms"
             self.status_bar.config(text=status_text)
         else:
             self.status_bar.config(text="Ready")
     
     def _check_image_loaded(self):
         """Check if an image is loaded."""
+        if self.loader.busy:
+            messagebox.showwarning("Warning", "The image is still loading!")
+            return False
         if not self.processor.has_image:
             messagebox.showwarning("Warning", "Please load an image first!")
             return False
@@ -85,6 +85,20 @@ class GUIBuilder:
         
         return btn
     
+    @staticmethod
+    def bind_preview(slider, handlers, name, mode=None):
+        """
+        Send slider moves to the live preview handler, if there is one.
+        mode: optional callable giving the operation's current mode
+              (e.g. 'fast' or 'exact' blur), passed along with the value
+        """
+        if 'preview' not in handlers:
+            return
+        if mode is None:
+            slider.config(command=lambda value: handlers['preview'](name, value))
+        else:
+            slider.config(command=lambda value: handlers['preview'](name, value, mode()))
+    
     @staticmethod
     def create_control_panel(parent, handlers):
         """Create professional scrollable control panel."""
@@ -213,8 +227,26 @@ class GUIBuilder:
         blur_slider.set(5)
         blur_slider.pack(fill=tk.X, pady=3)
         
+        # Fast mode approximates large blurs with box filters (see BlurFilter)
+        fast_blur = tk.BooleanVar(value=False)
+        blur_mode = lambda: 'fast' if fast_blur.get() else 'exact'
+        GUIBuilder.bind_preview(blur_slider, handlers, 'blur', blur_mode)
+        tk.Checkbutton(
+            blur_frame,
+            text="Fast mode (large blurs)",
+            variable=fast_blur,
+            bg=GUIBuilder.COLORS['bg_dark'],
+            fg=GUIBuilder.COLORS['text_light'],
+            selectcolor=GUIBuilder.COLORS['bg_medium'],
+            activebackground=GUIBuilder.COLORS['bg_dark'],
+            activeforeground=GUIBuilder.COLORS['text_light'],
+            font=('Segoe UI', 8)
+        ).pack(anchor='w')
+        
         GUIBuilder.create_styled_button(
-            blur_frame, "Apply Blur", lambda: handlers['blur'](blur_slider.get()), 'accent', 24
+            blur_frame, "Apply Blur",
+            lambda: handlers['blur'](blur_slider.get(), blur_mode()),
+            'accent', 24
         ).pack(pady=2)
         
         # === ADJUSTMENTS SECTION ===
@@ -257,6 +289,7 @@ class GUIBuilder:
         )
         brightness_slider.set(0)
         brightness_slider.pack(fill=tk.X, pady=2)
+        GUIBuilder.bind_preview(brightness_slider, handlers, 'brightness')
         
         GUIBuilder.create_styled_button(
             adjust_frame, "Apply", lambda: handlers['brightness'](brightness_slider.get()), 'warning', 24
@@ -287,6 +320,7 @@ class GUIBuilder:
         )
         contrast_slider.set(1.0)
         contrast_slider.pack(fill=tk.X, pady=2)
+        GUIBuilder.bind_preview(contrast_slider, handlers, 'contrast')
         
         GUIBuilder.create_styled_button(
             adjust_frame, "Apply", lambda: handlers['contrast'](contrast_slider.get()), 'warning', 24
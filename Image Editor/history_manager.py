@@ -1,3 +1,37 @@
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from base_classes import CopyTracker
+
+
+class CompressedState:
+    """
+    One history state stored as zlib-compressed horizontal bands.
+    A keyframe stores every band; a delta stores only the bands that
+    differ from the previous state (as wrap-around differences).
+    """
+    
+    __slots__ = ('shape', 'dtype', 'bands', 'is_delta', 'depth', 'nbytes')
+    
+    def __init__(self, shape, dtype, bands, is_delta, depth):
+        self.shape = shape
+        self.dtype = dtype
+        self.bands = bands  # list of compressed bytes, None = unchanged band
+        self.is_delta = is_delta
+        self.depth = depth  # number of deltas back to the nearest keyframe
+        self.nbytes = sum(len(band) for band in bands if band is not None)
+
+
+class RawState:
+    """Uncompressed history state (a full copy of the image)."""
+    
+    __slots__ = ('image', 'nbytes')
+    
+    def __init__(self, image):
+        self.image = image
+        self.nbytes = image.nbytes
+
 
 class HistoryManager:
     
@@ -5,11 +39,29 @@ class HistoryManager:
     # CLASS ATTRIBUTE
     max_default_history = 20
     
-    def __init__(self, max_history=None):
-        """CONSTRUCTOR with default parameter."""
+    # CLASS ATTRIBUTES - compressed mode tuning
+    keyframe_interval = 8  # longest chain of deltas before a new keyframe
+    band_rows = 64  # rows per independently compressed band
+    
+    def __init__(self, max_history=None, max_bytes=None, compress=False, compression_level=1):
+        """
+        CONSTRUCTOR with default parameter.
+        max_bytes: memory budget for stored states; when set without
+                   max_history, the state count is not limited
+        compress: store states as compressed keyframes and deltas
+        """
         self.__history = []  # ENCAPSULATION: Private list
         self.__current_index = -1  # ENCAPSULATION: Private index
-        self.__max_history = max_history if max_history else HistoryManager.max_default_history
+        if max_history:
+            self.__max_history = max_history
+        else:
+            self.__max_history = None if max_bytes else HistoryManager.max_default_history
+        self.__max_bytes = max_bytes
+        self.__compress = compress
+        self.__compression_level = compression_level
+        self.__current_state = None  # decoded image at current index (compressed mode)
+        self.__bytes = 0  # running total of state.nbytes
+        self.__pool = ThreadPoolExecutor() if compress else None
     
     # PROPERTY DECORATORS
     @property
@@ -22,31 +74,167 @@ class HistoryManager:
         """PROPERTY: Get total history size."""
         return len(self.__history)
     
+    @property
+    def history_bytes(self):
+        """PROPERTY: Get memory used by all stored states in bytes."""
+        return self.__bytes
+    
+    @property
+    def is_compressed(self):
+        """PROPERTY: True if states are stored as compressed keyframes and deltas."""
+        return self.__compress
+    
+    def get_state_cost(self, index):
+        """Get bytes used to store the state at index."""
+        state = self.__history[index]
+        return state.nbytes
+    
+    # Compressed storage helpers
+    def _bands(self, image):
+        """Split an image into row bands (views, no copy)."""
+        rows = image.reshape(image.shape[0], -1)
+        return [rows[top:top + self.band_rows] for top in range(0, rows.shape[0], self.band_rows)]
+    
+    def _compress_band(self, band):
+        """Compress one band."""
+        return zlib.compress(np.ascontiguousarray(band), self.__compression_level)
+    
+    def _compress_delta_band(self, band):
+        """Compress one delta band, or return None if nothing changed."""
+        return self._compress_band(band) if band.any() else None
+    
+    def _encode(self, image, previous_state=None, previous_image=None):
+        """Encode image as a delta against the previous state, or as a keyframe."""
+        if (previous_state is not None and previous_state.shape == image.shape
+                and previous_state.dtype == image.dtype
+                and previous_state.depth < self.keyframe_interval):
+            diff = np.subtract(image, previous_image, dtype=image.dtype)
+            bands = list(self.__pool.map(self._compress_delta_band, self._bands(diff)))
+            return CompressedState(image.shape, image.dtype, bands, True, previous_state.depth + 1)
+        
+        bands = list(self.__pool.map(self._compress_band, self._bands(image)))
+        return CompressedState(image.shape, image.dtype, bands, False, 0)
+    
+    def _apply_bands(self, state, base, sign):
+        """Add (sign=1) or subtract (sign=-1) a delta, or decode a keyframe."""
+        image = np.empty(state.shape, state.dtype) if base is None else base.copy()
+        targets = self._bands(image)
+        
+        def decode(args):
+            target, data = args
+            if data is None:
+                return
+            values = np.frombuffer(zlib.decompress(data), state.dtype).reshape(target.shape)
+            if not state.is_delta:
+                target[:] = values
+            elif sign > 0:
+                np.add(target, values, out=target)
+            else:
+                np.subtract(target, values, out=target)
+        
+        list(self.__pool.map(decode, zip(targets, state.bands)))
+        return image
+    
+    def _decode(self, index):
+        """Rebuild the state at index from its keyframe and deltas."""
+        if index == self.__current_index and self.__current_state is not None:
+            return self.__current_state
+        start = index
+        while self.__history[start].is_delta:
+            start -= 1
+        image = self._apply_bands(self.__history[start], None, 1)
+        for position in range(start + 1, index + 1):
+            image = self._apply_bands(self.__history[position], image, 1)
+        return image
+    
+    def _evict_oldest(self):
+        """Drop the oldest state, turning the next one into a keyframe if needed."""
+        if self.__compress and len(self.__history) > 1 and self.__history[1].is_delta:
+            keyframe = self._encode(self._decode(1))
+            self.__bytes += keyframe.nbytes - self.__history[1].nbytes
+            self.__history[1] = keyframe
+            # Deltas after it now chain back to the new keyframe
+            for state in self.__history[2:]:
+                if not state.is_delta:
+                    break
+                state.depth -= 1
+        self.__bytes -= self.__history.pop(0).nbytes
+        self.__current_index -= 1
+    
+    def _over_budget(self):
+        """Check the state count and byte limits."""
+        if self.__max_history and len(self.__history) > self.__max_history:
+            return True
+        return bool(self.__max_bytes) and self.history_bytes > self.__max_bytes
+    
     def save_state(self, image):
         """Save current image state to history."""
         if image is None:
             return
         
-        self.__history = self.__history[:self.__current_index + 1]
-        self.__history.append(image.copy())
+        for state in self.__history[self.__current_index + 1:]:
+            self.__bytes -= state.nbytes
+        del self.__history[self.__current_index + 1:]
+        if self.__compress:
+            if self.__history:
+                state = self._encode(image, self.__history[-1], self._decode(self.__current_index))
+            else:
+                state = self._encode(image)
+            self.__history.append(state)
+            self.__current_state = CopyTracker.adopt(image)
+        else:
+            self.__history.append(RawState(CopyTracker.adopt(image)))
+        self.__bytes += self.__history[-1].nbytes
         self.__current_index += 1
         
-        if len(self.__history) > self.__max_history:
-            self.__history.pop(0)
-            self.__current_index -= 1
+        while len(self.__history) > 1 and self._over_budget():
+            self._evict_oldest()
+    
+    def record_operation(self, name, args, image):
+        """
+        Save the image produced by an operation.
+        Snapshot history stores pixels, so the operation itself is not needed.
+        """
+        self.save_state(image)
     
     def undo(self):
-        """Go back to previous state."""
+        """
+        Go back to previous state.
+        Returns a read-only image; copy it before modifying.
+        """
         if self.can_undo():
+            if not self.__compress:
+                self.__current_index -= 1
+                return self.__history[self.__current_index].image
+            
+            state = self.__history[self.__current_index]
+            if state.is_delta:
+                previous = self._apply_bands(state, self._decode(self.__current_index), -1)
+            else:
+                previous = self._decode(self.__current_index - 1)
             self.__current_index -= 1
-            return self.__history[self.__current_index].copy()
+            self.__current_state = CopyTracker.freeze(previous)
+            return self.__current_state
         return None
     
     def redo(self):
-        """Go forward to next state."""
+        """
+        Go forward to next state.
+        Returns a read-only image; copy it before modifying.
+        """
         if self.can_redo():
+            if not self.__compress:
+                self.__current_index += 1
+                return self.__history[self.__current_index].image
+            
+            state = self.__history[self.__current_index + 1]
+            if state.is_delta:
+                following = self._apply_bands(state, self._decode(self.__current_index), 1)
+            else:
+                following = self._apply_bands(state, None, 1)
             self.__current_index += 1
-            return self.__history[self.__current_index].copy()
+            self.__current_state = CopyTracker.freeze(following)
+            return self.__current_state
         return None
     
     def can_undo(self):
@@ -61,6 +249,15 @@ class HistoryManager:
         """Clear all history."""
         self.__history = []
         self.__current_index = -1
+        self.__current_state = None
+        self.__bytes = 0
+    
+    def close(self):
+        """Clear the history and stop the compression threads."""
+        self.clear_history()
+        if self.__pool is not None:
+            self.__pool.shutdown(wait=True)
+            self.__pool = None
     
     # MAGIC METHODS
     def __len__(self):
@@ -72,11 +269,13 @@ class HistoryManager:
     
     def __str__(self):
         """String representation for users."""
-        return f"History: {len(self.__history)} states, at index {self.__current_index}"
+        return (f"History: {len(self.__history)} states "
+                f"({self.history_bytes / (1024 * 1024):.1f} MB), at index {self.__current_index}")
     
     def __repr__(self):
         """String representation for developers."""
-        return f"HistoryManager(size={len(self.__history)}, index={self.__current_index})"
+        return (f"HistoryManager(size={len(self.__history)}, index={self.__current_index}, "
+                f"bytes={self.history_bytes})")
     
     def __bool__(self):
         """Boolean conversion - True if has history."""
@@ -85,10 +284,12 @@ class HistoryManager:
     def __getitem__(self, index):
         """
         MAGIC METHOD: Allow indexing
-        Example: history[0] returns first state
+        Example: history[0] returns first state (read-only)
         """
         if 0 <= index < len(self.__history):
-            return self.__history[index].copy()
+            if self.__compress:
+                return CopyTracker.readonly(self._decode(index))
+            return self.__history[index].image
         raise IndexError("History index out of range")
     
     def __contains__(self, item):
@@ -96,4 +297,5 @@ class HistoryManager:
         MAGIC METHOD: Check if state exists
         Example: if image in history_manager
         """
-        return item in self.__history
+        return any(np.array_equal(item, self[i]) for i in range(len(self.__history)))
+
@@ -0,0 +1,479 @@
+# hot_folder.py
+import argparse
+import json
+import os
+import queue
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+import cv2
+from base_classes import FileHandler, FilterTelemetry
+from batch_processor import BatchProcessor
+from image_processor import ImageProcessor
+from recipe import Recipe
+
+
+def write_atomic(filepath, data):
+    """
+    Write bytes so that readers only ever see the complete file:
+    write a hidden temp file in the same folder, then rename it over
+    the target (os.replace is atomic on one filesystem).
+    """
+    directory = os.path.dirname(filepath) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class HotFolderStats:
+    """
+    Counters and recent latencies of a HotFolderService.
+    Latencies are kept for the last `window` files only, so memory stays
+    flat however long the service runs. Thread-safe.
+    """
+
+    # CLASS ATTRIBUTE - number of recent files the latency percentiles cover
+    window = 1024
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__waits = deque(maxlen=self.window)  # seconds spent in the queue
+        self.__runs = deque(maxlen=self.window)  # seconds spent processing
+        self.started = time.time()
+        self.processed = 0
+        self.failed = 0  # gave up on the file (out of attempts)
+        self.retries = 0  # failed attempts that will be tried again
+        self.skipped = 0  # already up to date when found
+        self.rejected = 0  # outputs would overwrite another input's
+        self.backpressure = 0  # scans cut short because the queue was full
+        self.max_queue_depth = 0
+
+    def record(self, wait, run, ok, retry=False):
+        """Record one attempt; a failed one counts as failed only if it will not be retried."""
+        with self.__lock:
+            self.__waits.append(wait)
+            self.__runs.append(run)
+            if ok:
+                self.processed += 1
+            elif retry:
+                self.retries += 1
+            else:
+                self.failed += 1
+
+    def observe_depth(self, depth):
+        """Record the current queue depth."""
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    @staticmethod
+    def percentiles(values):
+        """STATIC METHOD: p50, p95 and max of a list of seconds, in milliseconds."""
+        if not values:
+            return {'p50_ms': None, 'p95_ms': None, 'max_ms': None}
+        ordered = sorted(values)
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+        return {'p50_ms': pick(0.5), 'p95_ms': pick(0.95), 'max_ms': round(ordered[-1] * 1000, 2)}
+
+    def snapshot(self, queue_depth=0):
+        """Statistics as a dict."""
+        with self.__lock:
+            waits = list(self.__waits)
+            runs = list(self.__runs)
+            totals = [wait + run for wait, run in zip(waits, runs)]
+        elapsed = max(time.time() - self.started, 1e-9)
+        return {
+            'processed': self.processed,
+            'failed': self.failed,
+            'retries': self.retries,
+            'skipped': self.skipped,
+            'rejected': self.rejected,
+            'queue_depth': queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'backpressure_events': self.backpressure,
+            'images_per_second': round((self.processed + self.failed) / elapsed, 2),
+            'queue_wait': self.percentiles(waits),
+            'processing': self.percentiles(runs),
+            'latency': self.percentiles(totals),
+        }
+
+    def summary(self, queue_depth=0):
+        """One-line summary for logs."""
+        stats = self.snapshot(queue_depth)
+        latency = stats['latency']
+        text = (f"queue {queue_depth} (max {stats['max_queue_depth']}) | "
+                f"{stats['processed']} done, {stats['failed']} failed, {stats['retries']} retried, "
+                f"{stats['skipped']} skipped, {stats['rejected']} rejected | "
+                f"{stats['images_per_second']:.1f} images/s")
+        if latency['p50_ms'] is not None:
+            text += f" | latency p50 {latency['p50_ms']:.0f} ms, p95 {latency['p95_ms']:.0f} ms"
+        return text
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"HotFolderStats(processed={self.processed}, failed={self.failed})"
+
+
+class HotFolderService:
+    """
+    Watches an input folder and runs a Recipe on every new image.
+    - the folder is polled, so it works on network shares too
+    - a file is taken once its size and mtime hold still for one poll,
+      so half-copied exports are not read
+    - found files go into a bounded queue; when it is full the scan
+      stops early and the rest wait on disk for the next poll, so a
+      burst of thousands of files never piles up in memory
+    - worker threads decode, run the recipe and write every output
+      atomically, so nothing downstream sees a partial file
+    - a file that fails is picked up again by a later scan, up to
+      max_attempts times, in case it was read before its copy finished
+    - a file whose output names clash with another input's (a.jpg and
+      a.png with --format png) is rejected; the oldest file keeps them
+    Files whose outputs are already newer than the input are skipped,
+    so a restart does not redo finished work.
+    """
+
+    # CLASS ATTRIBUTES
+    poll_interval = 1.0  # seconds between scans
+    report_interval = 10.0  # seconds between status reports
+    max_attempts = 3  # tries per file version before giving up until it changes
+
+    def __init__(self, recipe, input_dir, output_dir, workers=None, queue_size=256,
+                 output_format=None, log=None):
+        """
+        recipe: Recipe to run on each file
+        workers: worker threads (default: all cores; OpenCV releases the GIL)
+        queue_size: most files waiting in memory at once
+        output_format: extension for outputs whose recipe output sets none
+        log: callable(message) for reports and errors (default: stderr)
+        """
+        self.recipe = recipe
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.output_format = output_format.lower().lstrip('.') if output_format else None
+        self.log = log or (lambda message: print(message, file=sys.stderr, flush=True))
+        self.stats = HotFolderStats()
+        self.__queue = queue.Queue(maxsize=queue_size)
+        self.__stop = threading.Event()
+        self.__pending = {}  # path -> (size, mtime) seen once, waiting to settle
+        self.__taken = {}  # path -> (size, mtime) already queued or done
+        self.__failures = {}  # path -> ((size, mtime), failed attempts)
+        self.__lock = threading.Lock()  # guards __taken and __failures across workers
+        self.__owners = {}  # normalized output path -> input path that writes it (scan only)
+        self.__rejected = {}  # path -> (size, mtime) rejected for a clash, logged once
+        self.__threads = []
+
+    # PROPERTY DECORATORS
+    @property
+    def queue_depth(self):
+        """PROPERTY: Files waiting in the queue."""
+        return self.__queue.qsize()
+
+    @property
+    def running(self):
+        """PROPERTY: True until stop() is called."""
+        return not self.__stop.is_set()
+
+    def output_paths(self, filepath):
+        """
+        Output path of every recipe output for an input file. A recipe
+        with one output writes straight into the output folder; with more,
+        each output gets its own subfolder.
+        """
+        single = len(self.recipe.outputs) == 1
+        paths = {}
+        for output, (_, fmt) in self.recipe.outputs.items():
+            name = os.path.basename(filepath)
+            fmt = fmt or self.output_format
+            if fmt:
+                name = os.path.splitext(name)[0] + '.' + fmt.lower().lstrip('.')
+            folder = self.output_dir if single else os.path.join(self.output_dir, output)
+            paths[output] = os.path.join(folder, name)
+        return paths
+
+    def _claim_outputs(self, filepath):
+        """
+        Reserve the file's output paths. Returns the input that already
+        owns one of them, or None if they are all free (or already its own).
+        """
+        keys = [os.path.normcase(os.path.abspath(path)) for path in self.output_paths(filepath).values()]
+        for key in keys:
+            owner = self.__owners.get(key, filepath)
+            if owner != filepath:
+                return owner
+        for key in keys:
+            self.__owners[key] = filepath
+        return None
+
+    def _is_up_to_date(self, filepath, mtime):
+        """True if every output exists and is newer than the input."""
+        for path in self.output_paths(filepath).values():
+            try:
+                if os.stat(path).st_mtime_ns < mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def scan(self, settle=True):
+        """
+        Look for new or changed files and queue those that are ready,
+        oldest first. Returns the number of files queued.
+        settle: wait one poll for a file to stop changing before taking it
+        """
+        found = {}
+        try:
+            with os.scandir(self.input_dir) as entries:
+                for entry in entries:
+                    # Hidden names cover temp files that copy tools write first
+                    if entry.name.startswith('.') or not entry.is_file():
+                        continue
+                    if not FileHandler.validate_file_format(entry.name):
+                        continue
+                    stat = entry.stat()
+                    found[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        except OSError as e:
+            self.log(f"Cannot scan {self.input_dir}: {e}")
+            return 0
+
+        # Forget files that have gone, so memory follows the folder
+        self.__pending = {path: sig for path, sig in self.__pending.items() if path in found}
+        with self.__lock:
+            self.__taken = {path: sig for path, sig in self.__taken.items() if path in found}
+            self.__failures = {path: entry for path, entry in self.__failures.items() if path in found}
+            taken = dict(self.__taken)
+        self.__owners = {key: path for key, path in self.__owners.items() if path in found}
+        self.__rejected = {path: sig for path, sig in self.__rejected.items() if path in found}
+
+        ready = []
+        for path, signature in found.items():
+            if taken.get(path) == signature:
+                continue
+            if settle and self.__pending.get(path) != signature:
+                self.__pending[path] = signature  # still being written, or new
+                continue
+            ready.append((signature[1], path, signature))
+
+        queued = 0
+        for mtime, path, signature in sorted(ready):
+            owner = self._claim_outputs(path)
+            if owner is not None:
+                # Checked again every scan, so it runs once the owner is removed
+                if self.__rejected.get(path) != signature:
+                    self.__rejected[path] = signature
+                    self.stats.rejected += 1
+                    self.log(f"REJECTED {path}: its outputs would overwrite those of {owner}")
+                continue
+            self.__rejected.pop(path, None)
+            if self._is_up_to_date(path, mtime):
+                with self.__lock:
+                    self.__taken[path] = signature
+                self.stats.skipped += 1
+                continue
+            with self.__lock:
+                self.__taken[path] = signature  # before a worker can fail and release it
+            try:
+                self.__queue.put((path, signature, time.perf_counter()),
+                                 timeout=self.poll_interval if settle else None)
+            except queue.Full:
+                with self.__lock:
+                    self.__taken.pop(path, None)
+                self.stats.backpressure += 1
+                break  # the rest stay on disk until the workers catch up
+            self.__pending.pop(path, None)
+            queued += 1
+            self.stats.observe_depth(self.__queue.qsize())
+            if self.__stop.is_set():
+                break
+        return queued
+
+    def process_file(self, processor, filepath):
+        """Decode one file, run the recipe and write its outputs. Returns an error or None."""
+        image = ImageProcessor.decode_image(filepath)
+        if image is None:
+            return "could not decode image"
+        image.flags.writeable = False
+        paths = self.output_paths(filepath)
+        for output, result in self.recipe.run(image, processor):
+            extension = os.path.splitext(paths[output])[1]
+            ok, encoded = cv2.imencode(extension, result)
+            if not ok:
+                return f"could not encode output '{output}'"
+            write_atomic(paths[output], encoded.tobytes())
+        return None
+
+    def _work(self):
+        """Worker thread: process queued files until a None arrives."""
+        processor = ImageProcessor()
+        while True:
+            item = self.__queue.get()
+            try:
+                if item is None:
+                    return
+                filepath, signature, queued_at = item
+                started = time.perf_counter()
+                try:
+                    error = self.process_file(processor, filepath)
+                except Exception as e:
+                    error = str(e)
+                retry = False
+                if error:
+                    retry = self._failed(filepath, signature, error)
+                else:
+                    with self.__lock:
+                        self.__failures.pop(filepath, None)
+                self.stats.record(started - queued_at, time.perf_counter() - started,
+                                  error is None, retry)
+            finally:
+                self.__queue.task_done()
+
+    def _failed(self, filepath, signature, error):
+        """
+        Count a failure. Below max_attempts the file is released, so the
+        next scans pick it up again once it has settled; after that it
+        waits until it changes on disk. Returns True if it will be tried again.
+        """
+        with self.__lock:
+            previous_signature, attempts = self.__failures.get(filepath, (None, 0))
+            attempts = attempts + 1 if previous_signature == signature else 1
+            self.__failures[filepath] = (signature, attempts)
+            retry = attempts < self.max_attempts and self.__taken.get(filepath) == signature
+            if retry:
+                del self.__taken[filepath]
+        if attempts >= self.max_attempts:
+            self.log(f"FAILED {filepath} (giving up after {attempts} attempts): {error}")
+        else:
+            self.log(f"FAILED {filepath} (attempt {attempts} of {self.max_attempts}"
+                     f"{', will retry' if retry else ''}): {error}")
+        return attempts < self.max_attempts
+
+    def report(self, metrics_out=None):
+        """Log a status line and write the metrics file, if any."""
+        self.log(self.stats.summary(self.queue_depth))
+        if metrics_out:
+            document = {'service': self.stats.snapshot(self.queue_depth),
+                        'filters': FilterTelemetry.get_stats()}
+            try:
+                write_atomic(metrics_out, json.dumps(document, indent=2, sort_keys=True).encode('utf-8'))
+            except OSError as e:
+                self.log(f"Cannot write metrics to {metrics_out}: {e}")
+
+    def run(self, once=False, metrics_out=None):
+        """
+        Start the workers and poll until stop() is called.
+        once: process the files present now, then return
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.__threads = [threading.Thread(target=self._work, name=f"hot-folder-{i}", daemon=True)
+                          for i in range(self.workers)]
+        for thread in self.__threads:
+            thread.start()
+
+        try:
+            if once:
+                self.scan(settle=False)
+                self.__queue.join()
+                return
+            next_report = time.monotonic() + self.report_interval
+            while not self.__stop.is_set():
+                self.scan()
+                if time.monotonic() >= next_report:
+                    self.report(metrics_out)
+                    next_report = time.monotonic() + self.report_interval
+                self.__stop.wait(self.poll_interval)
+        finally:
+            self._shutdown()
+            self.report(metrics_out)
+
+    def stop(self):
+        """Ask run() to finish (safe to call from a signal handler or another thread)."""
+        self.__stop.set()
+
+    def _shutdown(self):
+        """Drop queued files (they stay on disk for next time) and join the workers."""
+        self.__stop.set()
+        while True:
+            try:
+                self.__queue.get_nowait()
+            except queue.Empty:
+                break
+            self.__queue.task_done()
+        for _ in self.__threads:
+            self.__queue.put(None)
+        for thread in self.__threads:
+            thread.join()
+        self.__threads = []
+
+    def __repr__(self):
+        """String representation for developers."""
+        return (f"HotFolderService(input_dir={self.input_dir!r}, output_dir={self.output_dir!r}, "
+                f"workers={self.workers}, queue_depth={self.queue_depth})")
+
+
+def main(argv=None):
+    """Command-line entry point: watch a folder until interrupted."""
+    parser = argparse.ArgumentParser(
+        description="Watch a folder and process every image dropped into it.")
+    parser.add_argument('input', help="folder to watch")
+    parser.add_argument('-o', '--output', required=True, help="output folder")
+    parser.add_argument('--recipe', help="recipe JSON file (see recipe.py)")
+    parser.add_argument('--op', action='append', default=[], dest='operations',
+                        help="operation to apply instead of a recipe, repeatable "
+                             "(grayscale, edge, blur=N[:fast], brightness=N, contrast=F, "
+                             "rotate=90|180|270, flip=horizontal|vertical, resize=WxH)")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="worker threads (default: all cores)")
+    parser.add_argument('--queue-size', type=int, default=256,
+                        help="most files waiting in memory at once (default: 256)")
+    parser.add_argument('--poll', type=float, default=HotFolderService.poll_interval,
+                        help="seconds between scans of the folder")
+    parser.add_argument('--report-every', type=float, default=HotFolderService.report_interval,
+                        help="seconds between status lines")
+    parser.add_argument('--format', default=None, help="output format extension, e.g. png")
+    parser.add_argument('--metrics-out', default=None,
+                        help="keep queue, latency and filter metrics in this JSON file")
+    parser.add_argument('--once', action='store_true',
+                        help="process the files present now and exit")
+    args = parser.parse_args(argv)
+
+    if bool(args.recipe) == bool(args.operations):
+        parser.error("give either --recipe or at least one --op")
+    try:
+        if args.recipe:
+            recipe = Recipe.load(args.recipe)
+        else:
+            recipe = Recipe.from_chains({'output': [BatchProcessor.parse_operation(op)
+                                                    for op in args.operations]})
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        parser.error(str(e))
+    if not os.path.isdir(args.input):
+        parser.error(f"not a folder: {args.input}")
+
+    service = HotFolderService(recipe, args.input, args.output, args.workers,
+                               args.queue_size, args.format)
+    service.poll_interval = args.poll
+    service.report_interval = args.report_every
+    signal.signal(signal.SIGTERM, lambda *_: service.stop())
+    service.log(f"Watching {args.input} -> {args.output} with {service.workers} workers "
+                f"(queue {args.queue_size})")
+    try:
+        service.run(once=args.once, metrics_out=args.metrics_out)
+    except KeyboardInterrupt:
+        service.stop()
+    return 0 if service.stats.failed == 0 and service.stats.rejected == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
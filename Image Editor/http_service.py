@@ -0,0 +1,377 @@
+# http_service.py
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import cv2
+import numpy as np
+from base_classes import FilterTelemetry, ImageFilter
+from batch_processor import BatchProcessor
+from hot_folder import HotFolderStats
+from image_processor import ImageProcessor
+
+
+class HttpError(Exception):
+    """An error answered with an HTTP status code."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class StageMetrics:
+    """
+    Request counts by status and latency per processing stage
+    (read, wait, decode, filter, encode, send, total). Latency
+    percentiles cover the last `window` requests of each stage.
+    """
+
+    # CLASS ATTRIBUTE - recent samples kept per stage
+    window = 1024
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__samples = {}  # stage -> deque of seconds
+        self.__counts = {}  # stage -> (count, total seconds)
+        self.__statuses = {}  # HTTP status -> responses
+        self.in_flight = 0
+        self.waiting = 0
+
+    def record(self, stage, seconds):
+        """Record how long one request spent in a stage."""
+        with self.__lock:
+            samples = self.__samples.get(stage)
+            if samples is None:
+                samples = self.__samples[stage] = deque(maxlen=self.window)
+            samples.append(seconds)
+            count, total = self.__counts.get(stage, (0, 0.0))
+            self.__counts[stage] = (count + 1, total + seconds)
+
+    def count_status(self, status):
+        """Record one response."""
+        with self.__lock:
+            self.__statuses[status] = self.__statuses.get(status, 0) + 1
+
+    def snapshot(self):
+        """Statistics as a dict."""
+        with self.__lock:
+            stages = {}
+            for stage, samples in self.__samples.items():
+                count, total = self.__counts[stage]
+                stages[stage] = dict(HotFolderStats.percentiles(list(samples)), count=count,
+                                     mean_ms=round(total / count * 1000, 2))
+            return {
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'responses': {str(status): n for status, n in sorted(self.__statuses.items())},
+                'stages': stages,
+            }
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"StageMetrics(in_flight={self.in_flight}, waiting={self.waiting})"
+
+
+class ImageService:
+    """
+    Small HTTP/1.1 server (asyncio, standard library only) that runs
+    ImageProcessor operations for other tools, no Tk needed.
+
+        POST /process?op=resize=800x600&op=grayscale&format=png
+             body: the encoded image; answer: the encoded result, chunked
+        GET  /metrics   counts, per-stage latency and filter telemetry (JSON)
+        GET  /health    'ok'
+
+    Decoding, filtering and encoding run on a thread pool, so the event
+    loop only moves bytes. At most max_concurrent requests are processed
+    at once; up to max_queued more wait, and anything beyond that is
+    turned away with 503 instead of piling up. Reading the headers and
+    the body each have a time limit, so idle or very slow clients cannot
+    hold connections open (408).
+    """
+
+    # CLASS ATTRIBUTES
+    chunk_size = 64 * 1024
+    content_types = {'png': 'image/png', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'bmp': 'image/bmp'}
+    reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               408: 'Request Timeout', 411: 'Length Required', 413: 'Payload Too Large', 500: 'Internal Server Error',
+               503: 'Service Unavailable'}
+
+    def __init__(self, host='127.0.0.1', port=8080, workers=None, max_concurrent=None,
+                 max_queued=64, max_body_bytes=64 * 1024 * 1024, read_timeout=30.0):
+        """
+        workers: executor threads (default: all cores; OpenCV releases the GIL)
+        max_concurrent: requests processed at once (default: workers)
+        max_queued: requests allowed to wait for a slot before 503
+        max_body_bytes: largest accepted upload
+        read_timeout: seconds allowed for reading the headers, and again for the body
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.max_concurrent = max_concurrent or self.workers
+        self.max_queued = max_queued
+        self.max_body_bytes = max_body_bytes
+        self.read_timeout = read_timeout
+        self.metrics = StageMetrics()
+        self.__executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image-service')
+        self.__local = threading.local()  # one ImageProcessor per executor thread
+        self.__slots = None  # asyncio.Semaphore, created on the server's loop
+        self.__server = None
+
+    # Work that runs on the executor
+    @staticmethod
+    def decode(data):
+        """STATIC METHOD: Decode uploaded bytes like ImageProcessor.decode_image (gray stays 2-D)."""
+        gray = ImageProcessor.is_gray_file(io.BytesIO(data))
+        image = cv2.imdecode(np.frombuffer(data, np.uint8),
+                             cv2.IMREAD_GRAYSCALE if gray else cv2.IMREAD_COLOR)
+        if image is None:
+            raise HttpError(400, "could not decode image")
+        image.flags.writeable = False
+        return image
+
+    def apply(self, image, operations):
+        """Run the operations with this thread's ImageProcessor."""
+        processor = getattr(self.__local, 'processor', None)
+        if processor is None:
+            processor = self.__local.processor = ImageProcessor()
+        processor.set_current_image(image)
+        for name, args in operations:
+            if processor.apply_operation(name, *args) is None:
+                raise HttpError(400, f"operation '{name}' failed")
+        return processor.current_view
+
+    @staticmethod
+    def encode(image, fmt):
+        """STATIC METHOD: Encode the result."""
+        ok, encoded = cv2.imencode('.' + fmt, image)
+        if not ok:
+            raise HttpError(500, f"could not encode as {fmt}")
+        return encoded.tobytes()
+
+    async def _timed(self, stage, func, *args):
+        """Run func on the executor and record its latency."""
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.__executor, func, *args)
+        finally:
+            self.metrics.record(stage, time.perf_counter() - start)
+
+    # HTTP plumbing
+    async def _read(self, read, what):
+        """Await one read within read_timeout, answering 408 when it runs out."""
+        try:
+            return await asyncio.wait_for(read, self.read_timeout)
+        except asyncio.TimeoutError:
+            raise HttpError(408, f"timed out reading the {what}")
+
+    async def _read_request(self, reader, writer):
+        """Read the request line, headers and body. Returns (method, target, headers, body)."""
+        try:
+            head = await self._read(reader.readuntil(b'\r\n\r\n'), "request headers")
+        except asyncio.LimitOverrunError:
+            raise HttpError(400, "headers too large")
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, _ = lines[0].split(' ', 2)
+        except ValueError:
+            raise HttpError(400, "malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+
+        body = b''
+        if method == 'POST':
+            if 'content-length' not in headers:
+                raise HttpError(411, "Content-Length is required")
+            try:
+                length = int(headers['content-length'])
+            except ValueError:
+                raise HttpError(400, "bad Content-Length")
+            if length < 0:
+                raise HttpError(400, "bad Content-Length")
+            if length > self.max_body_bytes:
+                raise HttpError(413, f"upload larger than {self.max_body_bytes} bytes")
+            if headers.get('expect', '').lower() == '100-continue':
+                writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+                await writer.drain()
+            body = await self._read(reader.readexactly(length), "request body")
+        return method, target, headers, body
+
+    def _head(self, status, content_type, length=None):
+        """Status line and headers; chunked when the length is not given."""
+        lines = [f"HTTP/1.1 {status} {self.reasons.get(status, '')}",
+                 f"Content-Type: {content_type}",
+                 "Connection: close"]
+        lines.append(f"Content-Length: {length}" if length is not None else "Transfer-Encoding: chunked")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+
+    async def _send(self, writer, status, body, content_type='application/json'):
+        """Send a small complete response."""
+        writer.write(self._head(status, content_type, len(body)) + body)
+        await writer.drain()
+        self.metrics.count_status(status)
+
+    async def _send_chunked(self, writer, body, content_type):
+        """Stream a response in chunks, waiting for slow clients between them."""
+        writer.write(self._head(200, content_type))
+        view = memoryview(body)
+        for start in range(0, len(view), self.chunk_size):
+            chunk = view[start:start + self.chunk_size]
+            writer.write(b'%x\r\n' % len(chunk) + chunk + b'\r\n')
+            await writer.drain()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+        self.metrics.count_status(200)
+
+    async def _handle(self, reader, writer):
+        """Serve one connection (one request, then close)."""
+        started = time.perf_counter()
+        try:
+            method, target, _, body = await self._read_request(reader, writer)
+            self.metrics.record('read', time.perf_counter() - started)
+            url = urlsplit(target)
+            if url.path == '/health':
+                await self._send(writer, 200, b'ok', 'text/plain')
+            elif url.path == '/metrics':
+                document = {'service': self.metrics.snapshot(), 'filters': FilterTelemetry.get_stats()}
+                await self._send(writer, 200, json.dumps(document, indent=2, sort_keys=True).encode('utf-8'))
+            elif url.path == '/process':
+                if method != 'POST':
+                    raise HttpError(405, "use POST with the image as the body")
+                await self._process(writer, parse_qs(url.query), body)
+                self.metrics.record('total', time.perf_counter() - started)
+            else:
+                raise HttpError(404, f"no such endpoint: {url.path}")
+        except HttpError as e:
+            await self._send_error(writer, e.status, str(e))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # client went away
+        except Exception as e:
+            await self._send_error(writer, 500, f"{type(e).__name__}: {e}")
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _send_error(self, writer, status, message):
+        """Send a JSON error body, if the client is still there."""
+        try:
+            await self._send(writer, status, json.dumps({'error': message}).encode('utf-8'))
+        except ConnectionError:
+            pass
+
+    async def _process(self, writer, query, body):
+        """Decode, filter, encode and stream back one image."""
+        try:
+            operations = [BatchProcessor.parse_operation(spec) for spec in query.get('op', [])]
+        except ValueError as e:
+            raise HttpError(400, str(e))
+        fmt = query.get('format', ['png'])[0].lower().lstrip('.')
+        if fmt not in ImageFilter.supported_formats:
+            raise HttpError(400, f"format must be one of {ImageFilter.supported_formats}")
+
+        metrics = self.metrics
+        if metrics.waiting >= self.max_queued:
+            raise HttpError(503, "too many requests waiting, try again later")
+        metrics.waiting += 1
+        waited = time.perf_counter()
+        try:
+            await self.__slots.acquire()
+        finally:
+            metrics.waiting -= 1
+        metrics.record('wait', time.perf_counter() - waited)
+
+        metrics.in_flight += 1
+        try:
+            image = await self._timed('decode', self.decode, body)
+            result = await self._timed('filter', self.apply, image, operations)
+            encoded = await self._timed('encode', self.encode, result, fmt)
+        finally:
+            metrics.in_flight -= 1
+            self.__slots.release()
+
+        sending = time.perf_counter()
+        await self._send_chunked(writer, encoded, self.content_types[fmt])
+        metrics.record('send', time.perf_counter() - sending)
+
+    # Lifecycle
+    async def start(self):
+        """Start listening; returns the bound port (useful with port=0)."""
+        self.__slots = asyncio.Semaphore(self.max_concurrent)
+        self.__server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.__server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def serve_forever(self):
+        """Start if needed and serve until cancelled."""
+        if self.__server is None:
+            await self.start()
+        async with self.__server:
+            await self.__server.serve_forever()
+
+    async def stop(self):
+        """Stop listening and shut the executor down."""
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+            self.__server = None
+        self.__executor.shutdown(wait=True)
+
+    def __repr__(self):
+        """String representation for developers."""
+        return (f"ImageService(host={self.host!r}, port={self.port}, workers={self.workers}, "
+                f"max_concurrent={self.max_concurrent})")
+
+
+def main(argv=None):
+    """Command-line entry point: serve until interrupted."""
+    parser = argparse.ArgumentParser(
+        description="Serve the image editor's operations over HTTP on this machine.")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8080, help="port (0 picks a free one)")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="executor threads (default: all cores)")
+    parser.add_argument('--max-concurrent', type=int, default=None,
+                        help="requests processed at once (default: workers)")
+    parser.add_argument('--max-queued', type=int, default=64,
+                        help="requests allowed to wait before answering 503 (default: 64)")
+    parser.add_argument('--max-body-mb', type=float, default=64, help="largest upload in MB")
+    parser.add_argument('--read-timeout', type=float, default=30.0,
+                        help="seconds allowed to send the headers, and again the body (default: 30)")
+    args = parser.parse_args(argv)
+
+    service = ImageService(args.host, args.port, args.workers, args.max_concurrent,
+                           args.max_queued, int(args.max_body_mb * 1024 * 1024), args.read_timeout)
+
+    async def serve():
+        port = await service.start()
+        print(f"Serving on http://{service.host}:{port} "
+              f"({service.workers} workers, {service.max_concurrent} concurrent)", flush=True)
+        try:
+            await service.serve_forever()
+        finally:
+            await service.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,16 @@
 # image_processor.py
 
+import os
+import numbers
 import cv2
 import numpy as np
+from PIL import Image
+from base_classes import CopyTracker
 from filters import (GrayscaleFilter, BlurFilter, EdgeDetectionFilter,
-                     BrightnessFilter, ContrastFilter)
+                     BrightnessFilter, ContrastFilter, RotateFilter, FlipFilter,
+                     ResizeFilter)
+from image_store import MemmapImageStore
+from lazy_graph import LazyImage
 
 
 class ImageProcessor:
@@ -11,14 +18,55 @@ class ImageProcessor:
     # CLASS ATTRIBUTE - tracks total images processed
     images_processed_count = 0
     
-    def __init__(self):
+    # CLASS ATTRIBUTE - operation names mapped to the methods that perform them
+    OPERATIONS = {
+        'grayscale': 'apply_grayscale',
+        'blur': 'apply_blur',
+        'edge': 'apply_edge_detection',
+        'brightness': 'adjust_brightness',
+        'contrast': 'adjust_contrast',
+        'rotate': 'rotate_image',
+        'flip': 'flip_image',
+        'resize': 'resize_image'
+    }
+    
+    # CLASS ATTRIBUTE - JPEG decode flags that skip detail, by scale factor
+    REDUCED_DECODE_FLAGS = {
+        8: cv2.IMREAD_REDUCED_COLOR_8,
+        4: cv2.IMREAD_REDUCED_COLOR_4,
+        2: cv2.IMREAD_REDUCED_COLOR_2
+    }
+    REDUCED_GRAY_DECODE_FLAGS = {
+        8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+        4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+        2: cv2.IMREAD_REDUCED_GRAYSCALE_2
+    }
+    
+    # CLASS ATTRIBUTE - PIL modes of single-channel files, kept 1-channel when decoded
+    GRAY_MODES = ('1', 'L', 'LA', 'I', 'I;16', 'I;16B', 'I;16L', 'F')
+    
+    def __init__(self, use_memmap=False, memmap_working=False, scratch_dir=None,
+                 thumbnail_cache=None, result_cache=None):
         """
         CONSTRUCTOR
         ENCAPSULATION: Private attributes with double underscore
+        use_memmap: keep the original image in a memory-mapped scratch file
+        memmap_working: also keep the working image memory-mapped
+        scratch_dir: folder for the scratch files (default: system temp)
+        thumbnail_cache: optional ThumbnailCache filled by every file load
+        result_cache: optional FilterResultCache in front of the filter objects
         """
         self.__current_image = None  # Private attribute
         self.__original_image = None  # Private attribute
         self.__filepath = None  # Private attribute
+        self.__version = 0  # Private attribute - bumped whenever the image changes
+        self.__store = MemmapImageStore(scratch_dir) if use_memmap or memmap_working else None
+        self.__memmap_working = memmap_working
+        self.__thumbnail_cache = thumbnail_cache
+        self.__result_cache = result_cache
+        self.__deferring = False  # True while defer_operation() records an operation
+        self.__pending = None  # LazyImage of deferred operations not yet computed
+        self.__rendered = None  # ((version, scale, roi), image) of the last render_region()
         ImageProcessor.images_processed_count += 1
         
         # Initialize filter objects
@@ -35,18 +83,45 @@ class ImageProcessor:
     def current_image(self):
         """
         PROPERTY GETTER
-        Controlled access to private attribute
+        Controlled access to private attribute.
+        Returns a writeable copy; use current_view when only reading.
+        """
+        self._materialize()
+        return CopyTracker.copy(self.__current_image)
+    
+    @property
+    def current_view(self):
+        """
+        PROPERTY: Read-only view of the current image (no copy).
+        The processor never modifies images in place, so the view stays
+        valid after later operations replace the current image.
         """
-        return self.__current_image.copy() if self.__current_image is not None else None
+        self._materialize()
+        return CopyTracker.readonly(self.__current_image)
+    
+    @property
+    def shape(self):
+        """PROPERTY: Array shape of the current image (deferred operations: without computing it)."""
+        if self.__pending is not None:
+            return self.__pending.shape
+        if self.__current_image is None:
+            return None
+        return self.__current_image.shape
     
     @property
     def dimensions(self):
         """PROPERTY: Get image dimensions."""
-        if self.__current_image is None:
+        shape = self.shape
+        if shape is None:
             return None
-        height, width = self.__current_image.shape[:2]
+        height, width = shape[:2]
         return (width, height)
     
+    @property
+    def version(self):
+        """PROPERTY: Counter that changes every time the current image changes."""
+        return self.__version
+    
     @property
     def filepath(self):
         """PROPERTY: Get current file path."""
@@ -57,6 +132,21 @@ class ImageProcessor:
         """PROPERTY: Check if image is loaded."""
         return self.__current_image is not None
     
+    @property
+    def thumbnail_cache(self):
+        """PROPERTY: ThumbnailCache used for loaded files, or None."""
+        return self.__thumbnail_cache
+    
+    @property
+    def result_cache(self):
+        """PROPERTY: FilterResultCache memoizing filter results, or None."""
+        return self.__result_cache
+    
+    @property
+    def pending(self):
+        """PROPERTY: LazyImage of the deferred operations not computed yet, or None."""
+        return self.__pending
+    
     # STATIC METHOD
     @staticmethod
     def validate_dimensions(width, height):
@@ -66,115 +156,393 @@ class ImageProcessor:
         """
         return width > 0 and height > 0 and width <= 10000 and height <= 10000
     
+    @staticmethod
+    def check_number(value, kind, label):
+        """
+        STATIC METHOD
+        Return value as a number of this kind (numbers.Integral or
+        numbers.Real), or raise ValueError. Whole floats such as 5.0 are
+        accepted where an integer is expected. Lets defer_operation()
+        reject bad arguments when it records them, not when pixels are read.
+        """
+        if (kind is numbers.Integral and isinstance(value, numbers.Real)
+                and not isinstance(value, numbers.Integral) and float(value).is_integer()):
+            return int(value)
+        if not isinstance(value, kind):
+            expected = "an integer" if kind is numbers.Integral else "a number"
+            raise ValueError(f"{label} must be {expected}, got {value!r}")
+        return value
+    
     # CLASS METHOD
     @classmethod
     def get_processed_count(cls):
         """CLASS METHOD: Get total images processed."""
         return cls.images_processed_count
     
+    @staticmethod
+    def is_gray_file(source):
+        """
+        STATIC METHOD
+        True if a file (path or file object) stores a single channel.
+        Only the header is read.
+        """
+        try:
+            with Image.open(source) as header:
+                return header.mode in ImageProcessor.GRAY_MODES
+        except (OSError, Image.DecompressionBombError):
+            return False
+    
+    @staticmethod
+    def decode_image(filepath):
+        """
+        STATIC METHOD
+        Decode an image file without touching any processor state,
+        so it can run on a worker thread. Returns None on failure.
+        Single-channel files decode to 2-D arrays, everything else to BGR.
+        """
+        gray = ImageProcessor.is_gray_file(filepath)
+        return cv2.imread(filepath, cv2.IMREAD_GRAYSCALE if gray else cv2.IMREAD_COLOR)
+    
+    @staticmethod
+    def decode_reduced(filepath, max_width, max_height):
+        """
+        STATIC METHOD
+        Fast low-resolution decode for a first paint.
+        JPEG decoders can decode at 1/2, 1/4 or 1/8 scale directly; the
+        smallest scale that still fills max_width x max_height is used.
+        Returns None when a reduced decode would not be faster (other
+        formats decode at full size anyway, or the image already fits).
+        """
+        if os.path.splitext(filepath)[1].lower() not in ('.jpg', '.jpeg'):
+            return None
+        try:
+            # Only the header is read here
+            with Image.open(filepath) as header:
+                width, height = header.size
+                gray = header.mode in ImageProcessor.GRAY_MODES
+        except OSError:
+            return None
+        
+        fit = min(1.0, max_width / width, max_height / height)
+        flags = (ImageProcessor.REDUCED_GRAY_DECODE_FLAGS if gray
+                 else ImageProcessor.REDUCED_DECODE_FLAGS)
+        for factor, flag in flags.items():
+            if factor * fit <= 1.0:
+                return cv2.imread(filepath, flag)
+        return None
+    
+    @property
+    def uses_memmap(self):
+        """PROPERTY: True if image buffers are backed by scratch files."""
+        return self.__store is not None
+    
+    def _set_current(self, image, changed=True):
+        """
+        Replace the working image, moving it to a scratch file if configured.
+        changed: False when image is the computed form of the pending
+                 operations, so the version stays the same
+        """
+        previous = self.__current_image
+        self.__pending = None
+        if image is not None and self.__memmap_working:
+            image = self.__store.store(image)
+        elif image is not None and image.flags.writeable:
+            # Results are owned by the processor; freeze them so views can be shared
+            image.flags.writeable = False
+        self.__current_image = image
+        if changed:
+            self.__version += 1
+        if self.__store is not None and previous is not self.__original_image:
+            self.__store.release(previous)
+    
+    def decode_file(self, filepath):
+        """
+        Decode a file and record its thumbnail and info in the cache.
+        Touches no image state, so it can run on a worker thread.
+        """
+        image = self.decode_image(filepath)
+        cache = self.__thumbnail_cache
+        if image is not None and cache is not None and filepath not in cache:
+            cache.put(filepath, image)
+        return image
+    
     def load_image(self, filepath):
         """Load an image from file path."""
-        self.__current_image = cv2.imread(filepath)
-        if self.__current_image is not None:
-            self.__original_image = self.__current_image.copy()
-            self.__filepath = filepath
-        return self.__current_image is not None
+        return self.set_loaded_image(self.decode_file(filepath), filepath)
+    
+    def set_loaded_image(self, image, filepath):
+        """
+        Install a freshly decoded image as both current and original.
+        Used by load_image() and by callers that decode in the background.
+        """
+        if image is None:
+            self._set_current(None)
+            return False
+        
+        self._set_current(image)
+        if self.__store is not None:
+            self.__store.release(self.__original_image)
+            # The working mapping is read-only, so it can double as the original
+            self.__original_image = (self.__current_image if self.__memmap_working
+                                     else self.__store.store(image))
+        else:
+            # Images are never modified in place, so the original can be shared
+            self.__original_image = self.__current_image
+        self.__filepath = filepath
+        return True
     
     def set_current_image(self, image):
-        """Set the current image (used for undo/redo)."""
-        self.__current_image = image.copy() if image is not None else None
+        """
+        Set the current image (used for undo/redo).
+        Immutable arrays (see CopyTracker.is_immutable) are adopted without a copy.
+        """
+        if not self.__memmap_working:
+            image = CopyTracker.adopt(image)
+        self._set_current(image)
     
-    def get_image_info(self):
-        """Get current image information."""
-        if self.__current_image is None:
+    def get_image_info(self, filepath=None):
+        """
+        Get current image information.
+        With a filepath, returns that file's info from the thumbnail cache
+        without decoding it (None if the file is not cached).
+        """
+        if filepath is not None:
+            if self.__thumbnail_cache is None:
+                return None
+            return self.__thumbnail_cache.info(filepath)
+        shape = self.shape
+        if shape is None:
             return None
-        height, width = self.__current_image.shape[:2]
-        channels = self.__current_image.shape[2] if len(self.__current_image.shape) > 2 else 1
+        height, width = shape[:2]
+        channels = shape[2] if len(shape) > 2 else 1
         return {'width': width, 'height': height, 'channels': channels}
     
+    def _run_filter(self, name, *params):
+        """
+        Apply filter object `name` to the current image.
+        params must describe the filter's settings; with a result cache
+        they form the cache key, so a repeated request is not recomputed.
+        """
+        filter_obj = self._filters[name]
+        if self.__result_cache is None:
+            return filter_obj.apply(self.__current_image)
+        return self.__result_cache.get_or_apply(self.__current_image, name, params, filter_obj.apply)
+    
+    def _ready(self):
+        """
+        True if there is an image to operate on. Outside defer_operation()
+        the deferred operations are computed first, as the operation needs
+        their pixels.
+        """
+        if self.__current_image is None:
+            return False
+        if not self.__deferring:
+            self._materialize()
+        return True
+    
+    def _defer(self, filter_obj=None):
+        """
+        Record a filter for defer_operation() instead of running it (None
+        records nothing). Returns the pending LazyImage.
+        """
+        if self.__pending is None:
+            self.__pending = LazyImage(self.__current_image)
+        if filter_obj is not None:
+            self.__pending = self.__pending.then(filter_obj)
+            self.__version += 1
+        return self.__pending
+    
+    def _materialize(self):
+        """Compute the pending operations at full resolution, once."""
+        if self.__pending is not None:
+            self._set_current(self.__pending.evaluate(), changed=False)
+    
+    def render(self, max_width, max_height):
+        """
+        The current image shrunk to fit max_width x max_height (never enlarged),
+        for display. Deferred operations are computed at that
+        size, without computing the full-resolution image.
+        """
+        shape = self.shape
+        if shape is None:
+            return None
+        height, width = shape[:2]
+        return self.render_region(None, min(1.0, max_width / width, max_height / height))
+    
+    def render_region(self, roi=None, scale=1.0):
+        """
+        Part of the current image at a reduced scale, read-only.
+        roi: (x, y, width, height) in the coordinates of the scaled image,
+             or None for all of it
+        scale: fraction of full resolution, 0 < scale <= 1
+        Deferred operations only compute the pixels the region needs. The
+        last result is kept, so redrawing an unchanged image is free.
+        """
+        if self.shape is None:
+            return None
+        if not 0 < scale <= 1:
+            raise ValueError(f"scale must be in (0, 1], got {scale}")
+        key = (self.__version, scale, roi)
+        if self.__rendered is not None and self.__rendered[0] == key:
+            return self.__rendered[1]
+        expression = self.__pending
+        if expression is None or (scale == 1 and roi is None):
+            expression = LazyImage(self.current_view)
+        image = CopyTracker.readonly(expression.evaluate(scale, roi))
+        self.__rendered = (key, image)
+        return image
+    
     # Image processing operations using filter objects (POLYMORPHISM)
     def apply_grayscale(self):
         """Apply grayscale using filter object."""
-        if self.__current_image is None:
+        if not self._ready():
             return None
-        self.__current_image = self._filters['grayscale'].apply(self.__current_image)
-        return self.__current_image.copy()
+        if self.__deferring:
+            return self._defer(GrayscaleFilter())
+        self._set_current(self._run_filter('grayscale'))
+        return self.current_view
     
-    def apply_blur(self, intensity=5):
-        """Apply blur using filter object."""
-        if self.__current_image is None:
+    def apply_blur(self, intensity=5, mode='exact'):
+        """
+        Apply blur using filter object.
+        mode: 'exact' Gaussian, or 'fast' box-filter approximation for
+        large intensities (see BlurFilter)
+        """
+        if not self._ready():
             return None
-        self._filters['blur'].set_intensity(intensity)
-        self.__current_image = self._filters['blur'].apply(self.__current_image)
-        return self.__current_image.copy()
+        blur = self._filters['blur']
+        if mode not in blur.MODES:
+            raise ValueError(f"Blur mode must be one of {blur.MODES}, got '{mode}'")
+        intensity = self.check_number(intensity, numbers.Integral, "Blur intensity")
+        if self.__deferring:
+            return self._defer(BlurFilter(intensity, mode))
+        blur.set_intensity(intensity)
+        blur.mode = mode
+        self._set_current(self._run_filter('blur', blur.kernel_size, blur.uses_box_filters))
+        return self.current_view
     
     def apply_edge_detection(self):
         """Apply edge detection using filter object."""
-        if self.__current_image is None:
+        if not self._ready():
             return None
-        self.__current_image = self._filters['edge'].apply(self.__current_image)
-        return self.__current_image.copy()
+        edge = self._filters['edge']
+        if self.__deferring:
+            return self._defer(EdgeDetectionFilter(edge.threshold1, edge.threshold2))
+        self._set_current(self._run_filter('edge', edge.threshold1, edge.threshold2))
+        return self.current_view
     
     def adjust_brightness(self, value):
         """Adjust brightness using filter object."""
-        if self.__current_image is None:
+        if not self._ready():
             return None
+        value = self.check_number(value, numbers.Real, "Brightness")
         self._filters['brightness'].value = value
-        self.__current_image = self._filters['brightness'].apply(self.__current_image)
-        return self.__current_image.copy()
+        if self.__deferring:
+            return self._defer(BrightnessFilter(value))
+        self._set_current(self._run_filter('brightness', value))
+        return self.current_view
     
     def adjust_contrast(self, value):
         """Adjust contrast using filter object."""
-        if self.__current_image is None:
+        if not self._ready():
             return None
+        value = self.check_number(value, numbers.Real, "Contrast")
         self._filters['contrast'].value = value
-        self.__current_image = self._filters['contrast'].apply(self.__current_image)
-        return self.__current_image.copy()
+        if self.__deferring:
+            return self._defer(ContrastFilter(value))
+        self._set_current(self._run_filter('contrast', value))
+        return self.current_view
     
     def rotate_image(self, angle):
         """Rotate image by 90, 180, or 270 degrees."""
-        if self.__current_image is None:
+        if not self._ready():
             return None
+        if self.__deferring:
+            return self._defer(RotateFilter(angle) if angle in RotateFilter.ROTATE_CODES else None)
         
         if angle == 90:
-            self.__current_image = cv2.rotate(self.__current_image, cv2.ROTATE_90_CLOCKWISE)
+            self._set_current(cv2.rotate(self.__current_image, cv2.ROTATE_90_CLOCKWISE))
         elif angle == 180:
-            self.__current_image = cv2.rotate(self.__current_image, cv2.ROTATE_180)
+            self._set_current(cv2.rotate(self.__current_image, cv2.ROTATE_180))
         elif angle == 270:
-            self.__current_image = cv2.rotate(self.__current_image, cv2.ROTATE_90_COUNTERCLOCKWISE)
+            self._set_current(cv2.rotate(self.__current_image, cv2.ROTATE_90_COUNTERCLOCKWISE))
         
-        return self.__current_image.copy()
+        return self.current_view
     
     def flip_image(self, direction):
         """Flip image horizontally or vertically."""
-        if self.__current_image is None:
+        if not self._ready():
             return None
+        if self.__deferring:
+            return self._defer(FlipFilter(direction) if direction in FlipFilter.FLIP_CODES else None)
         
         if direction == 'horizontal':
-            self.__current_image = cv2.flip(self.__current_image, 1)
+            self._set_current(cv2.flip(self.__current_image, 1))
         elif direction == 'vertical':
-            self.__current_image = cv2.flip(self.__current_image, 0)
+            self._set_current(cv2.flip(self.__current_image, 0))
         
-        return self.__current_image.copy()
+        return self.current_view
     
     def resize_image(self, width, height):
         """Resize image to specified dimensions."""
-        if self.__current_image is None:
+        if not self._ready():
             return None
         
+        width = self.check_number(width, numbers.Integral, "Width")
+        height = self.check_number(height, numbers.Integral, "Height")
         if not self.validate_dimensions(width, height):
             return None
+        if self.__deferring:
+            return self._defer(ResizeFilter(width, height))
         
-        self.__current_image = cv2.resize(self.__current_image, (width, height))
-        return self.__current_image.copy()
+        self._set_current(cv2.resize(self.__current_image, (width, height)))
+        return self.current_view
+    
+    def apply_operation(self, name, *args):
+        """
+        Apply an operation by name, e.g. apply_operation('blur', 15).
+        Returns the new current image (read-only), or None if there is no image.
+        """
+        if name not in self.OPERATIONS:
+            raise ValueError(f"Unknown operation: {name}")
+        CopyTracker.count_operation()
+        return getattr(self, self.OPERATIONS[name])(*args)
+    
+    def defer_operation(self, name, *args):
+        """
+        Record an operation by name without computing it, e.g.
+        defer_operation('blur', 15). Arguments are checked now. The
+        operations build a LazyImage (see pending) that is only computed
+        when pixels are read: current_image/current_view at full size,
+        render()/render_region() at the size and region needed.
+        Returns the pending LazyImage, or None if there is no image.
+        """
+        if name not in self.OPERATIONS:
+            raise ValueError(f"Unknown operation: {name}")
+        CopyTracker.count_operation()
+        self.__deferring = True
+        try:
+            return getattr(self, self.OPERATIONS[name])(*args)
+        finally:
+            self.__deferring = False
     
     def reset_to_original(self):
         """Reset to original loaded image."""
         if self.__original_image is not None:
-            self.__current_image = self.__original_image.copy()
-            return self.__current_image.copy()
+            # The original is read-only, so it can be shared without a copy
+            self._set_current(None)
+            self.__current_image = self.__original_image
+            return self.current_view
         return None
     
+    def close(self):
+        """Release scratch files used for memory-mapped buffers."""
+        self.__pending = None
+        if self.__store is not None:
+            self.__current_image = None
+            self.__original_image = None
+            self.__store.close()
+    
     # MAGIC METHODS
     def __str__(self):
         """String representation for users."""
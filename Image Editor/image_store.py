@@ -0,0 +1,79 @@
+# image_store.py
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+class MemmapImageStore:
+    """
+    Keeps image buffers in memory-mapped files in a scratch directory.
+    The OS can page out data that is not being touched, so large images
+    do not have to stay resident in RAM.
+    Stored buffers are read-only; image operations always produce new arrays.
+    """
+
+    def __init__(self, scratch_dir=None):
+        """Create a private scratch folder (inside scratch_dir if given)."""
+        self.__directory = tempfile.mkdtemp(prefix='image_editor_', dir=scratch_dir)
+        self.__files = set()
+
+    @property
+    def directory(self):
+        """PROPERTY: Scratch folder holding the mapped files."""
+        return self.__directory
+
+    @property
+    def file_count(self):
+        """PROPERTY: Number of mapped files currently kept."""
+        return len(self.__files)
+
+    def store(self, image):
+        """Copy an image into a new mapped file and return the read-only mapping."""
+        fd, path = tempfile.mkstemp(suffix='.raw', dir=self.__directory)
+        os.close(fd)
+        mapped = np.memmap(path, dtype=image.dtype, mode='w+', shape=image.shape)
+        mapped[:] = image
+        mapped.flags.writeable = False
+        self.__files.add(path)
+        return mapped
+
+    def is_stored(self, image):
+        """True if the array is backed by one of this store's files."""
+        return isinstance(image, np.memmap) and image.filename in self.__files
+
+    def release(self, image):
+        """
+        Delete the file behind a stored image.
+        On Windows a file cannot be deleted while mapped; it is then
+        left for close() to clean up.
+        """
+        if not self.is_stored(image):
+            return
+        try:
+            os.remove(image.filename)
+            self.__files.discard(image.filename)
+        except OSError:
+            pass
+
+    def close(self):
+        """Remove the scratch folder and every file in it."""
+        shutil.rmtree(self.__directory, ignore_errors=True)
+        self.__files.clear()
+
+    # MAGIC METHODS
+    def __len__(self):
+        """Return number of mapped files."""
+        return len(self.__files)
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"MemmapImageStore(directory='{self.__directory}', files={len(self.__files)})"
+
+    def __del__(self):
+        """Clean up scratch files when the store is garbage collected."""
+        try:
+            self.close()
+        except Exception:
+            pass
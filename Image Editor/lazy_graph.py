@@ -0,0 +1,290 @@
+# lazy_graph.py
+import cv2
+import numpy as np
+from base_classes import ImageFilter, CopyTracker
+from filters import (GrayscaleFilter, BlurFilter, EdgeDetectionFilter,
+                     BrightnessFilter, ContrastFilter, RotateFilter, FlipFilter,
+                     ResizeFilter, GeometricFilter)
+from pipeline_optimizer import PipelineOptimizer
+
+
+class PointwiseLUT(ImageFilter):
+    """
+    INHERITANCE: A run of brightness and contrast steps as one lookup table.
+    Each step is convertScaleAbs(x * alpha + beta); the table composes
+    the steps in float, keeping each step's saturation, and rounds to
+    uint8 once at the end instead of after every step. The image is read
+    once however many steps there are.
+    """
+
+    # CLASS ATTRIBUTE - each output pixel depends only on its input pixel
+    pointwise = True
+
+    def __init__(self, steps):
+        """steps: list of (alpha, beta) pairs, applied in order."""
+        super().__init__("Pointwise LUT")
+        self.steps = [(float(alpha), float(beta)) for alpha, beta in steps]
+        table = np.rint(self.compose(np.arange(256, dtype=np.float32))).astype(np.uint8)
+        self.__table = CopyTracker.readonly(table)
+
+    # CLASS METHOD
+    @classmethod
+    def from_filters(cls, filters):
+        """CLASS METHOD: Build from BrightnessFilter and ContrastFilter objects."""
+        steps = []
+        for filter_obj in filters:
+            if isinstance(filter_obj, BrightnessFilter):
+                steps.append((1, filter_obj.value))
+            elif isinstance(filter_obj, ContrastFilter):
+                steps.append((filter_obj.value, 0))
+            elif isinstance(filter_obj, PointwiseLUT):
+                steps.extend(filter_obj.steps)
+            else:
+                raise TypeError(f"Not a brightness or contrast filter: {filter_obj!r}")
+        return cls(steps)
+
+    @property
+    def table(self):
+        """PROPERTY: The 256-entry uint8 table (read-only)."""
+        return self.__table
+
+    def compose(self, values):
+        """Run the steps on float32 values without rounding in between."""
+        for alpha, beta in self.steps:
+            values = np.minimum(np.abs(values * np.float32(alpha) + np.float32(beta)), 255)
+        return values
+
+    def apply(self, image):
+        """METHOD OVERRIDING: A single cv2.LUT pass for 8-bit images."""
+        if not self.validate_image(image):
+            return None
+        if image.dtype == np.uint8:
+            return cv2.LUT(image, self.__table)
+        return np.rint(self.compose(image.astype(np.float32))).astype(np.uint8)
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"PointwiseLUT(steps={self.steps})"
+
+
+class LazyImage:
+    """
+    An image described as a source array plus the filters still to be
+    applied to it. Nothing is computed until evaluate(), and then only
+    at the scale and over the region asked for:
+    - the chain is optimized first (geometric runs folded, identity steps dropped)
+    - each run of brightness/contrast steps becomes one PointwiseLUT pass
+    - with scale < 1 the source is shrunk first, and blur kernels and
+      resize targets are scaled to match, so a display-sized render never
+      filters full-resolution pixels
+    - with a region, the steps after the last resize only process the
+      part of their input that region needs, plus each filter's halo
+    Instances are immutable: then() returns a new expression.
+    """
+
+    # CLASS ATTRIBUTE - filter class built for each operation name
+    OPERATION_FILTERS = {
+        'grayscale': GrayscaleFilter,
+        'blur': BlurFilter,
+        'edge': EdgeDetectionFilter,
+        'brightness': BrightnessFilter,
+        'contrast': ContrastFilter,
+        'rotate': RotateFilter,
+        'flip': FlipFilter,
+        'resize': ResizeFilter
+    }
+
+    # CLASS ATTRIBUTE - filters whose runs are fused into a PointwiseLUT
+    LUT_FILTERS = (BrightnessFilter, ContrastFilter)
+
+    def __init__(self, source, filters=(), optimizer=None):
+        """
+        source: the image the filters start from (kept, not copied)
+        filters: ImageFilter objects still to be applied
+        optimizer: PipelineOptimizer used to plan (default: a standard one)
+        """
+        self.__source = source
+        self.__filters = tuple(filters)
+        self.__optimizer = optimizer or PipelineOptimizer()
+
+    # PROPERTY DECORATORS
+    @property
+    def source(self):
+        """PROPERTY: Read-only view of the source image."""
+        return CopyTracker.readonly(self.__source)
+
+    @property
+    def filters(self):
+        """PROPERTY: Tuple of the pending filters."""
+        return self.__filters
+
+    @property
+    def shape(self):
+        """PROPERTY: Shape the evaluated image will have, computed without evaluating."""
+        shape = self.__source.shape
+        for filter_obj in self.__filters:
+            shape = self.output_shape(filter_obj, shape)
+        return shape
+
+    # STATIC METHODS
+    @staticmethod
+    def filter_from_operation(name, args):
+        """STATIC METHOD: Build a filter from a (name, args) operation."""
+        return LazyImage.OPERATION_FILTERS[name](*args)
+
+    @staticmethod
+    def output_shape(filter_obj, shape):
+        """
+        STATIC METHOD
+        Full array shape after the filter: PipelineOptimizer.output_shape
+        plus channels, which grayscale and edge detection drop.
+        """
+        height, width = PipelineOptimizer.output_shape(filter_obj, shape)
+        if isinstance(filter_obj, (GrayscaleFilter, EdgeDetectionFilter)):
+            return (height, width)
+        return (height, width) + tuple(shape[2:])
+
+    @staticmethod
+    def _rescale(filter_obj, scale):
+        """STATIC METHOD: Copy of a filter adjusted for an image scaled by this factor."""
+        if isinstance(filter_obj, ResizeFilter):
+            return ResizeFilter(max(1, round(filter_obj.width * scale)),
+                                max(1, round(filter_obj.height * scale)))
+        return PipelineOptimizer._rescale(filter_obj, scale)
+
+    def then(self, filter_obj):
+        """Return a new expression with one more filter."""
+        return LazyImage(self.__source, self.__filters + (filter_obj,), self.__optimizer)
+
+    def plan(self, scale=1.0):
+        """Filters evaluate() runs: optimized, scaled and with pointwise runs fused."""
+        steps = self.__optimizer.optimize(list(self.__filters), self.__source.shape, self.__source.dtype)
+        if scale != 1.0:
+            steps = [self._rescale(filter_obj, scale) for filter_obj in steps]
+
+        fused = []
+        run = []
+        for filter_obj in steps + [None]:
+            if isinstance(filter_obj, self.LUT_FILTERS):
+                run.append(filter_obj)
+                continue
+            if len(run) > 1:
+                fused.append(PointwiseLUT.from_filters(run))
+            else:
+                fused.extend(run)
+            run = []
+            if filter_obj is not None:
+                fused.append(filter_obj)
+        return fused
+
+    def evaluate(self, scale=1.0, roi=None):
+        """
+        Compute the image.
+        scale: evaluate at this fraction of the full resolution
+        roi: (x, y, width, height) in the coordinates of the (scaled) result
+        """
+        source = self.__source
+        if scale != 1.0:
+            height, width = source.shape[:2]
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            source = cv2.resize(source, size, interpolation=cv2.INTER_AREA)
+        steps = self.plan(scale)
+        if roi is None:
+            return self._run(source, steps)
+
+        # A resize mixes the whole image, so steps up to the last one run in full
+        split = max((index + 1 for index, filter_obj in enumerate(steps)
+                     if isinstance(filter_obj, ResizeFilter)), default=0)
+        return self._run_region(self._run(source, steps[:split]), steps[split:], roi)
+
+    @staticmethod
+    def _run(image, steps):
+        """Apply steps in order; every filter returns a new array."""
+        for filter_obj in steps:
+            image = filter_obj.apply(image)
+        return image
+
+    def _run_region(self, image, steps, roi):
+        """Apply steps to only the part of image that region roi of the result needs."""
+        shapes = [image.shape]
+        for filter_obj in steps:
+            shapes.append(self.output_shape(filter_obj, shapes[-1]))
+        x, y, width, height = roi
+        out_height, out_width = shapes[-1][:2]
+        if width <= 0 or height <= 0 or x < 0 or y < 0 or x + width > out_width or y + height > out_height:
+            raise ValueError(f"Region {roi} is outside the {out_width}x{out_height} image")
+
+        # Walk back from the result: the region each step needs from its input
+        needed = [None] * len(steps) + [(x, y, width, height)]
+        for index in range(len(steps) - 1, -1, -1):
+            needed[index] = self._input_region(steps[index], needed[index + 1], shapes[index])
+
+        # Walk forward, cropping each result to what the next step needs
+        result = self._crop(image, needed[0])
+        for index, filter_obj in enumerate(steps):
+            produced = self._output_region(filter_obj, needed[index], shapes[index])
+            wanted = needed[index + 1]
+            result = self._crop(filter_obj.apply(result),
+                                (wanted[0] - produced[0], wanted[1] - produced[1], wanted[2], wanted[3]))
+        return result
+
+    @staticmethod
+    def _crop(image, region):
+        """STATIC METHOD: View of region (x, y, width, height) of an image."""
+        x, y, width, height = region
+        return image[y:y + height, x:x + width]
+
+    @staticmethod
+    def _map_region(region, shape, rotation, flip_first, flipped):
+        """
+        STATIC METHOD
+        Map region (x, y, width, height) of an image of this shape through a
+        horizontal flip and a clockwise rotation, flipping first or last.
+        """
+        height, width = shape[:2]
+        corners = [(region[1], region[0]),
+                   (region[1] + region[3] - 1, region[0] + region[2] - 1)]
+        if flipped and flip_first:
+            corners = [(row, width - 1 - col) for row, col in corners]
+        if rotation == 90:
+            corners = [(col, height - 1 - row) for row, col in corners]
+        elif rotation == 180:
+            corners = [(height - 1 - row, width - 1 - col) for row, col in corners]
+        elif rotation == 270:
+            corners = [(width - 1 - col, row) for row, col in corners]
+        if flipped and not flip_first:
+            mapped_width = height if rotation in (90, 270) else width
+            corners = [(row, mapped_width - 1 - col) for row, col in corners]
+        rows = [row for row, _ in corners]
+        cols = [col for _, col in corners]
+        return (min(cols), min(rows), max(cols) - min(cols) + 1, max(rows) - min(rows) + 1)
+
+    def _input_region(self, filter_obj, region, input_shape):
+        """Region of the filter's input needed for a region of its output."""
+        if isinstance(filter_obj, GeometricFilter):
+            # Undo the rotation, then the flip
+            output_shape = self.output_shape(filter_obj, input_shape)
+            return self._map_region(region, output_shape, (360 - filter_obj.rotation) % 360,
+                                    False, filter_obj.flipped)
+        halo = filter_obj.halo
+        height, width = input_shape[:2]
+        x, y, region_width, region_height = region
+        left, top = max(0, x - halo), max(0, y - halo)
+        right = min(width, x + region_width + halo)
+        bottom = min(height, y + region_height + halo)
+        return (left, top, right - left, bottom - top)
+
+    def _output_region(self, filter_obj, region, input_shape):
+        """Region of the filter's output that a region of its input produces."""
+        if isinstance(filter_obj, GeometricFilter):
+            return self._map_region(region, input_shape, filter_obj.rotation, True, filter_obj.flipped)
+        return region
+
+    # MAGIC METHODS
+    def __len__(self):
+        """Return number of pending filters."""
+        return len(self.__filters)
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"LazyImage(shape={self.shape}, filters={len(self.__filters)})"
@@ -1,3 +1,4 @@
+import argparse
 import tkinter as tk
 from app_window import ImageEditorApp
 from image_processor import ImageProcessor
@@ -36,15 +37,22 @@ def demonstrate_oop_concepts():
     print("All OOP concepts are integrated in the application!")
     print("=" * 60 + "\n")
 
-def main():
+def main(argv=None):
     """Main entry point."""
+    parser = argparse.ArgumentParser(description="Image editor with undo history.")
+    parser.add_argument('--history', choices=ImageEditorApp.HISTORY_MODES, default='operations',
+                        help="'operations' replays recorded operations (default, small), "
+                             "'snapshot' keeps compressed pixels of every state")
+    args = parser.parse_args(argv)
+    
     # Optional: Show OOP demonstration in console
     demonstrate_oop_concepts()
     
     # Launch GUI application
     root = tk.Tk()
-    app = ImageEditorApp(root)
+    app = ImageEditorApp(root, history_mode=args.history)
     root.mainloop()
+    app.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,221 @@
+# operation_history.py
+import numpy as np
+from base_classes import CopyTracker
+from image_processor import ImageProcessor
+
+
+class OperationStep:
+    """One history entry: the operation that produced a state, plus an optional keyframe."""
+
+    __slots__ = ('name', 'args', 'keyframe')
+
+    def __init__(self, name, args, keyframe=None):
+        self.name = name
+        self.args = tuple(args)
+        self.keyframe = keyframe  # full image, or None if the state is replayed
+
+    @property
+    def nbytes(self):
+        """PROPERTY: Bytes held by the keyframe."""
+        return self.keyframe.nbytes if self.keyframe is not None else 0
+
+
+class OperationHistory:
+    """
+    Undo history that records operations instead of pixels.
+    Same interface as HistoryManager, plus record_operation().
+    A full keyframe is kept every keyframe_interval steps and after
+    expensive operations; other states are rebuilt by replaying forward
+    from the nearest keyframe. Rotations and flips are undone by applying
+    their inverse to the current image.
+    """
+
+    # CLASS ATTRIBUTES
+    max_default_history = 500
+    keyframe_interval = 10
+    expensive_blur_intensity = 15  # blurs at least this strong get a keyframe
+
+    def __init__(self, max_history=None, max_keyframe_bytes=512 * 1024 * 1024):
+        """CONSTRUCTOR with default parameters."""
+        self.__steps = []  # ENCAPSULATION: Private list of OperationStep
+        self.__current_index = -1
+        self.__current_image = None  # image at current index
+        self.__max_history = max_history if max_history else OperationHistory.max_default_history
+        self.__max_keyframe_bytes = max_keyframe_bytes
+        self.__replayer = ImageProcessor()
+
+    # PROPERTY DECORATORS
+    @property
+    def current_index(self):
+        """PROPERTY: Get current history index."""
+        return self.__current_index
+
+    @property
+    def history_size(self):
+        """PROPERTY: Get total history size."""
+        return len(self.__steps)
+
+    @property
+    def history_bytes(self):
+        """PROPERTY: Get memory used by keyframes in bytes."""
+        return sum(step.nbytes for step in self.__steps)
+
+    @property
+    def keyframe_count(self):
+        """PROPERTY: Number of states stored as full images."""
+        return sum(1 for step in self.__steps if step.keyframe is not None)
+
+    def get_state_cost(self, index):
+        """Get bytes used to store the state at index."""
+        return self.__steps[index].nbytes
+
+    # STATIC METHOD
+    @staticmethod
+    def inverse_operation(name, args):
+        """
+        STATIC METHOD
+        Return (name, args) that undoes a geometric operation, or None.
+        """
+        if name == 'rotate' and args and args[0] in (90, 180, 270):
+            return ('rotate', (360 - args[0],))
+        if name == 'flip' and args and args[0] in ('horizontal', 'vertical'):
+            return ('flip', args)
+        return None
+
+    def _needs_keyframe(self, name, args):
+        """Keyframe periodically and after operations that are slow to replay."""
+        if name == 'blur' and args and args[0] >= self.expensive_blur_intensity:
+            return True
+        steps_since_keyframe = 0
+        for step in reversed(self.__steps[:self.__current_index + 1]):
+            if step.keyframe is not None:
+                break
+            steps_since_keyframe += 1
+        return steps_since_keyframe + 1 >= self.keyframe_interval
+
+    def _replay(self, image, name, args):
+        """Apply one recorded operation to an image."""
+        self.__replayer.set_current_image(image)
+        return getattr(self.__replayer, ImageProcessor.OPERATIONS[name])(*args)
+
+    def _rebuild(self, index):
+        """Rebuild the state at index from the nearest earlier keyframe."""
+        if index == self.__current_index:
+            return self.__current_image
+        start = index
+        while self.__steps[start].keyframe is None:
+            start -= 1
+        image = self.__steps[start].keyframe
+        for step in self.__steps[start + 1:index + 1]:
+            image = self._replay(image, step.name, step.args)
+        return image
+
+    def _append(self, step, image):
+        """Drop redo states, append a step and enforce the limits."""
+        self.__steps = self.__steps[:self.__current_index + 1]
+        self.__steps.append(step)
+        self.__current_index += 1
+        self.__current_image = image
+
+        while len(self.__steps) > 1 and (
+                len(self.__steps) > self.__max_history
+                or self.history_bytes > self.__max_keyframe_bytes):
+            self._evict_oldest()
+
+    def _evict_oldest(self):
+        """Drop the oldest state, keeping a keyframe at the start."""
+        if self.__steps[1].keyframe is None:
+            self.__steps[1].keyframe = self._rebuild(1)
+        self.__steps.pop(0)
+        self.__current_index -= 1
+
+    def save_state(self, image):
+        """Save a full image state (used after loading or resetting)."""
+        if image is None:
+            return
+        image = CopyTracker.adopt(image)
+        self._append(OperationStep('snapshot', (), image), image)
+
+    def record_operation(self, name, args, image):
+        """
+        Record an operation and the image it produced.
+        The image is only stored if this step becomes a keyframe.
+        """
+        if image is None:
+            return
+        if not self.__steps or name not in ImageProcessor.OPERATIONS:
+            self.save_state(image)
+            return
+        image = CopyTracker.adopt(image)
+        keyframe = image if self._needs_keyframe(name, args) else None
+        self._append(OperationStep(name, args, keyframe), image)
+
+    def undo(self):
+        """Go back to previous state (returned read-only)."""
+        if not self.can_undo():
+            return None
+        step = self.__steps[self.__current_index]
+        inverse = self.inverse_operation(step.name, step.args)
+        if inverse is not None:
+            previous = self._replay(self.__current_image, *inverse)
+        else:
+            previous = self._rebuild(self.__current_index - 1)
+        self.__current_index -= 1
+        self.__current_image = previous
+        return previous
+
+    def redo(self):
+        """Go forward to next state (returned read-only)."""
+        if not self.can_redo():
+            return None
+        step = self.__steps[self.__current_index + 1]
+        if step.keyframe is not None:
+            following = step.keyframe
+        else:
+            following = self._replay(self.__current_image, step.name, step.args)
+        self.__current_index += 1
+        self.__current_image = following
+        return following
+
+    def can_undo(self):
+        """Check if undo is possible."""
+        return self.__current_index > 0
+
+    def can_redo(self):
+        """Check if redo is possible."""
+        return self.__current_index < len(self.__steps) - 1
+
+    def clear_history(self):
+        """Clear all history."""
+        self.__steps = []
+        self.__current_index = -1
+        self.__current_image = None
+
+    # MAGIC METHODS
+    def __len__(self):
+        """Returns number of states in history."""
+        return len(self.__steps)
+
+    def __str__(self):
+        """String representation for users."""
+        return (f"History: {len(self.__steps)} steps, {self.keyframe_count} keyframes "
+                f"({self.history_bytes / (1024 * 1024):.1f} MB), at index {self.__current_index}")
+
+    def __repr__(self):
+        """String representation for developers."""
+        return (f"OperationHistory(size={len(self.__steps)}, index={self.__current_index}, "
+                f"keyframes={self.keyframe_count})")
+
+    def __bool__(self):
+        """Boolean conversion - True if has history."""
+        return len(self.__steps) > 0
+
+    def __getitem__(self, index):
+        """Rebuild and return the state at index (read-only)."""
+        if 0 <= index < len(self.__steps):
+            return self._rebuild(index)
+        raise IndexError("History index out of range")
+
+    def __contains__(self, item):
+        """Check if an image matches any state in history."""
+        return any(np.array_equal(item, self[i]) for i in range(len(self.__steps)))
@@ -0,0 +1,202 @@
+# pipeline_optimizer.py
+import numpy as np
+from filters import (GrayscaleFilter, BlurFilter, EdgeDetectionFilter,
+                     BrightnessFilter, ContrastFilter, RotateFilter, FlipFilter,
+                     ResizeFilter, GeometricFilter, AdvancedImageProcessor)
+
+
+class PipelineOptimizer:
+    """
+    Rewrites an AdvancedImageProcessor filter chain before it runs.
+    - drops identity steps (brightness 0, contrast 1.0, blur 1, ...)
+    - folds consecutive rotate/flip steps into one GeometricFilter
+    - merges consecutive non-negative brightness steps
+    The brightness and contrast rules hold for uint8 images only: on other
+    types convertScaleAbs also converts to uint8, so those steps are kept.
+    - optionally moves a shrinking resize ahead of the filters before it
+    """
+
+    # CLASS ATTRIBUTES - filter groups used by the rewrite rules
+    GEOMETRIC_FILTERS = (RotateFilter, FlipFilter, GeometricFilter)
+    NEIGHBORHOOD_FILTERS = (BlurFilter, EdgeDetectionFilter)
+    SHAPE_PRESERVING_FILTERS = (GrayscaleFilter, BlurFilter, EdgeDetectionFilter,
+                                BrightnessFilter, ContrastFilter)
+
+    def __init__(self, allow_reorder=False):
+        """
+        allow_reorder: allow moving a shrinking resize ahead of costly filters.
+        This changes the result slightly (filters run at the smaller size).
+        """
+        self.allow_reorder = allow_reorder
+
+    @staticmethod
+    def is_uint8(dtype):
+        """STATIC METHOD: True for uint8, and for None (every loader here produces uint8)."""
+        return dtype is None or np.dtype(dtype) == np.uint8
+
+    @staticmethod
+    def is_identity(filter_obj, shape=None, dtype=None):
+        """
+        STATIC METHOD
+        True if the filter leaves an image of this shape and dtype unchanged.
+        """
+        if isinstance(filter_obj, BrightnessFilter):
+            return filter_obj.value == 0 and PipelineOptimizer.is_uint8(dtype)
+        if isinstance(filter_obj, ContrastFilter):
+            return filter_obj.value == 1.0 and PipelineOptimizer.is_uint8(dtype)
+        if isinstance(filter_obj, BlurFilter):
+            return filter_obj.intensity <= 1
+        if isinstance(filter_obj, PipelineOptimizer.GEOMETRIC_FILTERS):
+            return GeometricFilter.from_filter(filter_obj).is_identity
+        if isinstance(filter_obj, ResizeFilter) and shape is not None:
+            return (filter_obj.width, filter_obj.height) == (shape[1], shape[0])
+        return False
+
+    @staticmethod
+    def output_shape(filter_obj, shape):
+        """
+        STATIC METHOD
+        (height, width) of the image after the filter, or None if unknown.
+        """
+        if shape is None:
+            return None
+        height, width = shape[:2]
+        if isinstance(filter_obj, ResizeFilter):
+            return (filter_obj.height, filter_obj.width)
+        if isinstance(filter_obj, PipelineOptimizer.GEOMETRIC_FILTERS):
+            if GeometricFilter.from_filter(filter_obj).rotation in (90, 270):
+                return (width, height)
+        if isinstance(filter_obj, AdvancedImageProcessor):
+            for inner in filter_obj:
+                shape = PipelineOptimizer.output_shape(inner, shape)
+            return shape[:2] if shape is not None else None
+        return (height, width)
+
+    @staticmethod
+    def estimate_passes(chain, shape=None):
+        """
+        STATIC METHOD
+        Estimate full-frame pixel passes for a chain.
+        With a known shape each step is weighted by the area it processes,
+        relative to the input area.
+        """
+        if shape is None:
+            return float(len(chain))
+        input_area = shape[0] * shape[1]
+        passes = 0.0
+        for filter_obj in chain:
+            passes += shape[0] * shape[1] / input_area
+            shape = PipelineOptimizer.output_shape(filter_obj, shape)
+        return passes
+
+    def optimize(self, chain, shape=None, dtype=None):
+        """
+        Return an optimized copy of the chain. The input list is not modified.
+        dtype: element type of the input image (None means uint8)
+        """
+        steps = self._flatten(chain)
+        steps = self._fold_steps(steps, shape, dtype)
+        if self.allow_reorder and shape is not None:
+            steps = self._hoist_resizes(steps, shape)
+            steps = self._fold_steps(steps, shape, dtype)
+        return steps
+
+    def explain(self, chain, shape=None):
+        """Describe the rewritten plan and the estimated pixel passes saved."""
+        steps = self._flatten(chain)
+        optimized = self.optimize(steps, shape)
+        before = self.estimate_passes(steps, shape)
+        after = self.estimate_passes(optimized, shape)
+
+        lines = ["Original plan:"]
+        lines += [f"  {i + 1}. {self.describe(step)}" for i, step in enumerate(steps)] or ["  (empty)"]
+        lines.append("Optimized plan:")
+        lines += [f"  {i + 1}. {self.describe(step)}" for i, step in enumerate(optimized)] or ["  (empty)"]
+        lines.append(f"Estimated pixel passes: {before:.2f} -> {after:.2f} "
+                     f"(saved {before - after:.2f})")
+        return "\n".join(lines)
+
+    @staticmethod
+    def describe(filter_obj):
+        """STATIC METHOD: Filter name with its public parameters."""
+        params = ", ".join(f"{key}={value!r}" for key, value in vars(filter_obj).items()
+                           if not key.startswith('_'))
+        return f"{filter_obj.name}({params})"
+
+    # Rewrite rules
+    def _flatten(self, chain):
+        """Inline nested AdvancedImageProcessor chains."""
+        steps = []
+        for filter_obj in chain:
+            if isinstance(filter_obj, AdvancedImageProcessor):
+                steps.extend(self._flatten(list(filter_obj)))
+            else:
+                steps.append(filter_obj)
+        return steps
+
+    def _fold_steps(self, steps, shape, dtype=None):
+        """Fold geometric runs, merge brightness and drop identity steps."""
+        result = []
+        for filter_obj in steps:
+            previous = result[-1] if result else None
+
+            if (isinstance(filter_obj, self.GEOMETRIC_FILTERS)
+                    and isinstance(previous, self.GEOMETRIC_FILTERS)):
+                result[-1] = GeometricFilter.from_filter(previous).then(filter_obj)
+            elif (isinstance(filter_obj, BrightnessFilter) and isinstance(previous, BrightnessFilter)
+                    and filter_obj.value >= 0 and previous.value >= 0 and self.is_uint8(dtype)):
+                # Saturating adds of the same sign combine exactly
+                result[-1] = BrightnessFilter(previous.value + filter_obj.value)
+            else:
+                result.append(filter_obj)
+
+        optimized = []
+        for filter_obj in result:
+            if self.is_identity(filter_obj, shape, dtype):
+                continue
+            if isinstance(filter_obj, (RotateFilter, FlipFilter)):
+                filter_obj = GeometricFilter.from_filter(filter_obj)
+            elif isinstance(filter_obj, (BrightnessFilter, ContrastFilter)):
+                dtype = None  # convertScaleAbs always returns uint8
+            optimized.append(filter_obj)
+            shape = self.output_shape(filter_obj, shape)
+        return optimized
+
+    def _hoist_resizes(self, steps, shape):
+        """Move each shrinking resize ahead of the shape-preserving run before it."""
+        shapes = [shape]
+        for filter_obj in steps:
+            shapes.append(self.output_shape(filter_obj, shapes[-1]))
+
+        # Each move rotates result[start:index + 1] in place, so a step's
+        # index is its position in result too (even if a filter object
+        # appears in the chain more than once)
+        result = list(steps)
+        for position, filter_obj in enumerate(steps):
+            if not isinstance(filter_obj, ResizeFilter):
+                continue
+            height, width = shapes[position][:2]
+            if filter_obj.width * filter_obj.height >= width * height:
+                continue
+
+            start = position
+            while start > 0 and isinstance(result[start - 1], self.SHAPE_PRESERVING_FILTERS):
+                start -= 1
+            run = result[start:position]
+            if not any(isinstance(f, self.NEIGHBORHOOD_FILTERS) for f in run):
+                continue
+
+            scale = ((filter_obj.width / width) * (filter_obj.height / height)) ** 0.5
+            result[start:position + 1] = [filter_obj] + [self._rescale(f, scale) for f in run]
+        return result
+
+    @staticmethod
+    def _rescale(filter_obj, scale):
+        """Copy of a filter adjusted to run on an image scaled by this factor."""
+        if isinstance(filter_obj, BlurFilter):
+            return BlurFilter(max(1, int(round(filter_obj.intensity * scale))), filter_obj.mode)
+        return filter_obj
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"PipelineOptimizer(allow_reorder={self.allow_reorder})"
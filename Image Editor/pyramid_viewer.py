@@ -0,0 +1,260 @@
+# pyramid_viewer.py
+import math
+from collections import OrderedDict
+
+import cv2
+from PIL import Image, ImageTk
+
+
+class ImagePyramid:
+    """
+    Halving resolution levels of an image, built lazily.
+    Level 0 is the image itself, level n is scaled by 1 / 2**n.
+    """
+
+    # CLASS ATTRIBUTE - stop halving once the longest side is this small
+    min_level_size = 64
+
+    def __init__(self, image):
+        """Store level 0; smaller levels are built when first needed."""
+        self.__levels = [image]
+
+    @property
+    def max_level(self):
+        """PROPERTY: Index of the smallest useful level."""
+        longest = max(self.__levels[0].shape[:2])
+        return max(0, int(math.log2(max(1, longest / self.min_level_size))))
+
+    def level(self, index):
+        """Return level `index`, building any missing levels on the way."""
+        index = max(0, min(index, self.max_level))
+        while len(self.__levels) <= index:
+            previous = self.__levels[-1]
+            height, width = previous.shape[:2]
+            size = (max(1, width // 2), max(1, height // 2))
+            self.__levels.append(cv2.resize(previous, size, interpolation=cv2.INTER_AREA))
+        return self.__levels[index]
+
+    def level_for_zoom(self, zoom):
+        """Smallest level whose resolution is still at least the zoom."""
+        if zoom >= 1.0:
+            return 0
+        return min(self.max_level, int(math.floor(math.log2(1.0 / zoom))))
+
+    def __len__(self):
+        """Return number of levels built so far."""
+        return len(self.__levels)
+
+
+class PyramidViewer:
+    """
+    Zoom and pan viewer for a Tk canvas.
+    Only the tiles that intersect the visible viewport are converted and
+    drawn, using the pyramid level closest to the zoom, so large images
+    stay smooth. Converted tiles are kept in an LRU cache.
+    Mouse wheel zooms at the cursor, drag pans, double-click toggles
+    between fit-to-window and 100%.
+    """
+
+    # CLASS ATTRIBUTES
+    tile_size = 256
+    max_cached_tiles = 512
+    zoom_step = 1.25
+    min_zoom = 1 / 64
+    max_zoom = 32.0
+
+    def __init__(self, canvas, on_change=None):
+        """
+        canvas: Tk canvas to draw on
+        on_change: called when zoom or pan changes and a redraw is needed
+        """
+        self.canvas = canvas
+        self.on_change = on_change
+        self.__pyramid = None
+        self.__version = None
+        self.__image_size = None  # (width, height) of level 0
+        self.__zoom = None  # None means fit-to-window
+        self.__center = (0.0, 0.0)  # image point shown at the canvas centre
+        self.__tiles = OrderedDict()  # (level, ratio, tx, ty) -> PhotoImage
+        self.__drag_start = None
+
+        canvas.bind('<MouseWheel>', self._on_wheel)
+        canvas.bind('<Button-4>', lambda e: self._zoom_event(e, self.zoom_step))
+        canvas.bind('<Button-5>', lambda e: self._zoom_event(e, 1 / self.zoom_step))
+        canvas.bind('<ButtonPress-1>', self._on_press)
+        canvas.bind('<B1-Motion>', self._on_drag)
+        canvas.bind('<Double-Button-1>', self._on_double_click)
+
+    # PROPERTY DECORATORS
+    @property
+    def active(self):
+        """PROPERTY: True when zoomed (not in fit-to-window mode)."""
+        return self.__zoom is not None and self.__pyramid is not None
+
+    @property
+    def zoom(self):
+        """PROPERTY: Current zoom factor (1.0 = 100%), or None when fitted."""
+        return self.__zoom
+
+    @property
+    def cached_tiles(self):
+        """PROPERTY: Number of converted tiles in the cache."""
+        return len(self.__tiles)
+
+    def set_image(self, image, version):
+        """Use a new image; the pyramid and tiles are rebuilt only if the version changed."""
+        if version == self.__version and self.__pyramid is not None:
+            return
+        height, width = image.shape[:2]
+        if self.__image_size != (width, height):
+            self.__center = (width / 2, height / 2)
+        self.__pyramid = ImagePyramid(image)
+        self.__version = version
+        self.__image_size = (width, height)
+        self.__tiles.clear()
+
+    def fit(self):
+        """Return to fit-to-window mode."""
+        self.__zoom = None
+        self._changed()
+
+    def zoom_to(self, zoom, canvas_x=None, canvas_y=None):
+        """Set the zoom, keeping the image point under (canvas_x, canvas_y) in place."""
+        if self.__pyramid is None:
+            return
+        canvas_width, canvas_height = self._canvas_size()
+        if canvas_x is None:
+            canvas_x, canvas_y = canvas_width / 2, canvas_height / 2
+        if self.__zoom is None:
+            # Fit mode always shows the whole image centred
+            width, height = self.__image_size
+            self.__center = (width / 2, height / 2)
+        old_zoom = self.__zoom or self.fit_zoom()
+        zoom = max(self.min_zoom, min(self.max_zoom, zoom))
+
+        center_x, center_y = self.__center
+        image_x = center_x + (canvas_x - canvas_width / 2) / old_zoom
+        image_y = center_y + (canvas_y - canvas_height / 2) / old_zoom
+        self.__center = (image_x - (canvas_x - canvas_width / 2) / zoom,
+                         image_y - (canvas_y - canvas_height / 2) / zoom)
+        self.__zoom = zoom
+        self._changed()
+
+    def pan(self, dx, dy):
+        """Move the view by (dx, dy) canvas pixels."""
+        if not self.active:
+            return
+        center_x, center_y = self.__center
+        self.__center = (center_x - dx / self.__zoom, center_y - dy / self.__zoom)
+        self._changed()
+
+    def fit_zoom(self):
+        """Zoom factor that fits the whole image in the canvas."""
+        canvas_width, canvas_height = self._canvas_size()
+        width, height = self.__image_size
+        return min(1.0, (canvas_width - 20) / width, (canvas_height - 20) / height)
+
+    def render(self):
+        """Draw the tiles that intersect the viewport at the current zoom."""
+        if not self.active:
+            return
+        canvas_width, canvas_height = self._canvas_size()
+        zoom = self.__zoom
+        level = self.__pyramid.level_for_zoom(zoom)
+        image = self.__pyramid.level(level)
+        level_height, level_width = image.shape[:2]
+        ratio = zoom * (2 ** level)  # level pixels -> canvas pixels
+        # When enlarging, cut smaller source tiles so drawn tiles stay ~tile_size
+        source_size = max(1, int(self.tile_size / max(1.0, ratio)))
+        step = source_size * ratio
+
+        # Canvas position of level pixel (0, 0), rounded once so tiles line up
+        center_x, center_y = self.__center
+        origin_x = round(canvas_width / 2 - center_x * zoom)
+        origin_y = round(canvas_height / 2 - center_y * zoom)
+
+        columns = math.ceil(level_width / source_size)
+        rows = math.ceil(level_height / source_size)
+        first_column = max(0, int(-origin_x // step))
+        last_column = min(columns - 1, int((canvas_width - origin_x) // step))
+        first_row = max(0, int(-origin_y // step))
+        last_row = min(rows - 1, int((canvas_height - origin_y) // step))
+
+        self.canvas.delete("all")
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                left = origin_x + round(column * step)
+                top = origin_y + round(row * step)
+                photo = self._get_tile(image, level, ratio, source_size, column, row)
+                self.canvas.create_image(left, top, image=photo, anchor='nw')
+
+    def _get_tile(self, image, level, ratio, size, column, row):
+        """Converted tile from the cache, or build it."""
+        key = (level, round(ratio, 6), column, row)
+        photo = self.__tiles.get(key)
+        if photo is not None:
+            self.__tiles.move_to_end(key)
+            return photo
+
+        tile = image[row * size:(row + 1) * size, column * size:(column + 1) * size]
+        # Integer canvas edges of this tile, matching the positions in render()
+        width = round((column * size + tile.shape[1]) * ratio) - round(column * size * ratio)
+        height = round((row * size + tile.shape[0]) * ratio) - round(row * size * ratio)
+        if (width, height) != (tile.shape[1], tile.shape[0]):
+            # Enlarged pixels stay sharp for inspection; reductions are averaged
+            interpolation = cv2.INTER_NEAREST if ratio > 1 else cv2.INTER_AREA
+            tile = cv2.resize(tile, (max(1, width), max(1, height)), interpolation=interpolation)
+
+        code = cv2.COLOR_GRAY2RGB if tile.ndim == 2 else cv2.COLOR_BGR2RGB
+        photo = ImageTk.PhotoImage(Image.fromarray(cv2.cvtColor(tile, code)))
+        self.__tiles[key] = photo
+        while len(self.__tiles) > self.max_cached_tiles:
+            self.__tiles.popitem(last=False)
+        return photo
+
+    def _canvas_size(self):
+        """Current canvas size, with a default before the window is mapped."""
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        return (width, height) if width > 1 and height > 1 else (800, 600)
+
+    def _changed(self):
+        """Ask the owner to redraw."""
+        if self.on_change:
+            self.on_change()
+
+    # Event handlers
+    def _on_wheel(self, event):
+        """Mouse wheel zooms (and keeps the control panel from scrolling)."""
+        self._zoom_event(event, self.zoom_step if event.delta > 0 else 1 / self.zoom_step)
+        return "break"
+
+    def _zoom_event(self, event, factor):
+        """Zoom by a factor around the mouse position."""
+        if self.__pyramid is None:
+            return "break"
+        self.zoom_to((self.__zoom or self.fit_zoom()) * factor, event.x, event.y)
+        return "break"
+
+    def _on_press(self, event):
+        """Start a pan."""
+        self.__drag_start = (event.x, event.y)
+
+    def _on_drag(self, event):
+        """Pan while dragging."""
+        if self.__drag_start is None:
+            return
+        start_x, start_y = self.__drag_start
+        self.__drag_start = (event.x, event.y)
+        self.pan(event.x - start_x, event.y - start_y)
+
+    def _on_double_click(self, event):
+        """Toggle between fit-to-window and 100% at the cursor."""
+        if self.active:
+            self.fit()
+        elif self.__pyramid is not None:
+            self.zoom_to(1.0, event.x, event.y)
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"PyramidViewer(zoom={self.__zoom}, cached_tiles={len(self.__tiles)})"
@@ -0,0 +1,362 @@
+# recipe.py
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+from base_classes import CopyTracker, FilterTelemetry
+from batch_processor import BatchProcessor, BatchReport
+from image_processor import ImageProcessor
+
+
+class Recipe:
+    """
+    A DAG of ImageProcessor operations with several named outputs.
+    Each step applies one operation to the source image or to another
+    step, so variants that share a prefix (e.g. the same resize) compute
+    it once. Steps run in dependency order and every intermediate is
+    dropped as soon as its last consumer has used it.
+
+    JSON form:
+        {"steps": {"small": {"input": "source", "op": "resize=320x240"},
+                   "small_gray": {"input": "small", "op": "grayscale"}},
+         "outputs": {"thumb": "small_gray",
+                     "preview": {"step": "small", "format": "png"}}}
+    or, listing each output as a plain chain and letting shared prefixes
+    be merged:
+        {"chains": {"thumb": ["resize=320x240", "grayscale"],
+                    "preview": ["resize=320x240"]}}
+    """
+
+    # CLASS ATTRIBUTE - name of the decoded input image
+    SOURCE = 'source'
+
+    def __init__(self, steps, outputs):
+        """
+        steps: dict step name -> (input name, (operation, args)) or
+               (input name, spec string like 'blur=15')
+        outputs: dict output name -> step name, or (step name, format)
+        """
+        self.steps = {}
+        for name, (source, operation) in steps.items():
+            if isinstance(operation, str):
+                operation = BatchProcessor.parse_operation(operation)
+            self.steps[name] = (source, (operation[0], tuple(operation[1])))
+        self.outputs = {name: (target, None) if isinstance(target, str) else tuple(target)
+                        for name, target in outputs.items()}
+        self.__order = self._plan()
+
+    # CLASS METHODS - alternative constructors
+    @classmethod
+    def from_chains(cls, chains):
+        """
+        CLASS METHOD
+        Build a recipe from output name -> list of operations, merging
+        the prefixes that chains have in common into shared steps.
+        """
+        steps = {}
+        outputs = {}
+        prefixes = {}  # (input step, operation) -> step name
+        for output, chain in chains.items():
+            node = cls.SOURCE
+            for operation in chain:
+                if isinstance(operation, str):
+                    operation = BatchProcessor.parse_operation(operation)
+                operation = (operation[0], tuple(operation[1]))
+                step = prefixes.get((node, operation))
+                if step is None:
+                    step = f"step{len(steps) + 1}_{operation[0]}"
+                    steps[step] = (node, operation)
+                    prefixes[(node, operation)] = step
+                node = step
+            outputs[output] = node
+        return cls(steps, outputs)
+
+    @classmethod
+    def from_dict(cls, data):
+        """CLASS METHOD: Build a recipe from its JSON form (see class docstring)."""
+        if 'chains' in data:
+            return cls.from_chains(data['chains'])
+        steps = {}
+        for name, step in data.get('steps', {}).items():
+            # Either a spec string ('blur=15') or a name with an 'args' list
+            operation = step['op']
+            if 'args' in step:
+                operation = (operation, step['args'])
+            steps[name] = (step.get('input', cls.SOURCE), operation)
+        outputs = {}
+        for name, target in data.get('outputs', {}).items():
+            outputs[name] = target if isinstance(target, str) else (target['step'], target.get('format'))
+        return cls(steps, outputs)
+
+    @classmethod
+    def load(cls, path):
+        """CLASS METHOD: Read a recipe from a JSON file."""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self):
+        """JSON-serializable form of the recipe (steps/outputs layout)."""
+        steps = {name: {'input': source, 'op': operation, 'args': list(args)}
+                 for name, (source, (operation, args)) in self.steps.items()}
+        outputs = {name: step if fmt is None else {'step': step, 'format': fmt}
+                   for name, (step, fmt) in self.outputs.items()}
+        return {'steps': steps, 'outputs': outputs}
+
+    def save(self, path):
+        """Write the recipe as JSON."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def _plan(self):
+        """
+        Validate the recipe and order the steps needed by the outputs so
+        every step comes after its input. Unused steps are left out.
+        Raises ValueError for unknown names, unknown operations or cycles.
+        """
+        if not self.outputs:
+            raise ValueError("A recipe needs at least one output")
+        for name, (source, (operation, _)) in self.steps.items():
+            if name == self.SOURCE:
+                raise ValueError(f"'{self.SOURCE}' is reserved for the input image")
+            if operation not in ImageProcessor.OPERATIONS:
+                raise ValueError(f"Step '{name}': unknown operation '{operation}'")
+            if source != self.SOURCE and source not in self.steps:
+                raise ValueError(f"Step '{name}': unknown input '{source}'")
+        for name, (step, _) in self.outputs.items():
+            if step != self.SOURCE and step not in self.steps:
+                raise ValueError(f"Output '{name}': unknown step '{step}'")
+
+        order = []
+        state = {}  # step -> 'visiting' or 'done'
+        for step, _ in self.outputs.values():
+            # Depth-first walk up the inputs, iteratively (chains can be long)
+            path = []
+            while step != self.SOURCE and state.get(step) != 'done':
+                if state.get(step) == 'visiting':
+                    raise ValueError(f"Recipe has a cycle through step '{step}'")
+                state[step] = 'visiting'
+                path.append(step)
+                step = self.steps[step][0]
+            for visited in reversed(path):
+                state[visited] = 'done'
+                order.append(visited)
+        return order
+
+    # PROPERTY DECORATORS
+    @property
+    def order(self):
+        """PROPERTY: Names of the steps that run, in execution order."""
+        return list(self.__order)
+
+    def consumers(self):
+        """Number of uses of each image: steps reading it plus outputs writing it."""
+        counts = {self.SOURCE: 0}
+        counts.update((step, 0) for step in self.__order)
+        for step in self.__order:
+            counts[self.steps[step][0]] += 1
+        for step, _ in self.outputs.values():
+            counts[step] += 1
+        return counts
+
+    def run(self, image, processor=None):
+        """
+        Execute the recipe on one image.
+        Generator of (output name, image), yielded as soon as each output
+        is ready. An intermediate is released once its last consumer has
+        run, and an output once the caller has taken it, so at most the
+        images still needed are held at any time.
+        processor: ImageProcessor to run the steps with (a new one if None)
+        """
+        processor = processor or ImageProcessor()
+        remaining = self.consumers()
+        ready_outputs = {}
+        for name, (step, _) in self.outputs.items():
+            ready_outputs.setdefault(step, []).append(name)
+        # Adopted once, so every step reading the source shares it without copying
+        image = CopyTracker.adopt(image)
+        live = {self.SOURCE: image}
+
+        def release(step):
+            remaining[step] -= 1
+            if remaining[step] == 0:
+                del live[step]
+
+        for output in ready_outputs.get(self.SOURCE, []):
+            yield output, image
+            release(self.SOURCE)
+        for step in self.__order:
+            source, (operation, args) = self.steps[step]
+            processor.set_current_image(live[source])
+            if processor.apply_operation(operation, *args) is None:
+                raise ValueError(f"Step '{step}' ({operation}) failed")
+            live[step] = processor.current_view
+            release(source)
+            for output in ready_outputs.get(step, []):
+                yield output, live[step]
+                release(step)
+
+    # MAGIC METHODS
+    def __len__(self):
+        """Return number of steps that run for each image."""
+        return len(self.__order)
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"Recipe(steps={len(self.__order)}, outputs={list(self.outputs)})"
+
+
+# One ImageProcessor per worker process, created lazily
+_worker_processor = None
+
+
+def _run_recipe_file(job):
+    """
+    Worker function (runs inside a pool process).
+    Decodes one file once and writes every output of the recipe.
+    Never raises - failures are returned so the batch keeps going.
+    Returns (filepath, ok, error, bytes_in, bytes_out, filter telemetry).
+    """
+    global _worker_processor
+    filepath, output_paths, recipe = job
+
+    if _worker_processor is None:
+        _worker_processor = ImageProcessor()
+    FilterTelemetry.reset_counter()
+
+    try:
+        bytes_in = os.path.getsize(filepath)
+        image = ImageProcessor.decode_image(filepath)
+        if image is None:
+            return (filepath, False, "could not decode image", bytes_in, 0, FilterTelemetry.snapshot())
+        image.flags.writeable = False
+
+        bytes_out = 0
+        for output, result in recipe.run(image, _worker_processor):
+            output_path = output_paths[output]
+            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+            if not cv2.imwrite(output_path, result):
+                return (filepath, False, f"could not write output '{output}'", bytes_in, bytes_out,
+                        FilterTelemetry.snapshot())
+            bytes_out += os.path.getsize(output_path)
+        return (filepath, True, None, bytes_in, bytes_out, FilterTelemetry.snapshot())
+    except Exception as e:
+        return (filepath, False, str(e), 0, 0, FilterTelemetry.snapshot())
+
+
+class RecipeProcessor:
+    """
+    Headless engine that runs a Recipe over many files with a process
+    pool. Each output goes to its own subfolder of the output folder.
+    """
+
+    def __init__(self, recipe, output_dir, workers=None):
+        """recipe: Recipe to run on every file."""
+        self.recipe = recipe
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+
+    def _output_paths(self, relative_name):
+        """Output path of every recipe output for one input file."""
+        paths = {}
+        for output, (_, fmt) in self.recipe.outputs.items():
+            name = relative_name
+            if fmt:
+                name = os.path.splitext(name)[0] + '.' + fmt.lower().lstrip('.')
+            paths[output] = os.path.join(self.output_dir, output, name)
+        return paths
+
+    def run(self, inputs, progress=None):
+        """
+        Process all inputs (list of (filepath, relative name) pairs).
+        progress: optional callback(done, total, result) called per file.
+        Raises ValueError, before processing anything, if two inputs map
+        to the same output file (see BatchProcessor.check_outputs).
+        """
+        jobs = [(filepath, self._output_paths(name), self.recipe) for filepath, name in inputs]
+        BatchProcessor.check_outputs((filepath, path) for filepath, paths, _ in jobs
+                                     for path in paths.values())
+        report = BatchReport()
+        chunksize = max(1, min(64, len(jobs) // (self.workers * 4)))
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for done, result in enumerate(executor.map(_run_recipe_file, jobs, chunksize=chunksize), 1):
+                filepath, ok, error, bytes_in, bytes_out, metrics = result
+                FilterTelemetry.merge(metrics)
+                report.bytes_in += bytes_in
+                report.bytes_out += bytes_out
+                if ok:
+                    report.succeeded += 1
+                else:
+                    report.failures.append((filepath, error))
+                if progress:
+                    progress(done, len(jobs), result)
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"RecipeProcessor(recipe={self.recipe!r}, workers={self.workers})"
+
+
+def main(argv=None):
+    """Command-line entry point: run a recipe over many files."""
+    parser = argparse.ArgumentParser(
+        description="Produce several named variants of each image from one JSON recipe, "
+                    "computing shared steps once.")
+    parser.add_argument('recipe', help="recipe JSON file")
+    parser.add_argument('inputs', nargs='+', help="image files or folders")
+    parser.add_argument('-o', '--output',
+                        help="output folder (one subfolder per recipe output)")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="number of worker processes (default: all cores)")
+    parser.add_argument('-r', '--recursive', action='store_true', help="search folders recursively")
+    parser.add_argument('--explain', action='store_true', help="print the execution plan and exit")
+    parser.add_argument('-q', '--quiet', action='store_true', help="only print the summary")
+    parser.add_argument('--metrics-out', default=None,
+                        help="write filter telemetry to this file (.json, otherwise Prometheus text)")
+    args = parser.parse_args(argv)
+
+    try:
+        recipe = Recipe.load(args.recipe)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        parser.error(f"invalid recipe: {e}")
+
+    if args.explain:
+        for step in recipe.order:
+            source, (operation, params) = recipe.steps[step]
+            print(f"  {step} = {operation}{params} of {source}")
+        for output, (step, fmt) in recipe.outputs.items():
+            print(f"  output {output} <- {step}" + (f" as .{fmt}" if fmt else ""))
+        return 0
+    if not args.output:
+        parser.error("the following arguments are required: -o/--output")
+
+    inputs = BatchProcessor.find_images(args.inputs, args.recursive)
+    if not inputs:
+        print("No supported images found.")
+        return 1
+
+    def show_progress(done, total, result):
+        filepath, ok, error = result[:3]
+        if not ok:
+            print(f"  FAILED {filepath}: {error}", file=sys.stderr)
+        elif not args.quiet and (done % 100 == 0 or done == total):
+            print(f"  {done}/{total} done")
+
+    try:
+        report = RecipeProcessor(recipe, args.output, args.workers).run(inputs, progress=show_progress)
+    except ValueError as e:
+        parser.error(str(e))
+    print(report)
+    if args.metrics_out:
+        FilterTelemetry.export(args.metrics_out)
+    return 0 if not report.failures else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
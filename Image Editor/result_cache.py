@@ -0,0 +1,177 @@
+# result_cache.py
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+from base_classes import CopyTracker
+
+
+class FilterResultCache:
+    """
+    Memory-capped LRU cache of filter results, shared by ImageProcessors.
+    Results are keyed by (source content key, filter name, parameters).
+    The content key of an image from outside (a load, an undo) is a hash
+    of its pixels, computed once. A cached result gets a key derived from
+    its source key and the filter that made it, so chains of filters
+    never hash pixels again. Arrays are recognised by their buffer, which
+    is safe because images are never modified in place.
+    Thread-safe, so worker threads can share one cache.
+    """
+
+    # CLASS ATTRIBUTE - prune dead entries from the array registry past this size
+    registry_prune_size = 256
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """max_bytes: memory budget for cached results."""
+        self.__max_bytes = max_bytes
+        self.__results = OrderedDict()  # (source key, name, params) -> (result, result key)
+        self.__bytes = 0
+        self.__registry = {}  # buffer identity -> (weakref to owning array, content key)
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # PROPERTY DECORATORS
+    @property
+    def max_bytes(self):
+        """PROPERTY: Memory budget for cached results."""
+        return self.__max_bytes
+
+    @property
+    def cached_bytes(self):
+        """PROPERTY: Bytes held by cached results."""
+        return self.__bytes
+
+    @property
+    def hit_rate(self):
+        """PROPERTY: Fraction of lookups served from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get_stats(self):
+        """Get cache statistics as a dict."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.__results),
+            'bytes': self.__bytes,
+            'hit_rate': self.hit_rate
+        }
+
+    # STATIC METHODS
+    @staticmethod
+    def _identity(image):
+        """Buffer identity of an array and the array that owns the memory."""
+        owner = image
+        while isinstance(owner.base, np.ndarray):
+            owner = owner.base
+        identity = (image.__array_interface__['data'][0], image.shape, image.strides, image.dtype.str)
+        return identity, owner
+
+    @staticmethod
+    def pixel_hash(image):
+        """
+        STATIC METHOD
+        Content key from the pixels, shape and dtype of an image.
+        """
+        digest = hashlib.sha1(f"{image.shape}|{image.dtype.str}".encode('ascii'))
+        digest.update(memoryview(np.ascontiguousarray(image)).cast('B'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def derived_key(source_key, name, params):
+        """
+        STATIC METHOD
+        Content key of the result of a filter: filters are deterministic,
+        so the same source and parameters always give the same pixels.
+        """
+        return hashlib.sha1(f"{source_key}|{name}|{params!r}".encode('utf-8')).hexdigest()
+
+    def _register(self, image, key):
+        """Remember the content key of an array for as long as it is alive."""
+        identity, owner = self._identity(image)
+        with self.__lock:
+            self.__registry[identity] = (weakref.ref(owner), key)
+            if len(self.__registry) > self.registry_prune_size:
+                self.__registry = {i: entry for i, entry in self.__registry.items()
+                                   if entry[0]() is not None}
+
+    def key_for(self, image):
+        """
+        Content key of an image: known arrays are looked up, others are hashed once.
+        Only immutable arrays are remembered by identity; the pixels of any
+        other array could change under the same buffer, so it is hashed every time.
+        """
+        if not CopyTracker.is_immutable(image):
+            return self.pixel_hash(image)
+        identity, owner = self._identity(image)
+        with self.__lock:
+            entry = self.__registry.get(identity)
+        if entry is not None and entry[0]() is owner:
+            return entry[1]
+        key = self.pixel_hash(image)
+        self._register(image, key)
+        return key
+
+    def get_or_apply(self, image, name, params, apply):
+        """
+        Return the cached result of filter `name` with `params` on `image`,
+        or compute it with apply(image) and cache it. Results are read-only.
+        """
+        source_key = self.key_for(image)
+        cache_key = (source_key, name, params)
+        with self.__lock:
+            cached = self.__results.get(cache_key)
+            if cached is not None:
+                self.__results.move_to_end(cache_key)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+
+        result = apply(image)
+        if result is None:
+            return None
+        result = CopyTracker.adopt(result)
+        result_key = self.derived_key(source_key, name, params)
+        self._register(result, result_key)
+        with self.__lock:
+            if cache_key not in self.__results and result.nbytes <= self.__max_bytes:
+                self.__results[cache_key] = (result, result_key)
+                self.__bytes += result.nbytes
+                self._evict()
+        return result
+
+    def _evict(self):
+        """Drop least recently used results until the cache fits its budget."""
+        while self.__bytes > self.__max_bytes and self.__results:
+            _, (result, _) = self.__results.popitem(last=False)
+            self.__bytes -= result.nbytes
+            self.evictions += 1
+
+    def clear(self):
+        """Drop every cached result and reset the statistics."""
+        with self.__lock:
+            self.__results.clear()
+            self.__registry.clear()
+            self.__bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    # MAGIC METHODS
+    def __len__(self):
+        """Return number of cached results."""
+        return len(self.__results)
+
+    def __str__(self):
+        """String representation for users."""
+        return (f"Result cache: {len(self.__results)} results "
+                f"({self.__bytes / (1024 * 1024):.1f} MB), {self.hits} hits, "
+                f"{self.misses} misses, {self.evictions} evictions")
+
+    def __repr__(self):
+        """String representation for developers."""
+        return (f"FilterResultCache(entries={len(self.__results)}, bytes={self.__bytes}, "
+                f"hits={self.hits}, misses={self.misses}, evictions={self.evictions})")
@@ -0,0 +1,335 @@
+# shared_pool.py
+import os
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from image_processor import ImageProcessor
+
+
+def run_operations(processor, image, operations):
+    """Apply (name, args) operations to an image; returns a read-only result."""
+    processor.set_current_image(image)
+    try:
+        for name, args in operations:
+            if processor.apply_operation(name, *args) is None:
+                raise ValueError(f"operation '{name}' failed")
+        return processor.current_view
+    finally:
+        processor.set_current_image(None)  # drop any view of shared memory
+
+
+# Worker-process state, created lazily
+_worker_processor = None
+
+
+def _get_processor():
+    """This worker's ImageProcessor."""
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = ImageProcessor()
+    return _worker_processor
+
+
+def _attach(name):
+    """
+    Map a segment by name for one task. The parent creates and unlinks
+    every segment, so the worker keeps it out of the resource tracker:
+    a worker registration would either be reported as a leak at exit or,
+    with the tracker shared with the parent, unregister the parent's entry.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _detach(segment):
+    """Unmap a segment attached by _attach."""
+    try:
+        segment.close()
+    except BufferError:
+        pass  # an array still views it; the mapping goes when that array does
+
+
+def _shared_task(task):
+    """
+    Worker function for SharedMemoryWorkerPool.
+    Reads the input frame from one segment and writes the result into
+    another; only names, shapes and dtypes are pickled. A result too
+    big for its segment is returned pickled instead (the pool then uses
+    bigger segments for later frames).
+    Returns (shape, dtype, pickled result or None).
+    """
+    input_name, shape, dtype, output_name, output_capacity, operations = task
+    source = _attach(input_name)
+    try:
+        # The parent leaves the input segment alone until the result is collected,
+        # so a read-only buffer lets the processor adopt the frame without a copy
+        image = np.ndarray(shape, dtype, buffer=source.buf.toreadonly())
+        result = run_operations(_get_processor(), image, operations)
+        del image
+        if result.nbytes > output_capacity:
+            # A copy, so nothing returned still views the input segment
+            return result.shape, result.dtype.str, np.array(result, order='C')
+        target = _attach(output_name)
+        try:
+            np.ndarray(result.shape, result.dtype, buffer=target.buf)[...] = result
+        finally:
+            _detach(target)
+        return result.shape, result.dtype.str, None
+    finally:
+        result = None
+        _detach(source)
+
+
+def _pickled_task(task):
+    """Worker function for PickledWorkerPool: the image travels by pickle both ways."""
+    image, operations = task
+    image.flags.writeable = False
+    return np.ascontiguousarray(run_operations(_get_processor(), image, operations))
+
+
+class SharedBufferPool:
+    """
+    Reusable multiprocessing.shared_memory segments.
+    acquire() hands out a free segment big enough for a request,
+    creating one while under max_segments; past that it replaces a
+    free segment that is too small, or waits for one to be released.
+    Reusing segments avoids creating and mapping new memory per frame.
+    """
+
+    def __init__(self, max_segments=16, min_segment_bytes=1024 * 1024):
+        """
+        max_segments: most segments alive at once (bounds shared memory)
+        min_segment_bytes: smallest segment created, so small frames share sizes
+        """
+        self.max_segments = max_segments
+        self.min_segment_bytes = min_segment_bytes
+        self.__segments = {}  # name -> SharedMemory
+        self.__free = []  # free SharedMemory segments
+        self.__available = threading.Condition()
+        self.created = 0
+        self.reused = 0
+
+    # PROPERTY DECORATORS
+    @property
+    def total_bytes(self):
+        """PROPERTY: Shared memory held by the pool."""
+        return sum(segment.size for segment in self.__segments.values())
+
+    def acquire(self, nbytes):
+        """Return a free segment of at least nbytes, blocking if the pool is exhausted."""
+        with self.__available:
+            while True:
+                fitting = [segment for segment in self.__free if segment.size >= nbytes]
+                if fitting:
+                    segment = min(fitting, key=lambda s: s.size)
+                    self.__free.remove(segment)
+                    self.reused += 1
+                    return segment
+                if len(self.__segments) >= self.max_segments and self.__free:
+                    self._destroy(self.__free.pop(0))  # too small for today's frames
+                if len(self.__segments) < self.max_segments:
+                    segment = shared_memory.SharedMemory(create=True,
+                                                         size=max(nbytes, self.min_segment_bytes))
+                    self.__segments[segment.name] = segment
+                    self.created += 1
+                    return segment
+                self.__available.wait()
+
+    def release(self, segment):
+        """Give a segment back to the pool."""
+        with self.__available:
+            if segment.name in self.__segments:
+                self.__free.append(segment)
+                self.__available.notify()
+
+    def _destroy(self, segment):
+        """Unmap and delete one segment."""
+        del self.__segments[segment.name]
+        try:
+            segment.close()
+        except BufferError:
+            pass  # an array still views it; the mapping goes when that array does
+        segment.unlink()
+
+    def close(self):
+        """Delete every segment. Arrays viewing them must not be used afterwards."""
+        with self.__available:
+            for segment in list(self.__segments.values()):
+                self._destroy(segment)
+            self.__free = []
+
+    # MAGIC METHODS
+    def __len__(self):
+        """Return number of segments alive."""
+        return len(self.__segments)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        """String representation for developers."""
+        return (f"SharedBufferPool(segments={len(self.__segments)}, free={len(self.__free)}, "
+                f"bytes={self.total_bytes})")
+
+
+class SharedMemoryWorkerPool:
+    """
+    Process pool that runs ImageProcessor operations on frames passed
+    through shared memory. The parent copies each frame into a pooled
+    segment once; workers read it and write the result into a second
+    segment, so only segment names, shapes and dtypes are pickled.
+    At most max_in_flight frames are in the pipeline at once, which
+    also bounds the shared memory used.
+    """
+
+    def __init__(self, workers=None, max_in_flight=None):
+        """
+        workers: worker processes (default: all cores)
+        max_in_flight: frames submitted but not yet collected (default: 2 per worker)
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        # An input and an output per frame in flight, plus the output held by map(copy=False)
+        self.buffers = SharedBufferPool(max_segments=2 * self.max_in_flight + 1)
+        self.__executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.__result_bytes = 0  # size of the latest result, used to size output segments
+
+    def _submit(self, image, operations):
+        """Copy a frame into shared memory and start it on a worker."""
+        image = np.ascontiguousarray(image)
+        source = self.buffers.acquire(image.nbytes)
+        np.ndarray(image.shape, image.dtype, buffer=source.buf)[...] = image
+        target = self.buffers.acquire(max(image.nbytes, self.__result_bytes))
+        task = (source.name, image.shape, image.dtype.str, target.name, target.size, operations)
+        return self.__executor.submit(_shared_task, task), source, target
+
+    def _collect(self, future, source, target, copy):
+        """Wait for a frame; returns the result (a view of the segment when copy is False)."""
+        try:
+            shape, dtype, pickled = future.result()
+        except BaseException:
+            self.buffers.release(target)
+            raise
+        finally:
+            self.buffers.release(source)
+        self.__result_bytes = max(self.__result_bytes, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        if pickled is not None:
+            self.buffers.release(target)
+            return pickled, None
+        result = np.ndarray(shape, dtype, buffer=target.buf)
+        if copy:
+            result = result.copy()
+            self.buffers.release(target)
+            return result, None
+        result.flags.writeable = False
+        return result, target
+
+    def map(self, images, operations, copy=True):
+        """
+        Apply the same operations to every image, yielding results in order.
+        operations: list of (name, args) tuples
+        copy: False yields read-only views of shared memory with no copy;
+              each is only valid until the next result is requested
+        """
+        operations = [(name, tuple(args)) for name, args in operations]
+        pending = deque()
+        held = None
+        images = iter(images)
+        try:
+            for image in images:
+                pending.append(self._submit(image, operations))
+                if len(pending) >= self.max_in_flight:
+                    if held is not None:
+                        self.buffers.release(held)
+                    result, held = self._collect(*pending.popleft(), copy)
+                    yield result
+            while pending:
+                if held is not None:
+                    self.buffers.release(held)
+                result, held = self._collect(*pending.popleft(), copy)
+                yield result
+        finally:
+            if held is not None:
+                self.buffers.release(held)
+            for future, source, target in pending:
+                future.cancel()
+                try:
+                    future.result()
+                except BaseException:
+                    pass
+                self.buffers.release(source)
+                self.buffers.release(target)
+
+    def apply(self, image, operations):
+        """Apply operations to one image in a worker; returns a copy of the result."""
+        return next(self.map([image], operations))
+
+    def close(self):
+        """Stop the workers and delete the shared memory."""
+        self.__executor.shutdown(wait=True)
+        self.buffers.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"SharedMemoryWorkerPool(workers={self.workers}, max_in_flight={self.max_in_flight})"
+
+
+class PickledWorkerPool:
+    """
+    The same interface as SharedMemoryWorkerPool, with frames pickled
+    through the executor's pipes. Kept as the baseline to measure the
+    shared-memory transport against.
+    """
+
+    def __init__(self, workers=None, max_in_flight=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        self.__executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def map(self, images, operations, copy=True):
+        """Apply the same operations to every image, yielding results in order."""
+        operations = [(name, tuple(args)) for name, args in operations]
+        pending = deque()
+        for image in images:
+            pending.append(self.__executor.submit(_pickled_task, (image, operations)))
+            if len(pending) >= self.max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def apply(self, image, operations):
+        """Apply operations to one image in a worker."""
+        return next(self.map([image], operations))
+
+    def close(self):
+        """Stop the workers."""
+        self.__executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"PickledWorkerPool(workers={self.workers}, max_in_flight={self.max_in_flight})"
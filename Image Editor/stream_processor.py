@@ -0,0 +1,386 @@
+# stream_processor.py
+import argparse
+import os
+import struct
+import sys
+import time
+import zlib
+
+import cv2
+import numpy as np
+from base_classes import FileHandler, FilterTelemetry
+from batch_processor import BatchProcessor
+from filters import (GrayscaleFilter, BlurFilter, EdgeDetectionFilter,
+                     BrightnessFilter, ContrastFilter, FlipFilter)
+
+
+class BmpStripReader:
+    """
+    Reads an uncompressed BMP a few rows at a time.
+    Rows are read with plain file reads into a small buffer, so memory use
+    depends on the strip size, not on the image size.
+    """
+
+    def __init__(self, filepath):
+        """Parse the BMP header. Raises ValueError for unsupported files."""
+        self.__file = open(filepath, 'rb')
+        header = self.__file.read(54)
+        if len(header) < 54 or header[:2] != b'BM':
+            self.close()
+            raise ValueError(f"Not a BMP file: {filepath}")
+
+        offset, = struct.unpack_from('<I', header, 10)
+        dib_size, width, height = struct.unpack_from('<Iii', header, 14)
+        bits, compression = struct.unpack_from('<HI', header, 28)
+        if compression != 0 or bits not in (8, 24, 32):
+            self.close()
+            raise ValueError("Only uncompressed 8, 24 and 32-bit BMP files can be streamed")
+
+        self.width = width
+        self.height = abs(height)
+        self.channels = 3
+        self.__offset = offset
+        self.__top_down = height < 0
+        self.__bytes_per_pixel = bits // 8
+        self.__stride = (bits * width + 31) // 32 * 4
+        self.__palette = None
+        if bits == 8:
+            colors, = struct.unpack_from('<I', header, 46)
+            self.__file.seek(14 + dib_size)
+            palette = np.frombuffer(self.__file.read(4 * (colors or 256)), np.uint8)
+            self.__palette = palette.reshape(-1, 4)[:, :3].copy()
+
+    def read_rows(self, start, stop):
+        """Return rows [start, stop) as a BGR array. Raises ValueError if the file ends early."""
+        count = stop - start
+        first = start if self.__top_down else self.height - stop
+        buffer = np.empty((count, self.__stride), np.uint8)
+        self.__file.seek(self.__offset + first * self.__stride)
+        if self.__file.readinto(memoryview(buffer).cast('B')) < buffer.nbytes:
+            raise ValueError(f"BMP file is truncated: rows {start}-{stop} are missing")
+        if not self.__top_down:
+            buffer = buffer[::-1]
+
+        pixels = buffer[:, :self.width * self.__bytes_per_pixel]
+        if self.__palette is not None:
+            return self.__palette[pixels]
+        pixels = pixels.reshape(count, self.width, self.__bytes_per_pixel)
+        return np.ascontiguousarray(pixels[:, :, :3])
+
+    def close(self):
+        """Close the underlying file."""
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DecodedStripReader:
+    """
+    Fallback reader for compressed formats (JPEG, PNG).
+    OpenCV cannot decode these partially, so the image is decoded once and
+    served in strips; memory is bounded only for BMP input. (PNG rows
+    could be inflated incrementally, but undoing the Paeth and Average
+    row filters needs a per-pixel loop that is far too slow in Python.)
+    """
+
+    def __init__(self, filepath):
+        """Decode the whole image."""
+        self.__image = cv2.imread(filepath)
+        if self.__image is None:
+            raise ValueError(f"Could not decode image: {filepath}")
+        self.height, self.width = self.__image.shape[:2]
+        self.channels = 3
+
+    def read_rows(self, start, stop):
+        """Return rows [start, stop)."""
+        return self.__image[start:stop]
+
+    def close(self):
+        """Release the decoded image."""
+        self.__image = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BmpStripWriter:
+    """Writes a top-down BMP sequentially, one strip at a time."""
+
+    def __init__(self, filepath, width, height, channels):
+        """Write the header; rows follow with write_rows()."""
+        self.width = width
+        self.channels = channels
+        self.__stride = (8 * channels * width + 31) // 32 * 4
+        palette = b''
+        if channels == 1:
+            palette = bytes(np.repeat(np.arange(256, dtype=np.uint8), 4))
+        offset = 54 + len(palette)
+
+        self.__file = open(filepath, 'wb')
+        self.__file.write(struct.pack('<2sIHHI', b'BM', offset + self.__stride * height, 0, 0, offset))
+        self.__file.write(struct.pack('<IiiHHIIiiII', 40, width, -height, 1, 8 * channels,
+                                      0, self.__stride * height, 2835, 2835,
+                                      256 if channels == 1 else 0, 0))
+        self.__file.write(palette)
+
+    def write_rows(self, rows):
+        """Append rows (BGR or single-channel)."""
+        rows = rows.reshape(rows.shape[0], -1)
+        padding = self.__stride - rows.shape[1]
+        if padding:
+            rows = np.pad(rows, ((0, 0), (0, padding)))
+        self.__file.write(np.ascontiguousarray(rows).tobytes())
+
+    def close(self):
+        """Close the file."""
+        self.__file.close()
+
+    def abort(self):
+        """Close and delete the unfinished file."""
+        self.__file.close()
+        os.remove(self.__file.name)
+
+
+class PngStripWriter:
+    """
+    Writes a PNG sequentially: each strip is compressed with a running
+    zlib stream and flushed as IDAT chunks.
+    """
+
+    # CLASS ATTRIBUTE - flush compressed data once this much is buffered
+    chunk_size = 1 << 20
+
+    def __init__(self, filepath, width, height, channels, compression=6):
+        """Write the signature and header chunk."""
+        self.width = width
+        self.channels = channels
+        self.__compressor = zlib.compressobj(compression)
+        self.__pending = []
+        self.__pending_size = 0
+
+        self.__file = open(filepath, 'wb')
+        self.__file.write(b'\x89PNG\r\n\x1a\n')
+        color_type = 0 if channels == 1 else 2
+        self._write_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0))
+
+    def _write_chunk(self, kind, data):
+        """Write one length-prefixed, CRC-terminated chunk."""
+        self.__file.write(struct.pack('>I', len(data)))
+        self.__file.write(kind)
+        self.__file.write(data)
+        self.__file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+
+    def _buffer(self, data):
+        """Collect compressed bytes and flush full IDAT chunks."""
+        if data:
+            self.__pending.append(data)
+            self.__pending_size += len(data)
+        if self.__pending_size >= self.chunk_size:
+            self._write_chunk(b'IDAT', b''.join(self.__pending))
+            self.__pending = []
+            self.__pending_size = 0
+
+    def write_rows(self, rows):
+        """Append rows (BGR or single-channel)."""
+        if self.channels == 3:
+            rows = rows[:, :, ::-1]
+        rows = rows.reshape(rows.shape[0], -1)
+        # Each row starts with filter type 0 (None)
+        filtered = np.zeros((rows.shape[0], rows.shape[1] + 1), np.uint8)
+        filtered[:, 1:] = rows
+        self._buffer(self.__compressor.compress(filtered.tobytes()))
+
+    def close(self):
+        """Finish the zlib stream and write the trailer."""
+        self.__pending.append(self.__compressor.flush())
+        self._write_chunk(b'IDAT', b''.join(self.__pending))
+        self._write_chunk(b'IEND', b'')
+        self.__file.close()
+
+    def abort(self):
+        """
+        Close and delete the unfinished file, without the trailer, so a
+        failed run never leaves a truncated image that looks complete.
+        """
+        self.__file.close()
+        os.remove(self.__file.name)
+
+
+class StreamingProcessor:
+    """
+    Out-of-core filtering for images larger than RAM.
+    Reads, filters and writes the image in horizontal strips. Neighbourhood
+    filters get overlap (halo) rows above and below each strip. For blur
+    and the pointwise filters that makes the seams identical to processing
+    the whole image at once; for edge detection they are approximate, as
+    hysteresis can follow weak edges further than the halo (see
+    EdgeDetectionFilter.halo).
+    """
+
+    # CLASS ATTRIBUTE - filters that work row-locally on strips
+    STREAMABLE_FILTERS = (GrayscaleFilter, BlurFilter, EdgeDetectionFilter,
+                          BrightnessFilter, ContrastFilter)
+
+    # CLASS ATTRIBUTE - working buffers per strip pixel (input, filter temporaries, output)
+    buffers_per_pixel = 4
+
+    def __init__(self, filters, memory_limit=64 * 1024 * 1024):
+        """
+        filters: list of ImageFilter objects applied in order
+        memory_limit: target peak bytes for strip buffers
+        """
+        for filter_obj in filters:
+            if not self.is_streamable(filter_obj):
+                raise ValueError(f"{filter_obj.name} cannot be applied in strips")
+        self.filters = list(filters)
+        self.memory_limit = memory_limit
+
+    @staticmethod
+    def is_streamable(filter_obj):
+        """STATIC METHOD: True if the filter only needs nearby rows."""
+        if isinstance(filter_obj, FlipFilter):
+            return filter_obj.direction == 'horizontal'
+        return isinstance(filter_obj, StreamingProcessor.STREAMABLE_FILTERS)
+
+    @staticmethod
+    def filter_from_operation(name, args):
+        """STATIC METHOD: Build a filter from a (name, args) operation."""
+        factories = {
+            'grayscale': GrayscaleFilter,
+            'blur': BlurFilter,
+            'edge': EdgeDetectionFilter,
+            'brightness': BrightnessFilter,
+            'contrast': ContrastFilter,
+            'flip': FlipFilter
+        }
+        if name not in factories:
+            raise ValueError(f"{name} cannot be applied in strips")
+        return factories[name](*args)
+
+    @staticmethod
+    def open_reader(filepath):
+        """STATIC METHOD: Streaming reader for BMP, decoding reader otherwise."""
+        if FileHandler.get_file_extension(filepath) == 'bmp':
+            return BmpStripReader(filepath)
+        return DecodedStripReader(filepath)
+
+    @staticmethod
+    def open_writer(filepath, width, height, channels):
+        """STATIC METHOD: Sequential writer chosen by extension (BMP or PNG)."""
+        ext = FileHandler.get_file_extension(filepath)
+        if ext == 'bmp':
+            return BmpStripWriter(filepath, width, height, channels)
+        if ext == 'png':
+            return PngStripWriter(filepath, width, height, channels)
+        raise ValueError("Streaming output must be .png or .bmp")
+
+    @property
+    def halo(self):
+        """PROPERTY: Overlap rows needed on each side of a strip."""
+        return sum(filter_obj.halo for filter_obj in self.filters)
+
+    def strip_height(self, width, channels=3):
+        """Rows per strip that keep the working buffers within memory_limit."""
+        row_bytes = width * channels * self.buffers_per_pixel
+        rows = self.memory_limit // row_bytes - 2 * self.halo
+        if rows < 1:
+            raise ValueError("memory_limit is too small for this image width and filter halo")
+        return rows
+
+    def process(self, input_path, output_path, progress=None):
+        """
+        Filter input_path into output_path strip by strip.
+        progress: optional callback(rows_done, total_rows).
+        If any strip fails, the partly written output is deleted.
+        Returns a dict with the image size, strip height and elapsed time.
+        """
+        start_time = time.perf_counter()
+        halo = self.halo
+        writer = None
+
+        with self.open_reader(input_path) as reader:
+            rows_per_strip = self.strip_height(reader.width, reader.channels)
+            try:
+                for top in range(0, reader.height, rows_per_strip):
+                    bottom = min(top + rows_per_strip, reader.height)
+                    read_top = max(0, top - halo)
+                    read_bottom = min(reader.height, bottom + halo)
+
+                    strip = reader.read_rows(read_top, read_bottom)
+                    for filter_obj in self.filters:
+                        strip = filter_obj.apply(strip)
+                    strip = strip[top - read_top:bottom - read_top]
+
+                    if writer is None:
+                        channels = strip.shape[2] if strip.ndim == 3 else 1
+                        writer = self.open_writer(output_path, reader.width, reader.height, channels)
+                    writer.write_rows(strip)
+                    if progress:
+                        progress(bottom, reader.height)
+                if writer is not None:
+                    writer.close()
+            except BaseException:
+                if writer is not None:
+                    writer.abort()
+                raise
+
+        return {
+            'width': reader.width,
+            'height': reader.height,
+            'strip_height': rows_per_strip,
+            'halo': halo,
+            'elapsed': time.perf_counter() - start_time
+        }
+
+    def __len__(self):
+        """Return number of filters applied to each strip."""
+        return len(self.filters)
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"StreamingProcessor(filters={len(self.filters)}, memory_limit={self.memory_limit})"
+
+
+def main(argv=None):
+    """Command-line entry point for out-of-core filtering."""
+    parser = argparse.ArgumentParser(
+        description="Filter images larger than RAM in horizontal strips. "
+                    "Only uncompressed BMP input is read strip by strip; JPEG and PNG "
+                    "input is decoded whole first, so large inputs must be BMP.")
+    parser.add_argument('input', help="input image; must be an uncompressed BMP to stream with "
+                                      "bounded memory (JPEG/PNG are decoded whole)")
+    parser.add_argument('output', help="output image (.png or .bmp)")
+    parser.add_argument('--op', action='append', default=[], dest='operations',
+                        help="operation to apply, repeatable (grayscale, edge, blur=N[:fast], "
+                             "brightness=N, contrast=F, flip=horizontal)")
+    parser.add_argument('--memory-mb', type=int, default=64,
+                        help="target peak memory for strip buffers in MB (default: 64)")
+    parser.add_argument('--metrics-out', default=None,
+                        help="write filter telemetry to this file (.json, otherwise Prometheus text)")
+    args = parser.parse_args(argv)
+
+    try:
+        filters = [StreamingProcessor.filter_from_operation(*BatchProcessor.parse_operation(op))
+                   for op in args.operations]
+        processor = StreamingProcessor(filters, args.memory_mb * 1024 * 1024)
+        stats = processor.process(args.input, args.output)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    print(f"Processed {stats['width']}x{stats['height']} in {stats['elapsed']:.2f}s "
+          f"({stats['strip_height']} rows per strip, halo {stats['halo']})")
+    if args.metrics_out:
+        FilterTelemetry.export(args.metrics_out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# task_runner.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BackgroundTaskRunner:
+    """
+    Runs work on worker threads and delivers results on the Tk main loop.
+    OpenCV releases the GIL while it works, so the UI keeps redrawing.
+    Only the newest task counts: submitting again (or calling cancel())
+    supersedes the task in flight and its result is thrown away.
+    """
+
+    # CLASS ATTRIBUTE - how often the main loop checks for results (~60fps)
+    poll_interval_ms = 16
+
+    def __init__(self, widget, max_workers=2):
+        """
+        widget: any Tk widget, used to schedule callbacks with after()
+        max_workers: 2 lets a new task start while a superseded one finishes
+        """
+        self.__widget = widget
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.__generation = 0
+        self.__future = None
+        self.__label = None
+
+    @property
+    def busy(self):
+        """PROPERTY: True while the newest task has not been delivered."""
+        return self.__future is not None
+
+    @property
+    def label(self):
+        """PROPERTY: Label of the task in flight, or None."""
+        return self.__label
+
+    def submit(self, func, on_done, on_error=None, on_tick=None, label=None):
+        """
+        Run func() on a worker thread.
+        on_done(result) / on_error(exception) run on the main thread.
+        on_tick(elapsed_seconds) runs on the main thread while waiting.
+        """
+        self.cancel()
+        generation = self.__generation
+        self.__future = self.__executor.submit(func)
+        self.__label = label
+        self._poll(self.__future, generation, time.perf_counter(), on_done, on_error, on_tick)
+
+    def cancel(self):
+        """Supersede the task in flight; its result will be ignored."""
+        self.__generation += 1
+        if self.__future is not None:
+            self.__future.cancel()  # only stops tasks that have not started yet
+        self.__future = None
+        self.__label = None
+
+    def _poll(self, future, generation, started, on_done, on_error, on_tick):
+        """Check the future from the main loop until it finishes."""
+        if generation != self.__generation:
+            return
+        if not future.done():
+            if on_tick:
+                on_tick(time.perf_counter() - started)
+            self.__widget.after(self.poll_interval_ms, self._poll, future, generation,
+                                started, on_done, on_error, on_tick)
+            return
+
+        self.__future = None
+        self.__label = None
+        error = future.exception()
+        if error is not None:
+            if on_error:
+                on_error(error)
+            return
+        on_done(future.result())
+
+    def shutdown(self):
+        """Stop accepting work; running tasks finish in the background."""
+        self.cancel()
+        self.__executor.shutdown(wait=False, cancel_futures=True)
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"BackgroundTaskRunner(busy={self.busy}, label={self.__label!r})"
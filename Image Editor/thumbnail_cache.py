@@ -0,0 +1,201 @@
+# thumbnail_cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+
+import cv2
+
+
+class ThumbnailCache:
+    """
+    Persistent on-disk cache of display-size thumbnails and image info.
+    Entries are keyed by file path, modification time and size, so an
+    edited file never matches its old entry. The least recently used
+    entries are evicted once the cache grows past max_bytes.
+    Cache hits only update recency in memory; the index is written on
+    put, eviction, clear and close().
+    Safe to use from worker threads.
+    """
+
+    # CLASS ATTRIBUTES
+    max_thumbnail_size = 1024  # longest side of a stored thumbnail
+    jpeg_quality = 90
+    index_name = 'index.json'
+
+    def __init__(self, directory=None, max_bytes=256 * 1024 * 1024):
+        """
+        directory: cache folder (default: ~/.cache/image_editor/thumbnails)
+        max_bytes: total size of stored thumbnails before LRU eviction
+        """
+        if directory is None:
+            directory = os.path.join(os.path.expanduser('~'), '.cache', 'image_editor', 'thumbnails')
+        os.makedirs(directory, exist_ok=True)
+        self.__directory = directory
+        self.__max_bytes = max_bytes
+        self.__lock = threading.Lock()
+        self.__entries = self._read_index()  # key -> info dict with 'bytes' and 'last_used'
+        self.__dirty = False  # recency changed since the index was written
+        self.hits = 0
+        self.misses = 0
+
+    # PROPERTY DECORATORS
+    @property
+    def directory(self):
+        """PROPERTY: Folder holding the thumbnails and index."""
+        return self.__directory
+
+    @property
+    def total_bytes(self):
+        """PROPERTY: Bytes used by stored thumbnails."""
+        return sum(entry['bytes'] for entry in self.__entries.values())
+
+    # STATIC METHOD
+    @staticmethod
+    def key_for(filepath):
+        """
+        STATIC METHOD
+        Cache key for a file: hash of its absolute path, mtime and size.
+        Returns None if the file cannot be read.
+        """
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return None
+        identity = f"{os.path.abspath(filepath)}|{stat.st_mtime_ns}|{stat.st_size}"
+        return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+    def _thumbnail_path(self, key):
+        """Path of the thumbnail file for a key."""
+        return os.path.join(self.__directory, key + '.jpg')
+
+    def _read_index(self):
+        """Load the index, starting empty if it is missing or damaged."""
+        try:
+            with open(os.path.join(self.__directory, self.index_name), 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Drop entries whose thumbnail file has gone
+        return {key: entry for key, entry in entries.items()
+                if os.path.exists(self._thumbnail_path(key))}
+
+    def _write_index(self):
+        """Write the index atomically (temp file + rename)."""
+        path = os.path.join(self.__directory, self.index_name)
+        temp_path = path + '.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.__entries, f)
+            os.replace(temp_path, path)
+        except OSError:
+            pass  # the cache is an optimisation; never fail the caller
+        self.__dirty = False
+
+    def _touch(self, key):
+        """Mark an entry as used now."""
+        self.__entries[key]['last_used'] = time.time()
+
+    def info(self, filepath):
+        """Cached image info (width, height, channels) without any decoding, or None."""
+        key = self.key_for(filepath)
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return None
+            return {name: entry[name] for name in ('width', 'height', 'channels')}
+
+    def get(self, filepath):
+        """Return (thumbnail, info) for a file, or None on a cache miss."""
+        key = self.key_for(filepath)
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            thumbnail = cv2.imread(self._thumbnail_path(key))
+            if thumbnail is None:
+                del self.__entries[key]
+                self.__dirty = True
+                self.misses += 1
+                return None
+            self._touch(key)
+            self.__dirty = True
+            self.hits += 1
+            return thumbnail, {name: entry[name] for name in ('width', 'height', 'channels')}
+
+    def put(self, filepath, image):
+        """Store a thumbnail and the info of a decoded image, evicting old entries."""
+        key = self.key_for(filepath)
+        if key is None or image is None:
+            return
+        height, width = image.shape[:2]
+        scale = min(1.0, self.max_thumbnail_size / max(width, height))
+        thumbnail = image
+        if scale < 1.0:
+            size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            thumbnail = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode('.jpg', thumbnail, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return
+
+        with self.__lock:
+            try:
+                with open(self._thumbnail_path(key), 'wb') as f:
+                    f.write(encoded.tobytes())
+            except OSError:
+                return
+            self.__entries[key] = {
+                'width': width,
+                'height': height,
+                'channels': image.shape[2] if image.ndim > 2 else 1,
+                'bytes': len(encoded),
+                'last_used': time.time()
+            }
+            self._evict()
+            self._write_index()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits max_bytes."""
+        by_age = sorted(self.__entries, key=lambda k: self.__entries[k]['last_used'])
+        total = self.total_bytes
+        for key in by_age[:-1]:  # always keep the newest entry
+            if total <= self.__max_bytes:
+                break
+            total -= self.__entries.pop(key)['bytes']
+            try:
+                os.remove(self._thumbnail_path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        """Remove every cached thumbnail."""
+        with self.__lock:
+            for key in list(self.__entries):
+                try:
+                    os.remove(self._thumbnail_path(key))
+                except OSError:
+                    pass
+            self.__entries = {}
+            self._write_index()
+
+    def close(self):
+        """Write the index if cache hits changed it since the last write."""
+        with self.__lock:
+            if self.__dirty:
+                self._write_index()
+
+    # MAGIC METHODS
+    def __len__(self):
+        """Return number of cached files."""
+        return len(self.__entries)
+
+    def __contains__(self, filepath):
+        """Check if a file (at its current mtime and size) is cached."""
+        return self.key_for(filepath) in self.__entries
+
+    def __repr__(self):
+        """String representation for developers."""
+        return (f"ThumbnailCache(entries={len(self.__entries)}, bytes={self.total_bytes}, "
+                f"hits={self.hits}, misses={self.misses})")
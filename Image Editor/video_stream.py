@@ -0,0 +1,442 @@
+# video_stream.py
+import argparse
+import glob
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+from base_classes import FilterTelemetry
+from batch_processor import BatchProcessor
+from filters import (GrayscaleFilter, BlurFilter, EdgeDetectionFilter,
+                     BrightnessFilter, ContrastFilter, RotateFilter, FlipFilter,
+                     ResizeFilter, AdvancedImageProcessor)
+from pipeline_optimizer import PipelineOptimizer
+
+
+class VideoSource:
+    """Frames of a video file, decoded one at a time with cv2.VideoCapture."""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.__capture = cv2.VideoCapture(filepath)
+        if not self.__capture.isOpened():
+            raise ValueError(f"Cannot open video: {filepath}")
+        self.fps = self.__capture.get(cv2.CAP_PROP_FPS) or 25.0
+        self.frame_count = int(self.__capture.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+
+    def __iter__(self):
+        """Generator of BGR frames."""
+        try:
+            while True:
+                ok, frame = self.__capture.read()
+                if not ok:
+                    return
+                yield frame
+        finally:
+            self.__capture.release()
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"VideoSource({self.filepath!r}, fps={self.fps}, frames={self.frame_count})"
+
+
+class FrameSequenceSource:
+    """
+    Numbered still images read in order. The pattern is either printf
+    style ('frames/img%04d.png', counting up from `start` until a number
+    is missing) or a glob ('frames/*.png', sorted by the numbers in the
+    names so img10 comes after img9).
+    """
+
+    def __init__(self, pattern, start=0, fps=25.0):
+        self.pattern = pattern
+        self.fps = fps
+        if '%' in pattern:
+            self.__paths = None
+            self.__start = start
+            self.frame_count = None
+        else:
+            self.__paths = sorted(glob.glob(pattern), key=self.natural_key)
+            if not self.__paths:
+                raise ValueError(f"No frames match: {pattern}")
+            self.frame_count = len(self.__paths)
+
+    @staticmethod
+    def natural_key(path):
+        """STATIC METHOD: Sort key that orders embedded numbers by value."""
+        return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', path)]
+
+    def _paths(self):
+        """Generator of frame paths."""
+        if self.__paths is not None:
+            yield from self.__paths
+            return
+        index = self.__start
+        while os.path.exists(self.pattern % index):
+            yield self.pattern % index
+            index += 1
+
+    def __iter__(self):
+        """Generator of frames; a file that cannot be decoded is an error."""
+        for path in self._paths():
+            frame = cv2.imread(path)
+            if frame is None:
+                raise ValueError(f"Cannot decode frame: {path}")
+            yield frame
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"FrameSequenceSource({self.pattern!r}, frames={self.frame_count})"
+
+
+class VideoSink:
+    """Writes frames to a video file; opened on the first frame so its size is known."""
+
+    # CLASS ATTRIBUTE - codec by container extension
+    FOURCC = {'mp4': 'mp4v', 'avi': 'MJPG', 'mkv': 'XVID', 'mov': 'mp4v'}
+
+    def __init__(self, filepath, fps):
+        self.filepath = filepath
+        self.fps = fps
+        self.__writer = None
+
+    def write(self, frame):
+        """Append one frame (BGR or single-channel)."""
+        if self.__writer is None:
+            ext = os.path.splitext(self.filepath)[1].lower().lstrip('.')
+            fourcc = cv2.VideoWriter_fourcc(*self.FOURCC.get(ext, 'mp4v'))
+            height, width = frame.shape[:2]
+            self.__writer = cv2.VideoWriter(self.filepath, fourcc, self.fps, (width, height),
+                                            isColor=frame.ndim == 3)
+            if not self.__writer.isOpened():
+                raise ValueError(f"Cannot write video: {self.filepath}")
+        self.__writer.write(frame)
+
+    def close(self):
+        """Finish the file."""
+        if self.__writer is not None:
+            self.__writer.release()
+
+
+class FrameSequenceSink:
+    """Writes frames as numbered images, e.g. 'out/frame%05d.png'."""
+
+    def __init__(self, pattern, start=0):
+        if '%' not in pattern:
+            raise ValueError("A frame sequence output needs a number field, e.g. out/frame%05d.png")
+        self.pattern = pattern
+        self.__index = start
+
+    def write(self, frame):
+        """Write the next frame."""
+        path = self.pattern % self.__index
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if not cv2.imwrite(path, frame):
+            raise ValueError(f"Cannot write frame: {path}")
+        self.__index += 1
+
+    def close(self):
+        """Nothing to finish for separate files."""
+
+
+class StreamStats:
+    """
+    Frame counts and timing of a VideoPipeline run: sustained fps over
+    the whole run, recent fps over the last `window` seconds, and the
+    time each stage spent working (the busiest stage is the bottleneck).
+    """
+
+    # CLASS ATTRIBUTE - seconds covered by the recent fps
+    window = 2.0
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.frames = 0
+        self.busy = {'decode': 0.0, 'filter': 0.0, 'encode': 0.0}  # seconds of work per stage
+        self.max_queue_depth = {'decoded': 0, 'filtered': 0}
+        self.__recent = deque()  # finish times within the window
+        self.__lock = threading.Lock()
+
+    def add_busy(self, stage, seconds):
+        """Add working time to a stage (called from several threads)."""
+        with self.__lock:
+            self.busy[stage] += seconds
+
+    def frame_done(self):
+        """Record one frame written."""
+        now = time.perf_counter()
+        self.frames += 1
+        self.__recent.append(now)
+        while self.__recent and now - self.__recent[0] > self.window:
+            self.__recent.popleft()
+
+    @property
+    def elapsed(self):
+        """PROPERTY: Seconds since the run started."""
+        return time.perf_counter() - self.started
+
+    @property
+    def fps(self):
+        """PROPERTY: Sustained frames per second over the whole run."""
+        return self.frames / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def recent_fps(self):
+        """PROPERTY: Frames per second over the last few seconds."""
+        if len(self.__recent) < 2:
+            return self.fps
+        return (len(self.__recent) - 1) / max(self.__recent[-1] - self.__recent[0], 1e-9)
+
+    @property
+    def bottleneck(self):
+        """PROPERTY: Stage that spent the most time working."""
+        return max(self.busy, key=self.busy.get)
+
+    def __str__(self):
+        """String representation for users."""
+        busy = ", ".join(f"{stage} {seconds / max(self.frames, 1) * 1000:.1f} ms/frame"
+                         for stage, seconds in self.busy.items())
+        return (f"{self.frames} frames in {self.elapsed:.2f}s | {self.fps:.1f} fps sustained | "
+                f"{busy} | bottleneck: {self.bottleneck}")
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"StreamStats(frames={self.frames}, fps={self.fps:.1f})"
+
+
+class VideoPipeline:
+    """
+    Streams frames through decode -> filter chain -> encode.
+    Decoding runs on its own thread, filtering on a thread pool (OpenCV
+    releases the GIL) and encoding on the calling thread. Stages are
+    joined by bounded queues, so they overlap while at most about
+    3 x prefetch frames are alive: memory stays the same for a clip of
+    any length.
+    """
+
+    # CLASS ATTRIBUTE - how often a blocked stage checks for shutdown
+    poll_seconds = 0.1
+
+    def __init__(self, filters, prefetch=8, workers=None, optimizer=None):
+        """
+        filters: list of ImageFilter objects applied to every frame
+        prefetch: frames each queue may hold
+        workers: filter threads (default: all cores)
+        optimizer: PipelineOptimizer for the chain (default: a standard one)
+        """
+        self.chain = AdvancedImageProcessor("Video chain", optimizer or PipelineOptimizer())
+        for filter_obj in filters:
+            self.chain.add_filter(filter_obj)
+        self.prefetch = prefetch
+        self.workers = workers or os.cpu_count() or 1
+
+    @staticmethod
+    def filter_from_operation(name, args):
+        """STATIC METHOD: Build a filter from a (name, args) operation."""
+        factories = {
+            'grayscale': GrayscaleFilter,
+            'blur': BlurFilter,
+            'edge': EdgeDetectionFilter,
+            'brightness': BrightnessFilter,
+            'contrast': ContrastFilter,
+            'rotate': RotateFilter,
+            'flip': FlipFilter,
+            'resize': ResizeFilter
+        }
+        return factories[name](*args)
+
+    @staticmethod
+    def open_source(path, fps=25.0):
+        """STATIC METHOD: Frame sequence for '%' or glob patterns, video file otherwise."""
+        if '%' in path or any(c in path for c in '*?['):
+            return FrameSequenceSource(path, fps=fps)
+        return VideoSource(path)
+
+    @staticmethod
+    def open_sink(path, fps):
+        """STATIC METHOD: Frame sequence for '%' patterns, video file otherwise."""
+        if '%' in path:
+            return FrameSequenceSink(path)
+        return VideoSink(path, fps)
+
+    def _put(self, target, item, stop):
+        """Blocking put that gives up when the pipeline is stopping."""
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=self.poll_seconds)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source, stop):
+        """Blocking get that gives up (returns None) when the pipeline is stopping."""
+        while not stop.is_set():
+            try:
+                return source.get(timeout=self.poll_seconds)
+            except queue.Empty:
+                continue
+        return None
+
+    def _decode(self, frames, decoded, stats, errors, stop):
+        """Decode thread: read frames into the decoded queue, then the end marker."""
+        iterator = iter(frames)
+        try:
+            while not stop.is_set():
+                start = time.perf_counter()
+                frame = next(iterator, None)
+                stats.add_busy('decode', time.perf_counter() - start)
+                if frame is None:
+                    break
+                frame.flags.writeable = False
+                if not self._put(decoded, frame, stop):
+                    return
+                stats.max_queue_depth['decoded'] = max(stats.max_queue_depth['decoded'], decoded.qsize())
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close:
+                close()  # releases a video capture early when stopping
+            self._put(decoded, StopIteration, stop)
+
+    def _timed_apply(self, frame, stats):
+        """Run the chain on one frame (on a filter thread)."""
+        start = time.perf_counter()
+        result = self.chain.apply(frame)
+        stats.add_busy('filter', time.perf_counter() - start)
+        if result is None:
+            raise ValueError("filter chain returned no image")
+        return result
+
+    def _filter(self, decoded, filtered, stats, errors, stop):
+        """Filter thread: fan frames out to the pool and pass results on in order."""
+        in_flight = deque()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                finished = False
+                while not finished or in_flight:
+                    if not finished and len(in_flight) < self.prefetch:
+                        frame = self._get(decoded, stop)
+                        if frame is None:
+                            return
+                        if frame is StopIteration:
+                            finished = True
+                        else:
+                            in_flight.append(pool.submit(self._timed_apply, frame, stats))
+                        continue
+                    if not self._put(filtered, in_flight.popleft().result(), stop):
+                        return
+                    stats.max_queue_depth['filtered'] = max(stats.max_queue_depth['filtered'],
+                                                            filtered.qsize())
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            for future in in_flight:
+                future.cancel()
+            self._put(filtered, StopIteration, stop)
+
+    def run(self, frames, sink, progress=None):
+        """
+        Stream every frame from an iterable through the chain into a sink
+        (anything with write(frame) and close()).
+        progress: optional callback(stats), called about once a second
+        Returns StreamStats. Raises the first error from any stage.
+        """
+        decoded = queue.Queue(maxsize=self.prefetch)
+        filtered = queue.Queue(maxsize=self.prefetch)
+        stats = StreamStats()
+        errors = []
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=self._decode, args=(frames, decoded, stats, errors, stop),
+                             name='video-decode', daemon=True),
+            threading.Thread(target=self._filter, args=(decoded, filtered, stats, errors, stop),
+                             name='video-filter', daemon=True)
+        ]
+        for thread in threads:
+            thread.start()
+
+        next_report = time.perf_counter() + 1.0
+        try:
+            while True:
+                frame = self._get(filtered, stop)
+                if frame is None or frame is StopIteration:
+                    break
+                start = time.perf_counter()
+                sink.write(frame)
+                stats.add_busy('encode', time.perf_counter() - start)
+                stats.frame_done()
+                if progress and time.perf_counter() >= next_report:
+                    progress(stats)
+                    next_report = time.perf_counter() + 1.0
+        except BaseException as e:
+            errors.append(e)
+            raise
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            sink.close()
+        if errors:
+            raise errors[0]
+        return stats
+
+    def __repr__(self):
+        """String representation for developers."""
+        return f"VideoPipeline(filters={len(self.chain)}, prefetch={self.prefetch}, workers={self.workers})"
+
+
+def main(argv=None):
+    """Command-line entry point for filtering videos and frame sequences."""
+    parser = argparse.ArgumentParser(
+        description="Apply a filter chain to a video or numbered frame sequence, streaming.")
+    parser.add_argument('input', help="video file, or frames like 'in/img%%04d.png' or 'in/*.jpg'")
+    parser.add_argument('output', help="video file (.mp4, .avi, ...) or frames like 'out/f%%05d.png'")
+    parser.add_argument('--op', action='append', default=[], dest='operations',
+                        help="operation to apply, repeatable (grayscale, edge, blur=N[:fast], "
+                             "brightness=N, contrast=F, rotate=90|180|270, "
+                             "flip=horizontal|vertical, resize=WxH)")
+    parser.add_argument('--prefetch', type=int, default=8, help="frames buffered per stage (default: 8)")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="filter threads (default: all cores)")
+    parser.add_argument('--fps', type=float, default=None,
+                        help="output frame rate (default: the input's, or 25 for frame sequences)")
+    parser.add_argument('-q', '--quiet', action='store_true', help="only print the summary")
+    parser.add_argument('--metrics-out', default=None,
+                        help="write filter telemetry to this file (.json, otherwise Prometheus text)")
+    args = parser.parse_args(argv)
+
+    try:
+        filters = [VideoPipeline.filter_from_operation(*BatchProcessor.parse_operation(op))
+                   for op in args.operations]
+        source = VideoPipeline.open_source(args.input, args.fps or 25.0)
+        sink = VideoPipeline.open_sink(args.output, args.fps or source.fps)
+        pipeline = VideoPipeline(filters, args.prefetch, args.workers)
+
+        def show(stats):
+            if not args.quiet:
+                total = f"/{source.frame_count}" if source.frame_count else ""
+                print(f"  {stats.frames}{total} frames | {stats.recent_fps:.1f} fps", flush=True)
+
+        stats = pipeline.run(source, sink, progress=show)
+    except (ValueError, cv2.error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    print(stats)
+    if args.metrics_out:
+        FilterTelemetry.export(args.metrics_out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())